@@ -2,6 +2,7 @@ import tempfile
 import psycopg2
 import psycopg2.extras
 import adif
+from dbpool import pooled, stream_rows
 
 
 class StringWrapper:
@@ -11,20 +12,15 @@ class StringWrapper:
     def write(self, string):
         self.string += string
 
+@pooled
 def produce_adif_log():
-    db = psycopg2.connect(dbname='ham_station')
-    cur = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
-    cur.execute("""SELECT callsign as CALL, date as QSO_DATE, time as TIME_ON, band as FREQ, band as BAND, propmode as PROP_MODE,
+    with stream_rows("""SELECT callsign as CALL, date as QSO_DATE, time as TIME_ON, band as FREQ, band as BAND, propmode as PROP_MODE,
                         tx as RST_SENT, rx as RST_RCVD,
                         locator as GRIDSQUARE,
                         txmode as MODE
                         FROM nac_log_new WHERE complete=True
-                        ORDER BY date,time""")
-
-
-    rows = cur.fetchall()
-    qsos = [{k.upper(): v for k, v in record.items()} for record in rows]
+                        ORDER BY date,time""", cursor_factory=psycopg2.extras.RealDictCursor) as rows:
+        qsos = [{k.upper(): v for k, v in record.items()} for record in rows]
 
     print("Fetched %d qsos" % len(qsos))
 
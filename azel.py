@@ -12,6 +12,7 @@ from p20_defs import *
 from target_tracking import *
 import hamop
 from degree import Degree
+from dbpool import pooled
 
 def sense2str(value):
 	x = 1
@@ -626,6 +627,7 @@ class AzelController:
 		self.p20.bit_write(P20_AZ_TIMER_L, LOW)
 		self.retriggering = False
 
+	@pooled
 	def restore_az(self):
 		cur = self.app.ham_op.db.cursor()
 		cur.execute("SELECT az FROM azel_current where ID=0")
@@ -639,6 +641,7 @@ class AzelController:
 		self.rotate_start_az = self.az
 		cur.close()
 
+	@pooled
 	def store_az(self):
 		cur = self.ham_op.db.cursor()
 		cur.execute("UPDATE azel_current set az = %s WHERE ID=0", (self.az,))
@@ -2,36 +2,241 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from main import MyApp
 
-import queue
-from threading import Lock
+import os
+import time
+import functools
+import threading
+import itertools
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock, Condition
 from p26_defs import *
-import re
 
 from flask import current_app
 from datetime import date, datetime
 
 import locator.src.maidenhead as mh
 from contest_log import get_contest_times
+from log_model import LogModel
 
-msg_q = queue.Queue()
 thread_lock = Lock()
 
-def background_thread(app):
-    """Send server generated events to clients."""
+# Messages that carry a state rather than an event. Only the latest value per key is worth sending,
+# the key being the event name followed by the values of these fields.
+COALESCED_EVENTS = {
+    "update_class": ("forId", "class"),
+    "update_classes": ("forId",),
+    "update_state": ("forId", "state"),
+    "set_azel": (),
+    "import_progress": ("job",),
+    "activity_histogram": (),
+}
+
+
+def coalesce_key(what, data):
+    try:
+        fields = COALESCED_EVENTS[what]
+    except KeyError:
+        return None
+    return (what,) + tuple(data[f] for f in fields)
+
+
+class CoalescingOutbox:
+    """
+    A thread safe outbox where a message with a coalescing key replaces any message with the same key still waiting
+    to be sent. The replacement moves to the tail, so it is sent after every message queued before it, e.g. an
+    update_batch touching the same element, but keeps the queueing time of the message first queued for the key.
+    Messages without a key are all kept, in order.
+    """
+    def __init__(self):
+        self._cond = Condition()
+        self._order = OrderedDict()  # key, or sequence number for messages without one -> (what, data, queued_at)
+        self._unkeyed = itertools.count()
+        self.coalesced = 0
+        self.waker = None      # Signalled on every put, when waiting is done by a green thread
+
+    def put(self, what, data, key=None):
+        now = time.monotonic()
+        with self._cond:
+            if key is None:
+                self._order[next(self._unkeyed)] = (what, data, now)
+            else:
+                replaced = self._order.pop(key, None)
+                if replaced is not None:
+                    now = replaced[2]
+                    self.coalesced += 1
+                self._order[key] = (what, data, now)
+            self._cond.notify()
+            if self.waker is not None:
+                self.waker.signal()
+
+    def pending(self):
+        with self._cond:
+            return bool(self._order)
+
+    def wait(self):
+        """Block until there is something to send."""
+        with self._cond:
+            while not self._order:
+                self._cond.wait()
+
+    def drain(self):
+        """:return: A list of (what, data, queued_at) for everything waiting, in order."""
+        with self._cond:
+            batch = list(self._order.values())
+            self._order.clear()
+            return batch
+
+    def clear(self):
+        with self._cond:
+            self._order.clear()
+
+
+class HubWaker:
+    """
+    Wakes a green thread blocked in the eventlet hub from any thread. The green thread waits for a pipe to become
+    readable, which the hub polls along with its sockets, and :meth:`signal` writes a byte to the pipe. Waiting this
+    way occupies no thread of eventlet's native thread pool.
+    """
+    def __init__(self):
+        self._read_fd, self._write_fd = os.pipe()
+        os.set_blocking(self._read_fd, False)
+        os.set_blocking(self._write_fd, False)
+        self._lock = Lock()
+        self._signalled = False  # A byte is waiting in the pipe
+
+    def signal(self):
+        with self._lock:
+            if self._signalled:
+                return
+            self._signalled = True
+            try:
+                os.write(self._write_fd, b"\0")
+            except BlockingIOError:
+                pass  # The pipe is full, so the waiter wakes anyway
+
+    def wait(self):
+        """Yield to the hub until signalled."""
+        from eventlet.hubs import trampoline
+        trampoline(self._read_fd, read=True)
+        with self._lock:
+            self._signalled = False
+            try:
+                os.read(self._read_fd, 512)
+            except BlockingIOError:
+                pass
 
-    app.client_mgr.logger.info("Starting background thread")
-    count = 0
-    with app.app_context():
-        while True:
-                count += 1
-                try:
-                    if not msg_q.empty():
-                        what, item = msg_q.get_nowait()
-                        # print("Sending %s %d %s" % (what, count, item))
+
+class MessageDispatcher:
+    """
+    Delivers server generated events to the clients.
+
+    Producers, i.e. the socket handlers, the azimuth interrupt and the tracker threads, queue messages with
+    :meth:`put`. The dispatcher task blocks until a message arrives and then emits everything queued in one pass,
+    so an update reaches the clients as soon as it is produced and nothing runs while there is nothing to send.
+
+    State messages listed in COALESCED_EVENTS are coalesced, and passes are at least min_interval seconds apart.
+    When the hardware produces changes faster than that, e.g. azimuth ticks during a rotation, each pass sends
+    only the latest value per key, which bounds the traffic to the clients.
+
+    The producers are real threads while the dispatcher runs as a green thread under eventlet. The dispatcher
+    therefore waits on the outbox through a :class:`HubWaker`, which leaves the hub free to serve other green
+    threads meanwhile without parking a thread of the pool used for offloaded database calls.
+
+    The time each message spent in the queue is recorded, see :meth:`stats`.
+    """
+    def __init__(self, report_interval=300, min_interval=0.05):
+        self._outbox = CoalescingOutbox()
+        self._stats_lock = Lock()
+        self.report_interval = report_interval
+        self.min_interval = min_interval
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.dispatched = 0
+        self.passes = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_last = 0.0
+        self._outbox.coalesced = 0
+        self.stats_since = time.monotonic()
+
+    def put(self, what, data):
+        self._outbox.put(what, data, coalesce_key(what, data))
+
+    def clear(self):
+        self._outbox.clear()
+
+    def _record(self, latency):
+        with self._stats_lock:
+            self.dispatched += 1
+            self.latency_total += latency
+            self.latency_last = latency
+            if latency > self.latency_max:
+                self.latency_max = latency
+
+    def stats(self):
+        """
+        :return: A dictionary with the number of messages sent, messages coalesced away and dispatch passes since
+                 the last report, and the mean, max and last queueing latencies in milliseconds.
+        """
+        with self._stats_lock:
+            return {"dispatched": self.dispatched,
+                    "coalesced": self._outbox.coalesced,
+                    "passes": self.passes,
+                    "mean_ms": 1000.0 * self.latency_total / self.dispatched if self.dispatched else 0.0,
+                    "max_ms": 1000.0 * self.latency_max,
+                    "last_ms": 1000.0 * self.latency_last,
+                    "seconds": time.monotonic() - self.stats_since}
+
+    def report(self, logger):
+        stats = self.stats()
+        if stats["dispatched"]:
+            logger.info("Dispatched %d messages (%d coalesced) in %d passes during %d s, latency mean %.2f ms, max %.2f ms" %
+                        (stats["dispatched"], stats["coalesced"], stats["passes"], stats["seconds"],
+                         stats["mean_ms"], stats["max_ms"]))
+        with self._stats_lock:
+            self._reset_stats()
+
+    def _waiter(self, app):
+        if app.socket_io.async_mode == "eventlet":
+            waker = HubWaker()
+            self._outbox.waker = waker
+
+            def wait():
+                while not self._outbox.pending():
+                    waker.wait()
+            return wait
+        return self._outbox.wait
+
+    def run(self, app):
+        """Send server generated events to clients."""
+
+        app.client_mgr.logger.info("Starting message dispatcher")
+        wait = self._waiter(app)
+        next_report = time.monotonic() + self.report_interval
+        last_pass = 0.0
+        with app.app_context():
+            while True:
+                wait()
+                since_last_pass = time.monotonic() - last_pass
+                if since_last_pass < self.min_interval:
+                    app.socket_io.sleep(self.min_interval - since_last_pass)  # Let state changes coalesce
+                last_pass = time.monotonic()
+                for what, item, queued_at in self._outbox.drain():
+                    self._record(time.monotonic() - queued_at)
+                    try:
                         app.socket_io.emit(what, item, broadcast=True)
-                except:
-                    pass
-                app.socket_io.sleep(0.1)
+                    except Exception as e:
+                        app.client_mgr.logger.error("Failed to emit %s: %s" % (what, e))
+                with self._stats_lock:
+                    self.passes += 1
+                if time.monotonic() >= next_report:
+                    self.report(app.client_mgr.logger)
+                    next_report = time.monotonic() + self.report_interval
+
+
+dispatcher = MessageDispatcher()
 
 
 def status_update_thread(app):
@@ -49,27 +254,69 @@ def status_update_thread(app):
 
 
 
+_batch = threading.local()
+
+
+@contextmanager
+def batched_updates():
+    """
+    Collect the update_class, update_classes and update_state messages sent by this thread within the block and send
+    them as one update_batch message when the outermost block exits, for the page to apply in one pass.
+    Within a batch only the latest update per element and class or state is kept.
+    """
+    if getattr(_batch, "updates", None) is not None:
+        yield  # Nested, the outermost block sends the batch
+        return
+    _batch.updates = {}
+    try:
+        yield
+    finally:
+        updates = _batch.updates
+        _batch.updates = None
+        if updates:
+            dispatcher.put("update_batch", [[what, data] for what, data in updates.values()])
+
+
+def batched(func):
+    """Decorator sending the element updates made by func as one update_batch message."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with batched_updates():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def send_element_update(what, data):
+    updates = getattr(_batch, "updates", None)
+    if updates is None:
+        dispatcher.put(what, data)
+    else:
+        key = coalesce_key(what, data)
+        updates.pop(key, None)  # The latest update goes last, after other updates of the element made meanwhile
+        updates[key] = (what, data)
+
+
 def send_update_class(key, clazz, value):
     # print("Update class forId=%s, class=%s, value=%s" % (key, clazz, value))
-    msg_q.put(("update_class", {"forId": key, "class": clazz, "value": value}))
+    send_element_update("update_class", {"forId": key, "class": clazz, "value": value})
 
 def send_update_classes(key, classes):
     # print("Update classes forId=%s, classes=%s," % (key, classes))
-    msg_q.put(("update_classes", {"forId": key, "classes": classes}))
+    send_element_update("update_classes", {"forId": key, "classes": classes})
 
 
 def send_update_state(key, state, value):
-    msg_q.put(("update_state", {"forId": key, "state": state, "value": value}))
+    send_element_update("update_state", {"forId": key, "state": state, "value": value})
 
 
 def emit(what, data):
-    msg_q.put((what, data))
+    dispatcher.put(what, data)
 
 
 
 
 def send_reload():
-    msg_q.put(("globalReload", {}))
+    dispatcher.put("globalReload", {})
 
 class ClientMgr:
     def __init__(self, app: 'MyApp', logger, socket_io):
@@ -110,17 +357,33 @@ class ClientMgr:
 
         self.auto_track = False
 
+        self.stations_lock = Lock()
+        self.pushed_stations = {}
+        self.stations_seq = 0
+
+        self.log_model = LogModel(app, logger)
+
     @staticmethod
     def emit_log(json):
         emit("log_data", json)
 
     @staticmethod
     def emit(what, data):
-        msg_q.put((what, data))
+        dispatcher.put(what, data)
+    @staticmethod
+    def send_import_progress(progress):
+        dispatcher.put("import_progress", progress)
+
+    def send_activity_histogram(self):
+        """ Send the number of stations heard in each azimuth bin around my QTH, for the activity bar of the clients """
+        index = self.app.ham_op.station_index
+        dispatcher.put("activity_histogram", {"az_step": index.az_step, "counts": index.histogram()})
+
     @staticmethod
     def push_track_led(clazzes):
         send_update_classes("track_led", clazzes)
     @staticmethod
+    @batched
     def disable_core_controls():
         send_update_state("pa_ready_led", "disabled", True)
         send_update_state("pa_active_led", "disabled", True)
@@ -131,6 +394,7 @@ class ClientMgr:
         pass
 
     @staticmethod
+    @batched
     def enable_core_controls():
         send_update_state("pa_ready_led", "disabled", False)
         send_update_state("pa_active_led", "disabled", False)
@@ -220,7 +484,7 @@ class ClientMgr:
         * into columns, with the number of columns determined based on the number of callsigns. Each callsign is appended to the appropriate column in the table.
 
         Finally, the method constructs a dictionary containing the id, north, south, west, east, info, and hover_info properties for each locator. This dictionary is added to a list called `
-        *to_send`. The list of dictionaries is then passed to the `add_rects` method of the `msg_q` object for further processing.
+        *to_send`. The list of dictionaries is then queued as an `add_rects` message to the clients.
         """
         locator_precision = self.get_locator_precision_used_on_map()
         to_send = []
@@ -268,13 +532,14 @@ class ClientMgr:
             info += "</table>"
             to_send.append({"id": locator, "n": n, "s": s, "w": w, "e": e, 'info':info, 'hover_info': hover_info})
 
-        msg_q.put(("add_rects", to_send))
+        dispatcher.put("add_rects", to_send)
 
     def add_locator_rect_to_map(self, loc):
         locators, _qsqs = self.get_mhs()
         locators.append(loc)
         self.push_locator_rects_to_map(locators)
 
+    @batched
     def status_push(self, current, force=False):
 
         # if not self.app.ham_op.core_controls:
@@ -342,6 +607,7 @@ class ClientMgr:
 
         self.app.azel.status_update()
 
+    @batched
     def status_update(self, force=False):
         current_p2_sense = self.app.ham_op.get_status()
         self.status_push(current_p2_sense, force=force)
@@ -357,7 +623,7 @@ class ClientMgr:
 
         msg = {x["key"]: x["value"] for x in rows}
         msg["current_band"] = self.current_band
-        msg_q.put(("set_mydata", msg))
+        dispatcher.put("set_mydata", msg)
 
     def startup(self):
         self.status_update(force=True)
@@ -371,36 +637,35 @@ class ClientMgr:
             azel = self.app.azel.get_azel()
 
         if azel != self.last_pushed_azel and azel != self.previous_pushed_azel or force:
-            msg_q.put(("set_azel", {"az": azel[0], "el": azel[1]}))
+            dispatcher.put("set_azel", {"az": azel[0], "el": azel[1]})
         self.previous_pushed_azel = self.last_pushed_azel # Eliminate flapping
         self.last_pushed_azel = azel
 
 
 
-    def connect(self, namespace="/"):
+    def connect(self, namespace="/", sid=None):
         """
         Connects to the given namespace.
 
         :param namespace: The namespace to connect to.
+        :param sid: The session id of the connecting client, which gets the stations snapshot.
         :return: None
         """
-        # Clear the queue
-
         if namespace=="/":
-            try:
-                while not msg_q.empty():
-                    msg_q.get_nowait()
-            except queue.Empty:
-                pass
+            with thread_lock:
+                if self.message_thread is None:
+                    dispatcher.clear()  # Nobody has been listening yet, drop what was queued since startup
 
             self.send_origo()
             self.send_qth()
             self.send_my_data()
             self.send_azel(force=True)
+            self.send_stations_snapshot(sid)
+            self.send_activity_histogram()
 
             with thread_lock:
                 if self.message_thread is None:
-                    self.message_thread = self.socket_io.start_background_task(background_thread, current_app._get_current_object())
+                    self.message_thread = self.socket_io.start_background_task(dispatcher.run, current_app._get_current_object())
             with thread_lock:
                 if self.status_thread is None:
                     self.status_thread = self.socket_io.start_background_task(status_update_thread, current_app._get_current_object())
@@ -409,10 +674,11 @@ class ClientMgr:
 
             emit('my_response', {'data': 'Connected', 'count': 0})
 
-            mhs, qsos = self.get_mhs()
-            if qsos:
-                emit("add_qsos", qsos)
-                self.logger.debug("Adding %d qso:s from %s to %s" % (len(qsos), qsos[0]["callsign"], qsos[-1]["callsign"]))
+            mhs, _qsos = self.get_mhs()
+            serialised_qsos, qso_count = self.log_model.get_serialised_qsos(self.show_log_since, self.show_log_until, self.current_band)
+            if qso_count:
+                emit("add_qsos", serialised_qsos)
+                self.logger.debug("Adding %d qso:s" % qso_count)
             self.push_locator_rects_to_map(mhs)
             self.app.azel.target_stack.update_ui(force=True)
             self.status_update(force=True)
@@ -425,40 +691,8 @@ class ClientMgr:
         # self.update_reachable_stations(stations)
 
     def get_mhs(self):
-        rows = self.app.ham_op.get_log_rows(self.show_log_since, self.show_log_until)
-        qsos = []
-        mhs = []
         self.locators_on_map = []
-        mhsqnumber = 0
-        mhsqs = set()
-        for row in rows:
-            newmsqn = None
-            if row[6]:
-                mhsq = row[6][:4].upper()
-                if mhsq not in mhsqs and row[13].startswith(re.split("[-.]", self.current_band)[0]) and row[10]:
-                    newmsqn = len(mhsqs) + 1
-                    mhsqs.add(mhsq)
-
-            qso = {"id": row[0],
-                   "date": row[1],
-                   "time": row[2],
-                   "callsign": row[3].upper(),
-                   "tx": row[4],
-                   "rx": row[5],
-                   "locator": row[14].upper() if row[14] else row[6].upper() if row[6] else None,
-                   "distance": row[7],
-                   "square": row[8],
-                   "points": row[9],
-                   "complete": row[10],
-                   "propmode": row[11],
-                   "acc_sqn": newmsqn,
-                   "band": row[13],
-                   }
-            qsos.append(qso)
-            if row[6]:
-                if row[13].startswith(re.split("[-.]", self.current_band)[0]) and (row[6] or row[14]):
-                    mhs.append(row[14].upper() if row[14] and row[6] and len(row[14]) > len(row[6]) else row[6].upper())
-        return mhs, qsos
+        return self.log_model.get_mhs(self.show_log_since, self.show_log_until, self.current_band)
 
     def update_map_center(self):
         settings = self.app.ham_op.get_map_setting(self.current_band, self.map_locator_precision, self.current_log_scope)
@@ -466,7 +700,7 @@ class ClientMgr:
         if settings:
             lon, lat, zoom = settings
             #print("Queueing origo %f %f, zoom=%d" % (lon, lat, zoom))
-            msg_q.put(("set_origo", {"lon": lon, "lat": lat, "zoom": zoom}))
+            dispatcher.put("set_origo", {"lon": lon, "lat": lat, "zoom": zoom})
 
 
     def send_origo(self):
@@ -481,7 +715,7 @@ class ClientMgr:
             lon, lat, zoom = settings
 
         #print("Queueing origo %f %f, zoom=%d" % (lon, lat, zoom))
-        msg_q.put(("set_origo", {"lon": lon, "lat": lat, "zoom": zoom}))
+        dispatcher.put("set_origo", {"lon": lon, "lat": lat, "zoom": zoom})
 
 
     def send_qth(self):
@@ -491,13 +725,13 @@ class ClientMgr:
         n, s, w, e, lat, lon = mh.to_rect(my_qth)
 
         #print("Queueing qth %f %f" % (lon, lat))
-        msg_q.put(("set_qth", {"lon": lon, "lat": lat, "qth": my_qth, "n": n, "s": s, "w": w, "e": e}))
+        dispatcher.put("set_qth", {"lon": lon, "lat": lat, "qth": my_qth, "n": n, "s": s, "w": w, "e": e})
 
 
     def send_mydata(self):
         msg = self.app.ham_op.get_mydata(self.current_band)
         msg["current_band"] = self.current_band
-        msg_q.put(("set_mydata", msg))
+        dispatcher.put("set_mydata", msg)
 
     def do_lookup_locator(self, qso):
         other_loc = qso["locator"]
@@ -529,7 +763,7 @@ class ClientMgr:
         # emit("qso_committed", qso)
 
     def send_reload(self):
-        msg_q.put(("globalReload", {}))
+        dispatcher.put("globalReload", {})
 
     @staticmethod
     def update_target_list(targets):
@@ -546,7 +780,7 @@ class ClientMgr:
                 ct += 1
             s += ts + tsr + "</tr>"
         s += "</table>"
-        msg_q.put(("update_target_list", s))
+        dispatcher.put("update_target_list", s)
 
     @staticmethod
     def update_planes(planes):
@@ -561,12 +795,24 @@ class ClientMgr:
             "4540": {"id": "WZZ9SJ", "lat": 57.6036, "lng": 13.3089, "alt": 34263},
         }
         if planes is not None:
-            msg_q.put(("update_planes", planes))
+            dispatcher.put("update_planes", planes)
             return
 
-        msg_q.put(("update_planes", planes1))
+        dispatcher.put("update_planes", planes1)
+
+        dispatcher.put("update_planes", planes2)
 
-        msg_q.put(("update_planes", planes2))
+    @staticmethod
+    def station_info(callsign, locator, antaz, heard_at, dx_callsign, dx_loc, dist, freq, txmode):
+        heard = "at %s UTC" % datetime.utcfromtimestamp(heard_at).strftime("%H:%M") if heard_at else "time unknown"
+        return f"""<span style=\"font-size:12pt\"> 
+                        <b>{callsign}:</b><br/>
+                        Locator:{locator}<br/>
+                        QTF:{antaz}<br/>
+                        Last report {heard} with {dx_callsign}@{dx_loc}<br/>
+                        Distance:{dist} km<br/>
+                        QRG: {freq}, "txmode: {txmode}</span>
+                    """
 
     def update_reachable_stations(self, beaming, other):
         """
@@ -577,16 +823,15 @@ class ClientMgr:
         :return: None
 
         This method updates the list of reachable stations based on the provided dictionaries of beaming and other stations. It uses the provided information to create a JSON object representing
-        * each station and stores them in a dictionary. The resulting dictionary is then sent to a message queue for further processing and communication with the client application.
+        * each station and compares the result with what was pushed last time. Only the added, changed and removed stations are sent to the clients, as an `update_reachable_stations_delta`
+        * message carrying a sequence number. A station carries the time of its last report rather than its age, so an unchanged station stays unchanged between cycles. The clients compute
+        * the age from the server time sent with every message.
         """
         json={}
 
         worked_callsigns = set()
         if self.hiding_logged_stations:
-            rows = self.app.ham_op.get_log_rows(self.show_log_since, self.show_log_until)
-            for row in rows:
-                cs = row[3].upper()
-                worked_callsigns.add(cs)
+            worked_callsigns = self.log_model.worked_callsigns(self.show_log_since, self.show_log_until)
 
         for s in beaming:
             station = beaming[s]
@@ -596,7 +841,7 @@ class ClientMgr:
             locator = station.get('locator','').upper()
             antaz = station.get('az', 0)
             dist = station.get('dist', 0)
-            age = float(station.get('age_minutes', 0))
+            heard_at = station.get('happened_at')
             myaz = station.get('my_az', 0)
             dx_callsign = station.get("dx_callsign", '')
             dx_loc=station.get("dx_loc", '')
@@ -604,14 +849,7 @@ class ClientMgr:
             txmode = station["txmode"]
             antwidth=30
 
-            info = f"""<span style=\"font-size:12pt\"> 
-                        <b>{callsign}:</b><br/>
-                        Locator:{locator}<br/>
-                        QTF:{antaz}<br/>
-                        Last report {age:2.1f} min ago with {dx_callsign}@{dx_loc}<br/>
-                        Distance:{dist} km<br/>
-                        QRG: {freq}, "txmode: {txmode}</span>
-                    """
+            info = self.station_info(callsign, locator, antaz, heard_at, dx_callsign, dx_loc, dist, freq, txmode)
             try:
                 txmode = station['txmode']
             except IndexError:
@@ -619,7 +857,7 @@ class ClientMgr:
             #antwidth = station["antwidth"] if "antwidth" in station else 30
             _n, _s, _w, _e, latitude, longitude = mh.to_rect(locator)
             if dist > 10:
-                json[callsign] = {"callsign":callsign, "locator": locator, "position": {"lat": latitude, "lng": longitude}, "antenna_azimuth": antaz, "antenna_width": antwidth, "my_az":myaz, "txmode": txmode, "age": age, "distance": dist, "info":info}
+                json[callsign] = {"callsign":callsign, "locator": locator, "position": {"lat": latitude, "lng": longitude}, "antenna_azimuth": antaz, "antenna_width": antwidth, "my_az":myaz, "txmode": txmode, "heard_at": heard_at, "distance": dist, "info":info}
         for s in other:
             station = other[s]
             callsign = station['callsign'].upper()
@@ -628,31 +866,47 @@ class ClientMgr:
             locator = station['locator'].upper()
             antaz = station.get('az', 0)
             dist = station.get('dist', 0)
-            age = float(station.get('age_minutes',0))
+            heard_at = station.get('happened_at')
             myaz = station.get('my_az',0)
             dx_callsign = station.get("dx_callsign",'')
             dx_loc=station.get("dx_loc",'')
             freq = station["frequency"]
             txmode = station["txmode"]
             antwidth = 360
-            info = f"""<span style=\"font-size:12pt\"> 
-                                    <b>{callsign}:</b><br/>
-                                    Locator:{locator}<br/>
-                                    QTF:{antaz}<br/>
-                                    Last report {age:2.1f} min ago with {dx_callsign}@{dx_loc}<br/>
-                                    Distance:{dist} km<br/>
-                                    QRG: {freq}, "txmode: {txmode}</span>
-                                """
+            info = self.station_info(callsign, locator, antaz, heard_at, dx_callsign, dx_loc, dist, freq, txmode)
             try:
                 txmode = station['txmode']
             except IndexError:
                 txmode = "FT8"
             _n, _s, _w, _e, latitude, longitude = mh.to_rect(locator)
-            json[callsign] = {"callsign": callsign, "locator": locator, "position": {"lat": latitude, "lng": longitude}, "antenna_azimuth": antaz, "antenna_width": antwidth, "my_az": myaz, "txmode": txmode,"age": age,"distance":dist, "info": info}
+            json[callsign] = {"callsign": callsign, "locator": locator, "position": {"lat": latitude, "lng": longitude}, "antenna_azimuth": antaz, "antenna_width": antwidth, "my_az": myaz, "txmode": txmode,"heard_at": heard_at,"distance":dist, "info": info}
         #import pprint
         #pprint.pprint(json)
-        # self.logger.info("Pushing %d stations to client" % (len(json)))
-        msg_q.put(("update_reachable_stations", json))
+
+        with self.stations_lock:
+            changed = {cs: stn for cs, stn in json.items() if self.pushed_stations.get(cs) != stn}
+            removed = [cs for cs in self.pushed_stations if cs not in json]
+            self.pushed_stations = json
+            self.stations_seq += 1
+            # self.logger.info("Pushing %d changed and %d removed of %d stations to client" % (len(changed), len(removed), len(json)))
+            dispatcher.put("update_reachable_stations_delta",
+                           {"seq": self.stations_seq, "server_time": time.time(), "changed": changed, "removed": removed})
+
+    def send_stations_snapshot(self, sid=None):
+        """
+        Send all stations last pushed as one `update_reachable_stations` message. This is sent when a client connects and
+        when a client asks for it after detecting a gap in the delta sequence.
+
+        :param sid: The session id of the client to send the snapshot to, or None to send it to all clients.
+                    Deltas still queued for the other clients are left alone. The client drops those that are not
+                    newer than the snapshot.
+        """
+        with self.stations_lock:
+            snapshot = {"seq": self.stations_seq, "server_time": time.time(), "stations": self.pushed_stations}
+        if sid is None:
+            dispatcher.put("update_reachable_stations", snapshot)
+        else:
+            self.socket_io.emit("update_reachable_stations", snapshot, room=sid)
 
     def map_settings(self, json):
         self.logger.debug("Map settings received: %s", json)
@@ -7,6 +7,13 @@ basedir = os.path.abspath(os.path.dirname(__name__))
 # Create the super class
 class Config(object):
     SECRET_KEY = "!tgilmeh"
+    # Set PREPARED_STATEMENTS=0 to send the registered queries as plain text, e.g. to compare timings
+    PREPARED_STATEMENTS = os.environ.get('PREPARED_STATEMENTS', '1') != '0'
+    # Queries taking longer than this are logged with their call site
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '500'))
+    # The precomputed bearings and distances from my_locator, rebuilt when my_locator changes
+    HOME_TABLE_FILE = os.environ.get('HOME_TABLE_FILE', '/tmp/stationmate_home_table.bin')
+    HOME_TABLE_RADIUS_KM = float(os.environ.get('HOME_TABLE_RADIUS_KM', '1500'))
 
 
 # Create the development config
@@ -0,0 +1,115 @@
+import time
+from datetime import date, datetime
+from threading import Lock
+from typing import *
+
+import psycopg2.extras
+
+from dbpool import cooperative, get_pool
+from statements import statements
+
+CONFIG_TYPES = ["int", "float", "str"]
+
+CONFIG_TABLES = {type: statements.register("config_%s_rows" % type, "SELECT * FROM config_%s ORDER BY key" % type)
+                 for type in CONFIG_TYPES}
+
+
+def _stamp(value) -> Optional[str]:
+    """ Make a time_start or time_stop value comparable with the ISO formatted times the config is looked up at """
+    if value is None:
+        return None
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+class ConfigCache:
+    """
+    In-process copy of the config_int, config_float and config_str tables.
+
+    Lookups resolve the time_start/time_stop validity windows and the band selector the same way the SQL in
+    HamOp.fetch_config_data did. The result of a lookup at the current time is kept until the next time_start or
+    time_stop of the table is passed. A table is read again after set_config_data changes it, and every ttl seconds
+    to pick up changes made by other programs.
+    """
+
+    def __init__(self, logger, ttl=300.0):
+        self.logger = logger
+        self.ttl = ttl
+        self.lock = Lock()
+        self.tables = {}  # type -> (rows, boundaries, loaded_at)
+        self.current = {}  # (type, key, band) -> (rows, valid_until)
+        self.generation = 0  # Bumped by invalidate(), so tables read meanwhile are not kept
+        self.hits = 0
+        self.loads = 0
+
+    @cooperative
+    def _load(self, type):
+        with get_pool().connection() as db:
+            with db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                statements.execute(cur, CONFIG_TABLES[type])
+                rows = [dict(row) for row in cur.fetchall()]
+        for row in rows:
+            row["_start"] = _stamp(row.get("time_start"))
+            row["_stop"] = _stamp(row.get("time_stop"))
+        boundaries = sorted({row["_start"] for row in rows if row["_start"]} | {row["_stop"] for row in rows if row["_stop"]})
+        self.loads += 1
+        self.logger.debug("Loaded %d rows of config_%s" % (len(rows), type))
+        return rows, boundaries, time.monotonic()
+
+    def _table(self, type):
+        """ The lock is not held while the table is read, so lookups of other green threads are not held up """
+        with self.lock:
+            table = self.tables.get(type)
+            if table is not None and time.monotonic() - table[2] <= self.ttl:
+                return table
+            generation = self.generation
+        table = self._load(type)
+        with self.lock:
+            if generation == self.generation:
+                self.tables[type] = table
+                self.current = {k: v for k, v in self.current.items() if k[0] != type}
+        return table
+
+    @staticmethod
+    def _select(rows, key, band, at_time) -> List[dict]:
+        return [{k: v for k, v in row.items() if not k.startswith("_")} for row in rows
+                if (row["_start"] is None or row["_start"] <= at_time) and
+                   (row["_stop"] is None or row["_stop"] >= at_time) and
+                   (key is None or row["key"] == key) and
+                   (band is None or row.get("band") is None or row.get("band") == band)]
+
+    def fetch(self, type, key=None, band=None, at_time=None) -> List[dict]:
+        """
+        :param type: The config table, one of "int", "float" or "str".
+        :param key: Only return rows for this key, None for all keys.
+        :param band: Only return rows for this band or for no band, None for all rows.
+        :param at_time: ISO formatted time the rows shall be valid at, None for now.
+        :return: The valid rows ordered by key, as dicts.
+        """
+        table = self._table(type)
+        rows, boundaries, _loaded_at = table
+        with self.lock:
+            if at_time is not None:
+                return self._select(rows, key, band, at_time)
+            now = datetime.now().isoformat()
+            memo = self.current.get((type, key, band))
+            if memo and now < memo[1]:
+                self.hits += 1
+                return list(memo[0])
+            selected = self._select(rows, key, band, now)
+            valid_until = next((b for b in boundaries if b >= now), "9999-12-31T23:59:59")
+            if self.tables.get(type) is table:  # Not invalidated while reading
+                self.current[(type, key, band)] = (selected, valid_until)
+            return list(selected)
+
+    def invalidate(self, type=None) -> None:
+        """ Forget a table, or all tables, so the next lookup reads it again """
+        with self.lock:
+            self.generation += 1
+            if type is None:
+                self.tables = {}
+                self.current = {}
+            else:
+                self.tables.pop(type, None)
+                self.current = {k: v for k, v in self.current.items() if k[0] != type}
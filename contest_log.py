@@ -1,10 +1,11 @@
 from datetime import timedelta, date, datetime
 import psycopg2
 import psycopg2.extras
+from dbpool import get_pool, pooled, stream_rows
 import pytz
 import locator.src.maidenhead as mh
 import math
-from geo import sphere
+import locator.src.geodesy as geodesy
 
 def get_nth_tuesday(n, today=date.today()):
 
@@ -96,6 +97,7 @@ class StringWrapper:
     def write(self, string):
         self.string += string
 
+@pooled
 def produce_contest_log(band_and_mode, logger, tuesday_number=None, log_remarks=None):
 
     contest_log = StringWrapper()  # Type: Optional[SupportsWrite[str]]
@@ -108,7 +110,7 @@ def produce_contest_log(band_and_mode, logger, tuesday_number=None, log_remarks=
 
     band = int(band_and_mode.split('-')[0])
 
-    db = psycopg2.connect(dbname='ham_station')
+    db = get_pool().current()
     # TODO: Get this table from internet.
     prefixes = {
         "LA": "NO",
@@ -324,23 +326,22 @@ def produce_contest_log(band_and_mode, logger, tuesday_number=None, log_remarks=
 
     wwls, wwl_bonus, wwl_multiplier = log["CWWLs"].split(";")
 
-    cur.execute(
-        "SELECT DISTINCT callsign, date, time  FROM nac_log_new WHERE date >= %s and date <= %s and time >= %s and time <= %s and complete ORDER BY date, time",
-        args)
-
     wkd_countries = set()
 
-    for row in cur.fetchall():
-        dx_call = row["callsign"].upper()
-
-        for pfx in prefixes:
-            if dx_call.startswith(pfx):
-                country = prefixes[pfx]
-                if country not in wkd_countries:
-                    wkd_countries.add(country)
-                break
-        else:
-            raise LookupError("Unknown prefix for callsign %s" % dx_call)
+    with stream_rows(
+            "SELECT DISTINCT callsign, date, time  FROM nac_log_new WHERE date >= %s and date <= %s and time >= %s and time <= %s and complete ORDER BY date, time",
+            args, cursor_factory=psycopg2.extras.RealDictCursor) as rows:
+        for row in rows:
+            dx_call = row["callsign"].upper()
+
+            for pfx in prefixes:
+                if dx_call.startswith(pfx):
+                    country = prefixes[pfx]
+                    if country not in wkd_countries:
+                        wkd_countries.add(country)
+                    break
+            else:
+                raise LookupError("Unknown prefix for callsign %s" % dx_call)
 
     dxccs, dxcc_bonus, dxcc_multiplier = log["CDXCs"].split(";")
 
@@ -352,10 +353,11 @@ def produce_contest_log(band_and_mode, logger, tuesday_number=None, log_remarks=
     odxrow = cur.fetchall()[0]
 
     mn, ms, mw, me, mlat, mlon = mh.to_rect(myloc[:6])
+    # The contest distances are on the plain sphere, geodesy.IARU would apply the IARU geoid constant
+    home = geodesy.Origin(mlat, mlon, geodesy.SPHERE)
     n, s, w, e, lat, lon = mh.to_rect(odxrow["locator"][:6])
 
-    distance = sphere.distance((mlon, mlat), (
-        lon, lat)) / 1000.0 * 1  # 0.9989265959409077  # Macic  constant compensates for the IARU geoid.
+    _bearing, distance = home.bearing_distance(lat, lon)
 
     log["CODXC"] = "%s;%s;%s" % (
         odxrow["callsign"].upper(), odxrow["locator"][:6].upper(), str(int(distance * 100) / 100.0))
@@ -366,80 +368,77 @@ def produce_contest_log(band_and_mode, logger, tuesday_number=None, log_remarks=
     wkd_calls = set()
     wkd_wwls = set()
 
-    cur.execute(
-        "SELECT * FROM nac_log_new WHERE date >= %s and date <= %s and time >= %s and time <= %s ORDER BY date, time",
-        args)
-    rows = cur.fetchall()
     total_qso_points = 0
 
-    for row in rows:
-        qso_date = row["date"][2:].replace("-", "")
-        qso_time = row["time"]
-        dx_call = row["callsign"].upper()
-
-        mode_codes = {
-
-            ("CW", 3): 2,  # Two way CW
-            ("CW", 2): 4,  # Tx cw, rx SSB
-            ("SSB", 2): 1,  # Two way SSB
-            ("FT8", 2): 7,  # MGM
-            ("MS144", 2): 7,  # MGM
-        }
-
-        mode_code = "0"  # Don't know
-        if (row["txmode"], len(row["rx"])) in mode_codes:
-            mode_code = mode_codes[(row["txmode"], len(row["rx"]))]
-
-        tx = row["tx"].upper()
-        tx_qson = ""
-        rx = row["rx"].upper()
-        rx_qson = ""
-        rx_exch = ""
-        rx_wwl = row["locator"][:6].upper()
-        new_dxcc = ""
-        new_exchange = ""
-
-        mn, ms, mw, me, mlat, mlon = mh.to_rect(myloc[:6])
-        n, s, w, e, lat, lon = mh.to_rect(rx_wwl[:6])
-
-        distance = sphere.distance((mlon, mlat), (
-            lon, lat)) / 1000.0 * 1  # 0.9989265959409077  # Magic  constant compensates for the IARU geoid.
-        # print(rx_wwl, distance, file=contest_log)
-        points = math.floor(distance) + 1
-
-        dup_qso = ""
-        new_wwl = ""
-        qso_points = 0
-
-        if row["complete"]:
-            if dx_call in wkd_calls:
-                dup_qso = "D"
-                qso_points = 0
-            else:
-                if rx_wwl[:4] not in wkd_wwls:
-                    new_wwl = "N"
-                qso_points = points * band_multiplier
-                total_qso_points += qso_points
-                wkd_wwls.add(rx_wwl[:4])
-
-                for pfx in prefixes:
-                    if dx_call.startswith(pfx):
-                        country = prefixes[pfx]
-                        if country not in wkd_countries:
-                            new_dxcc = "N"
-                            wkd_countries.add(country)
-                        break
+    with stream_rows(
+        "SELECT * FROM nac_log_new WHERE date >= %s and date <= %s and time >= %s and time <= %s ORDER BY date, time",
+        args, cursor_factory=psycopg2.extras.RealDictCursor) as rows:
+        for row in rows:
+            qso_date = row["date"][2:].replace("-", "")
+            qso_time = row["time"]
+            dx_call = row["callsign"].upper()
+
+            mode_codes = {
+
+                ("CW", 3): 2,  # Two way CW
+                ("CW", 2): 4,  # Tx cw, rx SSB
+                ("SSB", 2): 1,  # Two way SSB
+                ("FT8", 2): 7,  # MGM
+                ("MS144", 2): 7,  # MGM
+            }
+
+            mode_code = "0"  # Don't know
+            if (row["txmode"], len(row["rx"])) in mode_codes:
+                mode_code = mode_codes[(row["txmode"], len(row["rx"]))]
+
+            tx = row["tx"].upper()
+            tx_qson = ""
+            rx = row["rx"].upper()
+            rx_qson = ""
+            rx_exch = ""
+            rx_wwl = row["locator"][:6].upper()
+            new_dxcc = ""
+            new_exchange = ""
+
+            n, s, w, e, lat, lon = mh.to_rect(rx_wwl[:6])
+
+            _bearing, distance = home.bearing_distance(lat, lon)
+            # print(rx_wwl, distance, file=contest_log)
+            points = math.floor(distance) + 1
+
+            dup_qso = ""
+            new_wwl = ""
+            qso_points = 0
+
+            if row["complete"]:
+                if dx_call in wkd_calls:
+                    dup_qso = "D"
+                    qso_points = 0
                 else:
-                    raise LookupError("Unknown prefix for callsign %s" % dx_call)
-        else:
-            dx_call = "ERROR " + dx_call
+                    if rx_wwl[:4] not in wkd_wwls:
+                        new_wwl = "N"
+                    qso_points = points * band_multiplier
+                    total_qso_points += qso_points
+                    wkd_wwls.add(rx_wwl[:4])
+
+                    for pfx in prefixes:
+                        if dx_call.startswith(pfx):
+                            country = prefixes[pfx]
+                            if country not in wkd_countries:
+                                new_dxcc = "N"
+                                wkd_countries.add(country)
+                            break
+                    else:
+                        raise LookupError("Unknown prefix for callsign %s" % dx_call)
+            else:
+                dx_call = "ERROR " + dx_call
 
-        wkd_calls.add(dx_call)
+            wkd_calls.add(dx_call)
 
-        qsorecs.append("%s;%s;%s;%s;%s;%s;%s;%s;%s;%s;%d;%s;%s;%s;%s" %
-                       (qso_date, qso_time, dx_call, mode_code,
-                        tx, tx_qson, rx, rx_qson, rx_exch, rx_wwl,
-                        qso_points, new_exchange, new_wwl, new_dxcc, dup_qso))
+            qsorecs.append("%s;%s;%s;%s;%s;%s;%s;%s;%s;%s;%d;%s;%s;%s;%s" %
+                           (qso_date, qso_time, dx_call, mode_code,
+                            tx, tx_qson, rx, rx_qson, rx_exch, rx_wwl,
+                            qso_points, new_exchange, new_wwl, new_dxcc, dup_qso))
 
     log["CQSOP"] = total_qso_points + len(wkd_countries) * int(dxcc_bonus) * int(dxcc_multiplier)
     log["CToSc"] = total_qso_points + len(wkd_countries) * int(dxcc_bonus) * int(dxcc_multiplier) + int(
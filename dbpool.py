@@ -0,0 +1,341 @@
+import functools
+import io
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from threading import Lock, BoundedSemaphore
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool  # For PoolError
+
+from query_stats import instrumented, register_layer_file
+
+try:
+    from greenlet import getcurrent as current_task
+except ImportError:
+    from threading import current_thread as current_task
+
+DB_NAME = 'ham_station'
+register_layer_file(__file__)
+STREAM_FETCH_SIZE = 2000
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """
+    A connection opened by the pool, remembering the statements prepared in its session. Its cursors record their
+    queries in query_stats.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+    def cursor(self, *args, **kwargs):
+        kwargs["cursor_factory"] = instrumented(kwargs.get("cursor_factory") or self.cursor_factory)
+        return super().cursor(*args, **kwargs)
+
+
+class ConnectionPool:
+    """
+    Bounded pool of database connections, checked out per thread. Connections are opened when needed and kept open
+    for reuse.
+
+    A thread, or a greenlet when running under eventlet, holds at most one connection at a time. Nested
+    connection() blocks in the same thread reuse the connection checked out by the outermost block, so methods
+    calling each other share one transaction. When all connections are checked out, further checkouts wait for one
+    to be returned.
+    """
+
+    def __init__(self, logger=None, maxconn=8, health_check_interval=60.0, checkout_timeout=30.0, **kwargs):
+        """
+        :param logger: Logger for pool events, may be None.
+        :param maxconn: Maximum number of connections open at the same time.
+        :param health_check_interval: Seconds a connection may stay idle before it is tested on checkout.
+        :param checkout_timeout: Seconds to wait for a free connection before raising PoolError.
+        :param kwargs: Connection parameters passed to psycopg2.connect.
+        """
+        self.logger = logger
+        self.maxconn = maxconn
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+        self.connect_kwargs = kwargs
+        self._slots = BoundedSemaphore(maxconn)
+        self._lock = Lock()
+        self._idle = []  # [(connection, time it was returned)], most recently returned last
+        self._held = {}  # task -> [connection, depth], read and changed under _lock. The depth only by its task
+
+        self.opened = 0
+        self.checkouts = 0
+        self.reuses = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.peak_in_use = 0
+        self.health_checks = 0
+        self.replaced = 0
+        self.rollbacks = 0
+        self.offloaded = 0
+
+    def _checkout(self, task):
+        started = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.waits += 1
+            if not self._slots.acquire(timeout=self.checkout_timeout):
+                raise psycopg2.pool.PoolError("No database connection available within %d seconds" % self.checkout_timeout)
+        waited = time.monotonic() - started
+        try:
+            with self._lock:
+                conn, idle_since = self._idle.pop() if self._idle else (None, None)
+            conn = self._healthy(conn, idle_since)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._held[task] = [conn, 1]
+            self.checkouts += 1
+            self.wait_time += waited
+            self.max_wait = max(self.max_wait, waited)
+            self.peak_in_use = max(self.peak_in_use, len(self._held))
+        return conn
+
+    def _open(self):
+        conn = psycopg2.connect(connection_factory=PooledConnection, **self.connect_kwargs)
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    def _healthy(self, conn, idle_since):
+        """ Test a connection that has been idle for long, and replace it if the server has gone away """
+        if conn is None:
+            return self._open()
+        if conn.closed:
+            return self._replace(conn)
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return conn
+        with self._lock:
+            self.health_checks += 1
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return self._replace(conn)
+
+    def _replace(self, conn):
+        if self.logger:
+            self.logger.warning("Replacing broken database connection")
+        with self._lock:
+            self.replaced += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        return self._open()
+
+    def _checkin(self, task, conn, failed):
+        try:
+            if not conn.closed and (failed or conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE):
+                # Never hand an open transaction to the next thread
+                with self._lock:
+                    self.rollbacks += 1
+                conn.rollback()
+        except psycopg2.Error:
+            pass
+        finally:
+            with self._lock:
+                del self._held[task]
+                if not conn.closed:
+                    self._idle.append((conn, time.monotonic()))
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out the connection of the calling thread for the duration of the block.
+
+        An uncommitted transaction is rolled back when the outermost block exits.
+        """
+        task = current_task()
+        with self._lock:
+            held = self._held.get(task)
+            if held:
+                self.reuses += 1
+        if held:
+            held[1] += 1  # Only the task holding the entry touches its depth
+            try:
+                yield held[0]
+            finally:
+                held[1] -= 1
+            return
+
+        conn = self._checkout(task)
+        failed = False
+        try:
+            yield conn
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self._checkin(task, conn, failed)
+
+    def holds(self) -> bool:
+        """ :return: Whether the calling thread has a connection checked out """
+        task = current_task()
+        with self._lock:
+            return task in self._held
+
+    def current(self):
+        """ :return: The connection checked out by the calling thread, within a connection() block """
+        task = current_task()
+        with self._lock:
+            held = self._held.get(task)
+        if not held:
+            raise psycopg2.pool.PoolError("No database connection checked out by this thread")
+        return held[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"max_connections": self.maxconn,
+                    "open": len(self._idle) + len(self._held),
+                    "opened": self.opened,
+                    "in_use": len(self._held),
+                    "peak_in_use": self.peak_in_use,
+                    "checkouts": self.checkouts,
+                    "reuses": self.reuses,
+                    "waits": self.waits,
+                    "mean_wait_ms": self.wait_time / self.checkouts * 1000.0 if self.checkouts else 0.0,
+                    "max_wait_ms": self.max_wait * 1000.0,
+                    "health_checks": self.health_checks,
+                    "replaced": self.replaced,
+                    "rollbacks": self.rollbacks,
+                    "offloaded": self.offloaded,
+                    }
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _returned_at in idle:
+            conn.close()
+
+
+_pool = None
+_pool_lock = Lock()
+
+
+def get_pool(logger=None) -> ConnectionPool:
+    """ :return: The connection pool of the application, created on first use """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(logger, dbname=DB_NAME)
+    return _pool
+
+
+_stream_ids = itertools.count()
+
+
+@contextmanager
+def stream_rows(query, args=None, itersize=STREAM_FETCH_SIZE, cursor_factory=None):
+    """
+    Stream the rows of a query through a named server-side cursor, as in
+
+        with stream_rows(query, args) as rows:
+            for row in rows:
+                ...
+
+    Must be used within a connection() block or a pooled function, whose connection the cursor is opened on, so the
+    fetches are made by the thread holding it. The cursor is closed when the block exits, also when the rows are
+    abandoned early. Do not commit on the connection within the block, as that closes the cursor.
+
+    :param query: The SELECT statement.
+    :param args: The query parameters.
+    :param itersize: The number of rows fetched from the server per round trip.
+    :param cursor_factory: The cursor class, e.g. psycopg2.extras.RealDictCursor, None for tuples.
+    :raises psycopg2.pool.PoolError: When the calling thread has no connection checked out.
+    """
+    pool = get_pool()
+    if not pool.holds():
+        raise psycopg2.pool.PoolError("stream_rows used outside a connection() block")
+    with pool.current().cursor("stream_%d" % next(_stream_ids), cursor_factory=cursor_factory) as cur:
+        cur.itersize = itersize
+        cur.execute(query, args)
+        yield cur
+
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def copy_rows(cur, table, columns, rows) -> int:
+    """
+    Load rows into a table with a single COPY, in one round trip however many rows there are.
+
+    :param cur: The cursor to copy through.
+    :param table: The table to load, typically a temporary one.
+    :param columns: The column names, in the order of the row values.
+    :param rows: The rows, as sequences of values. None is loaded as NULL, anything else as its str().
+    :return: The number of rows loaded.
+    """
+    buf = io.StringIO()
+    count = 0
+    for row in rows:
+        buf.write("\t".join("\\N" if v is None else str(v).translate(_COPY_ESCAPES) for v in row))
+        buf.write("\n")
+        count += 1
+    buf.seek(0)
+    cur.copy_expert("COPY %s (%s) FROM STDIN" % (table, ", ".join(columns)), buf)
+    return count
+
+
+_offload = None
+_hub_thread = None
+
+
+def cooperate(offload) -> None:
+    """
+    Make cooperative functions called on the calling thread, the one running the eventlet hub, run through offload
+    instead, e.g. eventlet.tpool.execute. The green thread calling them then waits without blocking the hub, so a
+    slow query delays only its own handler. Green psycopg2 wait callbacks are not used, as they do not support COPY.
+
+    :param offload: Called as offload(func, *args, **kwargs), returning the result of func or raising its exception.
+        None to run everything in place again.
+    :return: None
+    """
+    global _offload, _hub_thread
+    _offload = offload
+    _hub_thread = threading.current_thread() if offload else None
+
+
+def cooperative(func):
+    """
+    Decorator running func in the thread pool set by cooperate() when called on the hub thread.
+
+    A call made while the calling green thread has a connection checked out runs in place, so it shares that
+    connection and transaction. Never call a cooperative function while holding a lock that the hub thread may
+    wait for, take the lock inside the function instead.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _offload is not None and threading.current_thread() is _hub_thread and not get_pool().holds():
+            pool = get_pool()
+            with pool._lock:
+                pool.offloaded += 1
+            return _offload(func, *args, **kwargs)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def pooled(func):
+    """
+    Decorator running func with a connection checked out, available through get_pool().current().
+    Cooperative, see cooperative().
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with get_pool().connection():
+            return func(*args, **kwargs)
+    return cooperative(wrapper)
@@ -12,9 +12,21 @@ from contest_log import *
 import psycopg2.extras
 from datetime import datetime
 import locator.src.maidenhead as mh
+from locator.src.maidenhead import batch as mh_batch
+import numpy as np
 import math
+import itertools
+import functools
 import adif_io
-import threading
+from locator_index import LocatorCallsignIndex
+from dbpool import ConnectionPool, pooled, stream_rows, copy_rows, STREAM_FETCH_SIZE
+from config_cache import ConfigCache
+from locator_resolver import LocatorResolver
+from worked_squares import WorkedSquares
+from import_jobs import ImportJobManager
+from home_table import HomeTable
+from station_index import StationGridIndex
+from statements import statements
 
 
 from typing import TYPE_CHECKING
@@ -22,6 +34,36 @@ if TYPE_CHECKING:
     import psycopg2
 
 
+LOG_COLUMNS = "qsoid, date, time, callsign, tx, rx, locator, distance, square, points, complete, propmode, accumulated_sqn, band, augmented_locator"
+
+CALLSIGNS_IN_LOCATOR = statements.register("callsigns_in_locator", """
+    SELECT DISTINCT callsign from nac_log_new WHERE locator like %s ORDER BY callsign""")
+
+MAP_SETTING = statements.register("map_setting", """
+    SELECT origo_lon, origo_lat, zoom from origi WHERE mh_length = %s and band = %s and az_from = %s and az_to = %s and log_scope = %s""")
+
+# The current time is cast to numeric to keep the fractional age in minutes; the threshold is compared as the
+# bigint of happened_at so the index on it can be used.
+REACHABLE_REPORTS = statements.register("reachable_reports", """
+    select r.rx_callsign as callsign,
+           r.rx_loc as locator, r.rx_heading as az, r.my_rx_distance as dist,
+           (%s::numeric - r.happened_at)/60 as age_minutes,
+           r.my_rx_heading as my_az, r.mode as txmode, r.happened_at as happened_at, r.dx_callsign as dx_callsign,
+           r.dx_loc as dx_loc, r.my_tx_heading, r.tx_heading, r.my_tx_distance, r.frequency, r.snr,
+           r.rx_beam_offset < %s/2 as beaming
+    from reports as r
+    where r.happened_at > %s
+        and r.rx_beam_offset < %s/2
+        and r.my_rx_distance < %s
+    order by happened_at desc""")
+
+REACHABLE_BEACONS = statements.register("reachable_beacons", """
+    select b.dx_callsign as callsign,
+           b.dx_loc as locator, b.frequency as frequency, b.snr as snr, b.mode as txmode, b.qtf as az
+    from beacons b
+    where frequency >= %s and frequency <= %s""")
+
+
 def commit_qso(request):
     _ret = {"added": 0, "adjusted": 0}
 
@@ -74,10 +116,10 @@ class HamOp:
         return self.p26
 
 
-    def __init__(self, app:'MyApp', logger, db: psycopg2):
+    def __init__(self, app:'MyApp', logger, pool: ConnectionPool):
         self.app = app
         self.logger = logger
-        self.db = db
+        self.pool = pool
         self.core_controls = True
         self.p27 = None
         self.p26 = None
@@ -89,7 +131,27 @@ class HamOp:
         self.pa_running = None
         self.last_status = 0xff
 
+        self.config_cache = ConfigCache(logger)
+
+        self.locator_resolver = LocatorResolver(logger)
+
+        self.locator_index = LocatorCallsignIndex(logger)
+        self.worked_squares = WorkedSquares(logger)
+        self.station_index = StationGridIndex(logger)
+        with self.pool.connection() as db:
+            self.locator_index.load(db)
+            self.worked_squares.load(db)
+            self.station_index.load(db)
+
+        self.import_jobs = ImportJobManager(app, logger)
+        self.home_table = HomeTable(logger, app.config['HOME_TABLE_FILE'], app.config['HOME_TABLE_RADIUS_KM'])
+        self.home_table.use_home(self.my_qth())
         pass
+    @property
+    def db(self):
+        """ The database connection checked out by the calling thread, see dbpool.pooled """
+        return self.pool.current()
+
     def disable_core_controls(self):
         self.core_controls=False
 
@@ -144,16 +206,8 @@ class HamOp:
         self.last_p26_sense = current_p26_sense
 
     def get_mydata(self, band="144"):
-        cur = self.db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
         ts = datetime.now().isoformat()[:10]
-        cur.execute("""SELECT * FROM config_str 
-                        WHERE (time_start IS NULL OR time_start <= %s ) AND 
-                               (time_stop IS NULL OR time_stop >= %s) AND
-                               (band IS NULL OR band = %s) 
-                               ORDER BY key""",
-                    (ts, ts, band)
-                    )
-        rows = cur.fetchall()
+        rows = self.config_cache.fetch("str", band=band, at_time=ts)
 
         msg = {x["key"]: x["value"] for x in rows}
         return msg
@@ -222,28 +276,10 @@ class HamOp:
         if band and type is not "str":
             raise ValueError("Fetching config data: band selector is only supported fir str type")
 
-        cur = self.db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        if at_time is None:
-            at_time = datetime.now().isoformat()
-        s = "SELECT "
-        s += "*" if key is None else "key, value"
-        s += " FROM config_%s WHERE (" % type
-        s += " (time_start IS NULL OR time_start <= %s) AND (time_stop IS NULL OR time_stop >= %s )"
-        s +=  "AND key = %s" if key is not None else " "
-        s += " AND (band IS NULL OR band = %s)" if band is not None else " "
-        s += ") ORDER BY key"
-
-        args = []
-        args.append(at_time)
-        args.append(at_time)
-        if key is not None: args.append(key)
-        if band is not None: args.append(band)
-        # print(s, args)
-        cur.execute(s, args)
-        rows = cur.fetchall()
-        return rows
+        return self.config_cache.fetch(type, key, band, at_time)
 
 
+    @pooled
     def set_config_data(self, type, key, value, from_time=None, to_time=None):
         if from_time is None:
             from_time = datetime.now().isoformat()
@@ -274,13 +310,23 @@ class HamOp:
         except Exception as e:
             print("Error:", e)
             self.db.rollback()  # Rollback on exception
+        self.config_cache.invalidate(type)
+        if key == "my_locator":
+            self.home_table.use_home(self.my_qth())
 
 
 
 
 
 
-    def get_log_rows(self, since: datetime=None, until:datetime=None):
+    def get_log_rows(self, since: datetime=None, until:datetime=None, itersize=STREAM_FETCH_SIZE):
+        """
+        :param since: Start of the span, None for no limit.
+        :param until: End of the span, None for no limit.
+        :param itersize: The number of rows fetched per round trip.
+        :return: A stream_rows context manager giving the log rows of the span lazily, ordered by date and time.
+                 It must be entered within a connection() block.
+        """
 
         t_date_start="1900-01-01T00:00:00"
         t_date_stop = "9999-12-31T23:59:59"
@@ -295,13 +341,9 @@ class HamOp:
         args = (
             t_date_start[:10], t_date_stop[:10], t_date_start[11:16].replace(":", ""), t_date_stop[11:16].replace(":", ""))
         # self.logger.info("Args =  %s" % str(args))
-        cur = self.db.cursor()
-        q = """SELECT qsoid, date, time, callsign, tx, rx, locator, distance, square, points, complete, propmode, accumulated_sqn, band, augmented_locator
+        q = """SELECT """ + LOG_COLUMNS + """
                FROM nac_log_new WHERE date >= %s and date <= %s and ((time >= %s and time <= %s) or time is null) ORDER BY date, time"""
-        cur.execute(q , args)
-
-        rows = cur.fetchall()
-        return rows
+        return stream_rows(q, args, itersize)
 
     def distance_to(self, other_loc, qso_date=None, qso_time=None):
         """
@@ -313,19 +355,14 @@ class HamOp:
         :return: A tuple containing the bearing and distance to the other location. If qso_date and qso_time
                  are provided, it also returns the points and square_count.
         """
-        bearing, distance = mh.distance_between(self.my_qth(), other_loc)
+        my_qth = self.my_qth()
+        bearing, distance = self.home_table.distance_between(my_qth, other_loc)
         points = math.ceil(distance)
 
         if qso_date and qso_time:
-            cur = self.db.cursor()
-            cur.execute("SELECT DISTINCT substr(locator, 1, 4) as square from nac_log_new where date=%s and time < %s",
-                        (qso_date, qso_time))
-            rows = cur.fetchall()
-            squares = {x[0] for x in rows}
-            square_count = len(squares)
+            square_count, new_square = self.worked_squares.day_squares(qso_date, qso_time, other_loc)
 
-            if other_loc[:4] not in squares:
-                squares.add(other_loc[:4])
+            if new_square:
                 square_count += 1
                 if "1700" <= qso_time < "2200":
                     points += 500
@@ -334,11 +371,18 @@ class HamOp:
 
         return bearing, distance, points, square_count
 
+    @pooled
     def do_delete_qso(self, qso):
         self.logger.warning("Deleting qso with id=%s" % qso["id"])
         cur = self.db.cursor()
-        cur.execute("""DELETE FROM nac_log_new WHERE qsoid = %s""", (int(qso["id"]),))
+        cur.execute("""DELETE FROM nac_log_new WHERE qsoid = %s RETURNING qsoid, callsign, locator""", (int(qso["id"]),))
+        deleted = cur.fetchall()
         self.db.commit()
+        for qsoid, callsign, locator in deleted:
+            self.locator_index.remove(callsign, locator)
+            self.locator_resolver.invalidate([callsign])
+            self.worked_squares.remove(qsoid)
+            self.app.client_mgr.log_model.apply_delete(qsoid)
         # self.app.client_mgr.send_reload()
 
     def find_augmented_locator(self, callsign:str, given_locator:str) ->Union[str, None]:
@@ -350,25 +394,27 @@ class HamOp:
         :return: The augmented locator of the person if found, else None.
         :rtype: str
         """
-        if not callsign:
-            return None
-        cur = self.db.cursor()
-
-        if not given_locator:
-            cur.execute("""SELECT upper(locator) FROM callbook WHERE callsign=%s order by char_length(locator) DESC""",
-                        (callsign.upper(),))
-        else:
-            short_given_loc=given_locator[0:4]
-            cur.execute("""SELECT upper(locator) FROM callbook WHERE callsign=%s and substr(locator,1,4) = %s order by last_change DESC""",
-                    (callsign.upper(), short_given_loc.upper()))
-        rows = cur.fetchall()
-        if not rows:
-            return None
-        return rows[0][0]
+        return self.locator_resolver.augmented(callsign, given_locator)
 
 
+    @pooled
     def do_commit_qso(self, qso):
         cur = self.db.cursor()
+        new_qso_id, apply = self._write_qso(cur, qso)
+        self.db.commit()
+        cur.close()
+        apply()
+        return new_qso_id
+
+    def _write_qso(self, cur, qso):
+        """
+        Insert a qso into nac_log_new, or update it when it has an id, without committing.
+
+        :param cur: The cursor of the transaction to write in.
+        :param qso: The qso, as sent by the client.
+        :return: A tuple (qso id, callable). Call the callable once the transaction has been committed, to update the
+                 in-memory state and the clients.
+        """
         if "square" not in qso or not qso["square"]:
             qso["square"] = None
         if "locator" not in qso or not qso["locator"]:
@@ -405,17 +451,7 @@ class HamOp:
                 propmode = "EME"
         accumulated_square = None
         if "locator" in qso and qso["locator"]:
-            cur.execute(
-                """SELECT DISTINCT upper(substr(locator, 1, 4)) as loc FROM nac_log_new WHERE split_part(split_part(band,'-',1), '.',1) = %s""",
-                (qso["band"].split('-')[0],))
-
-            rows = cur.fetchall()
-
-            for row in rows:
-                if row[0] == qso["locator"][:4].upper():
-                    break
-            else:
-                accumulated_square = str(len(rows) + 1)
+            accumulated_square = self.worked_squares.accumulated_square(qso["band"].split('-')[0], qso["locator"])
         else:
             qso["locator"] = None
 
@@ -427,35 +463,54 @@ class HamOp:
             qso["augmented_locator"] = qso["locator"]
 
         if "id" in qso and qso["id"]:
+            cur.execute("""SELECT callsign, locator FROM nac_log_new WHERE qsoid = %s FOR UPDATE""", (qso["id"],))
+            old_row = cur.fetchone()
             cur.execute("""UPDATE nac_log_new SET date=%s, time=%s, callsign=%s, tx=%s , rx=%s , locator=%s, distance=%s, square=%s, points=%s, complete=%s, band=%s, accumulated_sqn=%s, txmode=%s, propmode=%s, augmented_locator=%s 
-                                  WHERE qsoid = %s""",
+                                  WHERE qsoid = %s RETURNING """ + LOG_COLUMNS,
                         (qso["date"], qso["time"], qso["callsign"], qso["tx"], qso["rx"], qso["locator"],
                          qso["distance"], qso["square"], qso["points"], qso["complete"], band_or_fq, accumulated_square,
                          txmode, propmode, qso["augmented_locator"], qso["id"]))
+            new_row = cur.fetchone()
             new_qso_id = qso["id"]
         else:
 
             cur.execute("""INSERT INTO nac_log_new (date, time, callsign, tx , rx , locator, distance, square, points, complete, band, accumulated_sqn, txmode, propmode, augmented_locator) 
-                      values (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,%s, %s) RETURNING qsoid""",
+                      values (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,%s, %s) RETURNING """ + LOG_COLUMNS,
                     (qso["date"], qso["time"], qso["callsign"], qso["tx"], qso["rx"], qso["locator"],
                      qso["distance"], qso["square"], qso["points"], qso["complete"], band_or_fq, accumulated_square,
                      txmode, propmode, qso["augmented_locator"]))
-            new_qso_id = cur.fetchone()[0]
-        self.db.commit()
-        cur.close()
+            new_row = cur.fetchone()
+            new_qso_id = new_row[0]
+            old_row = None
+        return new_qso_id, functools.partial(self._apply_committed_qso, qso, old_row, new_row)
+
+    def _apply_committed_qso(self, qso, old_row, new_row):
+        """ Account for a committed qso written by _write_qso in the in-memory state, and show it to the clients """
+        if old_row:
+            self.locator_index.replace(old_row[0], old_row[1], qso["callsign"], qso["locator"])
+            self.locator_resolver.invalidate([old_row[0], qso["callsign"]])
+        else:
+            self.locator_index.add(qso["callsign"], qso["locator"])
+            self.locator_resolver.invalidate([qso["callsign"]])
+        if new_row:
+            self.worked_squares.apply(new_row[0], new_row[1], new_row[2], new_row[6], new_row[13])
+            self.app.client_mgr.log_model.apply_commit(new_row)
 
         if "augmented_locator" in qso and qso["augmented_locator"]:
             self.app.client_mgr.add_locator_rect_to_map(qso["augmented_locator"])
-        if "id" in qso and qso["id"]:
-            return qso["id"]
-        else:
+        if not ("id" in qso and qso["id"]):
             self.app.client_mgr.add_qso(qso)
-            return new_qso_id
 
     def callsigns_in_locator(self, loc):
+        """ Answered from the locator index without touching the database, whenever the index covers loc """
+        if self.locator_index.covers(loc):
+            return self.locator_index.callsigns(loc)
+        return self._query_callsigns_in_locator(loc)
+
+    @pooled
+    def _query_callsigns_in_locator(self, loc):
         cur = self.db.cursor()
-        q = "SELECT DISTINCT callsign from nac_log_new WHERE locator like %s ORDER BY callsign"
-        cur.execute(q, (loc+'%',))
+        statements.execute(cur, CALLSIGNS_IN_LOCATOR, (loc+'%',))
         rows = cur.fetchall()
         return [x[0] for x in rows]
 
@@ -529,137 +584,138 @@ class HamOp:
         self.p27.bit_write(P27_TX_432_L, HIGH)
         return "70cm tx disabled"
 
-    def merge_into_log_db(self, cur, ret, qso):
+    ADI_UPLOAD_COLUMNS = ("seq", "qso_date", "time_on", "callsign", "locator", "propmode", "txmode", "frequency",
+                          "rst_sent", "rst_rcvd")
 
-        #starttime = starttime.replace(':', '')[:4]
+    @staticmethod
+    def _adi_upload_row(seq, qso):
+        """ :return: The row of an uploaded ADIF qso in ADI_UPLOAD_COLUMNS order """
         starttime = qso["TIME_ON"][:4]
         startdate = qso["QSO_DATE"][:4]+'-'+qso["QSO_DATE"][4:6]+"-"+qso["QSO_DATE"][6:8]
+        propmode = qso["PROP_MODE"] if "PROP_MODE" in qso else "TR"
+        if propmode == "TR":
+            propmode = "T"
+        locator = qso["GRIDSQUARE"].upper() if "GRIDSQUARE" in qso else None
+        return (seq, startdate, starttime, qso["CALL"].upper(), locator, propmode, qso["MODE"], qso["FREQ"],
+                qso["RST_SENT"], qso["RST_RCVD"])
 
+    def merge_into_log_db(self, cur, ret, qsos):
+        """
+        Reconcile uploaded ADIF qsos with adif_log, set-based.
 
-        #_endtime = endtime.replace(':', '')[:4]
-        _endtime =  qso["TIME_OFF"][:4]
-        if "PROP_MODE" in qso:
-            propmode=qso["PROP_MODE"]
-        else:
-            propmode="TR"
+        The qsos are copied into a temporary table, matched against adif_log within 10 minutes in one join, and the
+        corrections are written in one UPDATE.
 
-        txmode = qso["MODE"]
-        frequency = qso["FREQ"]
-        if propmode == "TR":
-            propmode = "T"
-        callsign = qso["CALL"].upper()
-        if "GRIDSQUARE" in qso:
-            locator = qso["GRIDSQUARE"].upper()
-        else:
-            locator = None
-        trprt = qso["RST_SENT"]
-        rrprt = qso["RST_RCVD"]
-
-        q = """SELECT id, qso_date, time_on, rst_sent, rst_rcvd, gridsquare, propmode, txmode from adif_log where qso_date=%s and
-                                 abs(date_part('hour',time_on::time-%s::time)*60+date_part('minute',time_on::time-%s::time)) < 10
-                                 and call = %s"""
-        cur.execute(q, (startdate, starttime, starttime, callsign))
-        lines = cur.fetchall()
-        if len(lines) == 1:
-            # print("Found QSO: %s" % lines)
-            qso = lines[0]
-            qso_date = qso[1]
-            qso_time = qso[2]
-            adjustments = 0
-            if locator not in qso[5]:
-                self.logger.error("Bad locator %s, should be %s" % (qso[5], locator))
-                bearing, distance, points, square_no = self.distance_to(locator, qso_date, qso_time)
-                cur.execute(
-                    "UPDATE adif_log set gridsquare = %s, distance = %s, stnmate_square_no = %s, stnmate_points = %s where id=%s",
-                    (locator, str(int(distance * 100) / 100.0), square_no, points, qso[0]))
-                adjustments += 1
-            if qso[6] != propmode and propmode:
-                self.logger.error("Bad propagation mode %s, should be %s" % (qso[6], propmode))
-                cur.execute("UPDATE adif_log set propmode = %s where id=%s", (propmode, qso[0]))
-                adjustments += 1
-            if qso[7] != txmode:
-                self.logger.error("Bad transmit mode %s, should be %s" % (qso[7], txmode))
-                cur.execute("UPDATE adif_log set mode = %s where id=%s", (txmode, qso[0]))
-                adjustments += 1
-            if qso[3] != trprt:
-                self.logger.error("Bad sent report %s, should be %s" % (qso[3], trprt))
-                cur.execute("UPDATE adif_log set rst_sent = %s where id=%s", (trprt, qso[0]))
-                adjustments += 1
-            if qso[4] != rrprt:
-                self.logger.error("Bad received report %s, should be %s" % (qso[4], rrprt))
-                cur.execute("UPDATE adif_log set rst_rcvd = %s where id=%s", (rrprt, qso[0]))
-                adjustments += 1
-            if adjustments:
-                ret["adjusted"] += 1
-        elif len(lines) > 1:
-            self.logger.error("Multiple qsos found; %s" % lines)
-            pass
-        else:
-            q = """SELECT qsoid, date, time, tx, rx, locator, abs(date_part('hour',time::time-%s::time)*60+date_part('minute',time::time-%s::time)) as datetime from nac_log_new where date=%s
-                                    and callsign = %s"""
-            cur.execute(q, (starttime, starttime, startdate, callsign))
-            lines = cur.fetchall()
-            self.logger.error("Missing QSO: %s" % str(qso))
-            if lines:
-                self.logger.debug("Found:", lines)
+        :param cur: The cursor of the upload transaction. The caller commits.
+        :param ret: The summary, whose "matched", "added" and "adjusted" counts are incremented.
+        :param qsos: The qsos as read by adif_io.
+        :return: None
+        """
+        uploaded = [self._adi_upload_row(seq, qso) for seq, qso in enumerate(qsos)]
+        if not uploaded:
+            return
+        # Called once per chunk of an upload, all in the transaction of the import job
+        cur.execute("""CREATE TEMP TABLE IF NOT EXISTS adi_upload (seq integer, qso_date date, time_on text,
+                       callsign text, locator text, propmode text, txmode text, frequency text, rst_sent text,
+                       rst_rcvd text) ON COMMIT DROP""")
+        cur.execute("TRUNCATE adi_upload")
+        copy_rows(cur, "adi_upload", self.ADI_UPLOAD_COLUMNS, uploaded)
+
+        # Every uploaded qso with its matches in adif_log, or one row of NULLs and whether the log has the callsign
+        # that day when there is no match
+        cur.execute("""SELECT u.seq, a.id, a.qso_date, a.time_on, a.rst_sent, a.rst_rcvd, a.gridsquare, a.propmode,
+                              a.txmode, count(a.id) OVER (PARTITION BY u.seq),
+                              a.id IS NULL AND EXISTS (SELECT 1 FROM nac_log_new n
+                                                        WHERE n.date = u.qso_date AND n.callsign = u.callsign)
+                         FROM adi_upload u
+                         LEFT JOIN adif_log a ON a.call = u.callsign AND a.qso_date = u.qso_date AND
+                              abs(date_part('hour', a.time_on::time - u.time_on::time)*60 +
+                                  date_part('minute', a.time_on::time - u.time_on::time)) < 10
+                        ORDER BY u.seq""")
+        matches = cur.fetchall()
+
+        corrections = {}  # adif_log id -> [gridsquare, distance, square_no, points, propmode, mode, rst_sent, rst_rcvd]
+        for seq, group in itertools.groupby(matches, key=lambda m: m[0]):
+            group = list(group)
+            _seq, _startdate, _starttime, callsign, locator, propmode, txmode, _frequency, trprt, rrprt = uploaded[seq]
+            qso = group[0]
+            if qso[9] == 1:
+                ret["matched"] += 1
+                qso_date = qso[2]
+                qso_time = qso[3]
+                correction = [None] * 8
+                if locator and (qso[6] is None or locator not in qso[6]):
+                    self.logger.error("Bad locator %s, should be %s" % (qso[6], locator))
+                    bearing, distance, points, square_no = self.distance_to(locator, qso_date, qso_time)
+                    correction[0:4] = locator, str(int(distance * 100) / 100.0), square_no, points
+                if qso[7] != propmode and propmode:
+                    self.logger.error("Bad propagation mode %s, should be %s" % (qso[7], propmode))
+                    correction[4] = propmode
+                if qso[8] != txmode:
+                    self.logger.error("Bad transmit mode %s, should be %s" % (qso[8], txmode))
+                    correction[5] = txmode
+                if qso[4] != trprt:
+                    self.logger.error("Bad sent report %s, should be %s" % (qso[4], trprt))
+                    correction[6] = trprt
+                if qso[5] != rrprt:
+                    self.logger.error("Bad received report %s, should be %s" % (qso[5], rrprt))
+                    correction[7] = rrprt
+                if any(c is not None for c in correction):
+                    merged = corrections.setdefault(qso[1], [None] * 8)
+                    merged[:] = [c if c is not None else m for c, m in zip(correction, merged)]
+                    ret["adjusted"] += 1
+            elif qso[9] > 1:
+                self.logger.error("Multiple qsos found; %s" % [m[1:9] for m in group])
             else:
-                bearing, distance, points, square_no = self.distance_to(locator, startdate, starttime)
-                qso = {
-                    "date": startdate,
-                    "time": starttime,
-                    "callsign": callsign,
-                    "tx": trprt,
-                    "rx": rrprt,
-                    "locator": locator,
-                    "distance": str(int(distance * 100) / 100.0),
-                    "square": square_no,
-                    "points": points,
-                    "complete": True,
-                    "band": "%d-%s" % (int(float(frequency)), txmode),
-                    "propmode": propmode,
-                    "txmode": txmode,
-                    "frequency": frequency,
-                }
-                # self.do_commit_qso(qso)
-                ret["added"] += 1
-
-    def process_log_file(self, cur, file_data):
-        ret = {"added": 0, "adjusted": 0}
-        for qsos in file_data.splitlines():
-            qso = qsos.split(',')
-            self.merge_into_old_log_db(cur, qso, ret)
-        if ret["added"] or ret["adjusted"]:
-             self.db.commit()
-        self.app.client_mgr.emit("show_alert","WSJT-X log file uploaded. QSQ:s added: %d, adjusted: %s" % (ret["added"], ret["adjusted"]))
-
-    def process_adi_file(self, cur, file_data):
-        ret = {"added": 0, "adjusted": 0}
-        qsos_raw, adif_header = adif_io.read_from_string(file_data)
-        for qso in qsos_raw:
-            self.merge_into_log_db(cur, ret, qso)
-        if ret["added"] or ret["adjusted"]:
-            self.db.commit()
-        self.app.client_mgr.emit("show_alert", "WSJT-X adi file uploaded. QSQ:s added: %d, adjusted: %s" % (ret["added"], ret["adjusted"]))
+                self.logger.error("Missing QSO: %s" % str(qsos[seq]))
+                if qso[10]:
+                    self.logger.debug("Found %s in the log on %s" % (callsign, uploaded[seq][1]))
+                else:
+                    # Not written to the log yet, see merge_into_old_log_db
+                    ret["added"] += 1
+
+        if corrections:
+            rows = [(adif_id,) + tuple(c) for adif_id, c in corrections.items()]
+            psycopg2.extras.execute_values(cur, """UPDATE adif_log AS a SET
+                                                       gridsquare = COALESCE(v.gridsquare, a.gridsquare),
+                                                       distance = COALESCE(v.distance, a.distance),
+                                                       stnmate_square_no = COALESCE(v.square_no, a.stnmate_square_no),
+                                                       stnmate_points = COALESCE(v.points, a.stnmate_points),
+                                                       propmode = COALESCE(v.propmode, a.propmode),
+                                                       mode = COALESCE(v.mode, a.mode),
+                                                       rst_sent = COALESCE(v.rst_sent, a.rst_sent),
+                                                       rst_rcvd = COALESCE(v.rst_rcvd, a.rst_rcvd)
+                                                   FROM (VALUES %s) AS v(id, gridsquare, distance, square_no, points,
+                                                                         propmode, mode, rst_sent, rst_rcvd)
+                                                   WHERE a.id = v.id""",
+                                           rows, template="(%s, %s, %s, %s::integer, %s::integer, %s, %s, %s, %s)",
+                                           page_size=len(rows))
 
     def my_wsjtx_upload(self, request):
         """
+        Queue the uploaded WSJT-X .log and .adi files for import. The progress is pushed as import_progress events.
+
         :param request: The request object containing files to be uploaded.
-        :return: A string indicating the number of QSOs added and adjusted during the upload process.
+        :return: A string listing the queued import jobs.
         """
-        cur = self.db.cursor()
+        queued = []
         for k, v in request.files.items():
-            file_data = v.read().decode("utf-8")
-            if v.filename.endswith(".log"):
-                t=threading.Thread(target=self.process_log_file, args=(cur,file_data))
-                t.start()
-                # self.process_log_file(cur, file_data, ret)
-            elif v.filename.endswith(".adi"):
-                t = threading.Thread(target=self.process_adi_file, args=(cur, file_data))
-                t.start()
-                # self.process_adi_file(cur, file_data, ret)
-        return
-
-    def merge_into_old_log_db(self, cur, qso, ret):
+            job = self.import_jobs.submit(v.filename, v.read().decode("utf-8"))
+            if job:
+                queued.append("%s queued as import job %d" % (job.filename, job.id))
+        return "<br/>".join(queued)
+
+    def merge_into_old_log_db(self, cur, qso, ret, after_commit):
+        """
+        Reconcile one qso of an uploaded WSJT-X .log file with nac_log_new.
+
+        :param cur: The cursor of the upload transaction. The caller commits.
+        :param qso: The comma separated fields of the line.
+        :param ret: The summary, whose "matched", "added" and "adjusted" counts are incremented.
+        :param after_commit: A list the in-memory updates are appended to, as callables. The caller calls them once
+                             the transaction has been committed, so a failing upload leaves them untouched.
+        :return: None
+        """
         try:
 
             startdate, starttime, enddate, endtime, callsign, locator, frequency, txmode, trprt, rrprt, power, comment, dxname, propmode = qso[0:14]
@@ -689,6 +745,7 @@ class HamOp:
         lines = cur.fetchall()
         if len(lines) == 1:
             # print("Found QSO: %s" % lines)
+            ret["matched"] += 1
             qso_in_db = lines[0]
             qso_in_db_date = qso_in_db[1]
             qso_in_db_time = qso_in_db[2]
@@ -716,6 +773,7 @@ class HamOp:
                 cur.execute(
                     "UPDATE nac_log_new set locator = %s, distance = %s, square = %s, points = %s where qsoid=%s",
                     (locator, str(int(distance * 100) / 100.0), square_no, points, qso_in_db[0]))
+                after_commit.append(functools.partial(self._apply_relocation, qso_in_db[0], callsign, qso_in_db[5], locator))
                 adjustments += 1
             if qso_in_db[6] != propmode and propmode:
                 self.logger.error("Bad propagation mode %s, should be %s" % (qso_in_db[6], propmode))
@@ -770,9 +828,16 @@ class HamOp:
                     "frequency": frequency,
                     "bearing": bearing
                 }
-                self.do_commit_qso(qso_in_db)
+                _qso_id, apply = self._write_qso(cur, qso_in_db)
+                after_commit.append(apply)
                 ret["added"] += 1
 
+    def _apply_relocation(self, qsoid, callsign, old_locator, locator):
+        """ Account for a committed change of the locator of a qso in the in-memory state """
+        self.locator_index.replace(callsign, old_locator, callsign, locator)
+        self.locator_resolver.invalidate([callsign])
+        self.worked_squares.relocate(qsoid, locator)
+
     def make_log(self, json):
         band = json.get("band", None)
         log_remarks = json.get("log_remarks", None)
@@ -892,63 +957,16 @@ class HamOp:
 
     def lookup_locator(self, callsign, given_loc=None) -> Optional[str]:
         """
-        Retrieves the locator associated with a given callsign from the QSO log or, if not found, from the callbook in the database.
+        Retrieves the locator associated with a given callsign from the QSO log or the callbook, whichever is more recent.
 
         :param callsign: The callsign to lookup.
         :param given_loc: The optional locator to match against.
         :return: The found locator if found and matches given_loc, otherwise None.
         """
-        q = """SELECT qsoid, locator, date from nac_log_new where callsign = %s order by date desc"""
-
-        cur = self.db.cursor()
-        cur.execute(q, (callsign,))
-        rows = cur.fetchall()
-        log_loc = None
-        log_date = None
-        callbook_loc = None
-        callbook_date = None
-        found_loc = None
-
-        for row in rows:
-            if not row[1] or len(row[1]) < 6:
-                continue
-            log_loc = row[1].upper()
-            log_date = row[2]
-            break
-
-
-        q = """SELECT locator, last_change from callbook where callsign = %s order by last_change desc, length(locator) desc"""
-        cur = self.db.cursor()
-        cur.execute(q, (callsign,))
-        rows = cur.fetchall()
-        for row in rows:
-            if len(row[0]) < 6:
-                continue
-            callbook_loc = row[0].upper()
-            callbook_date = datetime.isoformat(row[1]).replace('T',' ')
-            break
-
-        if callbook_loc and log_loc:
-            if log_date > callbook_date:
-                found_loc = log_loc
-            else:
-                found_loc = callbook_loc
-
-        else:
-            if callbook_loc:
-                found_loc =callbook_loc
-            elif log_loc:
-                found_loc = log_loc
-            else:
-                return None
-
-        if given_loc:
-            return found_loc if given_loc[:4] == found_loc[:4] else None
-        else:
-            return found_loc
-
+        return self.locator_resolver.lookup(callsign, given_loc)
 
 
+    @pooled
     def store_map_setting(self, json, current_band, map_mh_length, log_scope):
         """
         Store the map setting in the database.
@@ -972,17 +990,28 @@ class HamOp:
         cur.execute(q, args)
         self.db.commit()
 
+    @pooled
     def get_map_setting(self, current_band, map_mh_length, log_scope):
-        q = """SELECT origo_lon, origo_lat, zoom from origi WHERE mh_length = %s and band = %s and az_from = %s and az_to = %s and log_scope = %s"""
         from_az, to_az = self.app.azel.get_az_sector()
         args = [map_mh_length, current_band, from_az, to_az, log_scope]
         cur = self.db.cursor()
-        cur.execute(q, args)
+        statements.execute(cur, MAP_SETTING, args)
         lines = cur.fetchall()
         if lines:
             return lines[0]
 
-    def get_reachable_stations(self, max_age=1800, max_dist=40000, max_beamwidth=30, band="144"):  # max_age in seconds, max_distance in km, max_beamwidth in degrees
+    @pooled
+    def get_reachable_stations(self, max_age=1800, max_dist=40000, max_beamwidth=30, other_beamwidth=720, band="144"):  # max_age in seconds, max_distance in km, max_beamwidth in degrees
+        """
+        Find the stations heard recently, in one pass over the reports.
+
+        :param max_age: The maximum age of a report in seconds.
+        :param max_dist: The maximum distance to a station in km.
+        :param max_beamwidth: The beamwidth in degrees within which a station is considered beaming at me.
+        :param other_beamwidth: The beamwidth in degrees within which a station is considered at all.
+        :param band: The band to find beacons on.
+        :return: A tuple (beaming, other) of dicts keyed by callsign, with the stations beaming at me and all stations.
+        """
         # self.logger.debug("get_reachable_stations max_age=%d, max_dist=%d. max_beamwidth=%d" %(max_age, max_dist, max_beamwidth))
 
         dt = datetime.now()
@@ -1001,82 +1030,63 @@ class HamOp:
             minfq=0
             maxfq=360000000000
 
-        q1 = """ select distinct on (r.rx_callsign, r.rx_loc) r.rx_callsign as callsign, 
-                                    r.rx_loc as locator, r.rx_heading as az, r.my_rx_distance as dist, 
-                                    (extract(epoch from statement_timestamp()) - r.happened_at)/60 as age_minutes, 
-                                    r.my_rx_heading as my_az, r.mode as txmode, r.happened_at as happened_at, r.dx_callsign as dx_callsign, r.dx_loc as dx_loc
-                from reports as r
-                where ABS(MOD(r.rx_heading - 180, 360) - r.my_rx_heading) < %s/2
-                    and r.my_rx_distance < %s 
-                    and  extract(epoch from statement_timestamp()) - happened_at < %s
-                group by callsign, locator, az, dist, age_minutes, my_az, txmode, happened_at, dx_callsign, dx_loc
-                union
-                select distinct on (t.dx_callsign, t.dx_loc) t.dx_callsign as callsign , 
-                                    t.dx_loc as locator, t.tx_heading as az, t.my_tx_distance as dist, 
-                                    (extract(epoch from statement_timestamp()) - t.happened_at)/60 as age_minutes, 
-                                    t.my_tx_heading as my_az, t.mode as txmode, t.happened_at as happened_at, t.rx_callsign as dx_callsign, t.rx_loc as dx_loc
-                from reports as t
-                where ABS(MOD(t.tx_heading - 180, 360) - t.my_tx_heading) < %s/2
-                    and t.my_tx_distance < %s 
-                    and  extract(epoch from statement_timestamp()) - t.happened_at < %s
-                group by callsign, locator, az, dist, age_minutes, my_az, txmode, happened_at, dx_callsign, dx_loc
-                order by age_minutes;
-            """
-        q = """ select r.rx_callsign as callsign, 
-                                            r.rx_loc as locator, r.rx_heading as az, r.my_rx_distance as dist, 
-                                            (%s - r.happened_at)/60 as age_minutes, 
-                                            r.my_rx_heading as my_az, r.mode as txmode, r.happened_at as happened_at, r.dx_callsign as dx_callsign, 
-                                            r.dx_loc as dx_loc, r.my_tx_heading, r.tx_heading, r.my_tx_distance, r.frequency, r.snr
-                        from reports as r
-                        where ABS(MOD(r.rx_heading - 180, 360) - r.my_rx_heading) < %s/2
-                            and r.my_rx_distance < %s 
-                            and  %s - happened_at < %s
-                        order by happened_at desc 
-                    """
-        beacon_query = """ select b.dx_callsign as callsign, 
-                                                    b.dx_loc as locator, b.frequency as frequency, b.snr as snr, b.mode as txmode, b.qtf as az
-                                from beacons b 
-                                where frequency >= %s and frequency <= %s
-                            """
+        with self.db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            beaming = {}
+            other = {}
 
-        with self.db.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            #cur.execute(q, (max_beamwidth, max_dist, max_age, max_beamwidth, max_dist, max_age))
-            # self.logger.debug("executing %s with max_beamwidth=%d, max_dist=%d, max_age=%d" %(q, max_beamwidth, max_dist, max_age))
+            statements.execute(cur, REACHABLE_BEACONS, (minfq, maxfq))
+            for r in cur.fetchall():
+                cs = r["callsign"]
+                if cs not in other:
+                    beaming[cs] = other[cs] = r
 
-            ret = {}
+            statements.execute(cur, REACHABLE_REPORTS, (ts, max_beamwidth, int(ts - max_age), other_beamwidth, max_dist))
+            for r in cur.fetchall():
+                if r.pop("beaming"):
+                    self._merge_report(beaming, r)
+                self._merge_report(other, r)
 
-            cur.execute(beacon_query, (minfq, maxfq))
-            rows = cur.fetchall()
-            for r in rows:
-                cs = r["callsign"]
-                if cs not in ret:
-                    ret[cs] = r
+        return beaming, other
 
-            cur.execute(q, (ts, max_beamwidth, max_dist, ts, max_age))
-            rows = cur.fetchall()
-            for r in rows:
-                cs = r["callsign"]
-                if cs not in ret or ret[cs]["happened_at"] < r["happened_at"]:
-                    ret[cs] = r
-                dxcs = r["dx_callsign"]
-                if dxcs not in ret or ("happened_at" in ret[dxcs] and ret[dxcs]["happened_at"] < r["happened_at"]):
-                    rp = r.copy()
-                    rp["callsign"] = dxcs
-                    rp["locator"] = r["dx_loc"]
-                    rp["dx_loc"] = r["locator"]
-                    rp["dx_callsign"] = cs
-                    rp["az"] = r["tx_heading"]
-                    rp["tx_heading"] = r["az"]
-                    rp["dist"] = r["my_tx_distance"]
-                    rp["my_tx_distance"] = r["dist"]
-                    rp["my_az"] = r["my_tx_heading"]
-                    rp["my_tx_heading"] = r["my_az"]
-                    ret[cs] = dict(r)
-                    ret[dxcs] = dict(rp)
-
-
-            return ret
+    def stations_in_sector(self, az_from, az_to, min_dist=0, max_dist=math.inf, max_age=1800):
+        """
+        Find the stations heard recently within a beam sector and distance band, from the station index.
+
+        :param az_from: The start bearing of the sector in degrees, going clockwise.
+        :param az_to: The end bearing of the sector in degrees.
+        :param min_dist: The least distance to a station in km.
+        :param max_dist: The greatest distance to a station in km.
+        :param max_age: The maximum age of the latest report of a station in seconds.
+        :return: The stations, nearest first.
+        """
+        return self.station_index.sector(az_from, az_to, min_dist, max_dist,
+                                         since=datetime.timestamp(datetime.now()) - max_age)
 
+    @staticmethod
+    def _merge_report(ret, r):
+        """
+        Enter a report into a dict of stations, for both its receiving and its sending station, unless a fresher
+        report of the station is already there. Beacons are never replaced.
+        """
+        cs = r["callsign"]
+        if cs not in ret or ("happened_at" in ret[cs] and ret[cs]["happened_at"] < r["happened_at"]):
+            ret[cs] = r
+        dxcs = r["dx_callsign"]
+        if dxcs not in ret or ("happened_at" in ret[dxcs] and ret[dxcs]["happened_at"] < r["happened_at"]):
+            rp = r.copy()
+            rp["callsign"] = dxcs
+            rp["locator"] = r["dx_loc"]
+            rp["dx_loc"] = r["locator"]
+            rp["dx_callsign"] = cs
+            rp["az"] = r["tx_heading"]
+            rp["tx_heading"] = r["az"]
+            rp["dist"] = r["my_tx_distance"]
+            rp["my_tx_distance"] = r["dist"]
+            rp["my_az"] = r["my_tx_heading"]
+            rp["my_tx_heading"] = r["my_az"]
+            ret[dxcs] = rp
+
+    @pooled
     def translate_qras(self):
         """
         Translate QRA locators to MH locators in the `nac_log_new` table.
@@ -1091,6 +1101,7 @@ class HamOp:
             rows = cur.fetchall()
             n=0
             ret = ""
+            translated = []
             for r in rows:
                 try:
                     lat, lon = qra.to_location(r['locator'])
@@ -1103,67 +1114,108 @@ class HamOp:
                 self.logger.info(s)
                 q1="UPDATE nac_log_new set locator = %s where qsoid=%s"
                 cur.execute(q1, (mhloc, r['qsoid']))
+                translated.append((r['qsoid'], r['callsign'], r['locator'], mhloc))
                 n += 1
+        self.db.commit()
+        for qsoid, callsign, qra_locator, mhloc in translated:
+            self.locator_index.replace(callsign, qra_locator, callsign, mhloc)
+            self.worked_squares.relocate(qsoid, mhloc)
+        if n:
+            self.app.client_mgr.log_model.invalidate()
+            self.locator_resolver.invalidate()
         return ret + "%d QRA locators translated" % n
 
-    def recompute_distances(self):
+    @pooled
+    def recompute_distances(self, chunk_size=10000):
         """
         Recomputes distances for callsigns in the database based on their locator and my_locator.
         Updates the distance field in the database for each callsign that has a changed distance.
+        The log is streamed in chunks, the distances of a chunk are computed as arrays, and the changed ones are
+        written back in batched UPDATEs.
 
+        :param chunk_size: The number of log rows computed at a time.
         :return: A formatted string listing the ODXs and MH fields and the number of distances changed.
         """
 
         q =  "SELECT qsoid,callsign,locator,my_locator, distance, propmode, band from nac_log_new"
 
-        with self.db.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            cur.execute(q)
-            rows = cur.fetchall()
-            ret = ""
-            n=0
-            odxs = {}  # {propmode/band: (callsign, distance)
-            mhfields = {}  # {field/band: count}
-            for r in rows:
-                band = r["band"].split('.')[0]
-                dx_loc = r["locator"]
-                my_loc = r["my_locator"]
-                callsign = r["callsign"]
-                if dx_loc and my_loc:
-                    dx_loc = dx_loc.upper()
-                    my_loc = my_loc.upper()
-                    bearing, distance = mh.distance_between(my_loc, dx_loc)
-                    odx_key = r["propmode"]+"/"+band
-                    if odx_key not in odxs:
-                        odxs[odx_key] = "",0.0
-                    if distance > odxs[odx_key][1]:
-                        odxs[odx_key] = callsign,distance
-                    field_key = dx_loc[0:2]+"/"+band
-                    if field_key not in mhfields:
-                        mhfields[field_key] = 1
-                    else:
-                        mhfields[field_key] += 1
-                    if not  r["distance"] or abs(distance - r["distance"]) > 0.1:
-                        if not r["distance"]:
-                            s = "Distance computed for %s to %5.1f" % (callsign, distance)
-                        else:
-                            s = "Distance changed for %s from %5.1f to %5.1f" % (callsign, r["distance"], distance)
-                        self.logger.info(s)
-                        ret += s + "<br/>"
-                        q1="UPDATE nac_log_new set distance = %s where qsoid=%s"
-                        cur.execute(q1, (distance, r["qsoid"]))
-                        n += 1
-            # ret += pprint.pformat(odxs)
-            import pprint
-            pprint.pprint(mhfields)
-            ret += "ODX list:<br/>"
-            for k,v in odxs.items():
-                ret += "%s: %s %5.0f km<br/>" % (k, v[0],v[1])
-            ret += "MH fields: <br/>"
-            for band in ["50","144","432","1296"]:
-                nf=0
-                for k,v in mhfields.items():
-                    if k.endswith(band):
-                        ret += "%s: %d<br/>" % (k, v)
-                        nf += 1
-                ret += "%d fields on %s MHz<br/>" % (nf, band)
-        return ret + "%d distances changed" % n
\ No newline at end of file
+        ret = []
+        n = 0
+        odxs = {}  # {propmode/band: (callsign, distance)
+        mhfields = {}  # {field/band: count}
+        with stream_rows(q) as rows:
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    break
+                chunk = [r for r in chunk if r[2] and r[3]]
+                if chunk:
+                    n += self._recompute_chunk(chunk, ret, odxs, mhfields)
+
+        if n:
+            self.db.commit()
+            self.app.client_mgr.log_model.invalidate()
+
+        ret.append("ODX list:<br/>")
+        for k, v in odxs.items():
+            ret.append("%s: %s %5.0f km<br/>" % (k, v[0], v[1]))
+        ret.append("MH fields: <br/>")
+        for band in ["50","144","432","1296"]:
+            nf = 0
+            for k, v in mhfields.items():
+                if k.endswith(band):
+                    ret.append("%s: %d<br/>" % (k, v))
+                    nf += 1
+            ret.append("%d fields on %s MHz<br/>" % (nf, band))
+
+        ret.append("%d distances changed" % n)
+        return "".join(ret)
+
+    def _recompute_chunk(self, rows, ret, odxs, mhfields):
+        """
+        Recompute the distances of some log rows, write back the changed ones and fold the rows into the summaries.
+
+        :return: The number of distances changed.
+        """
+        qsoids, callsigns, dx_locs, my_locs, old_distances, propmodes, bands = zip(*rows)
+        dx_locs = [x.upper() for x in dx_locs]
+        bands = [b.split('.')[0] for b in bands]
+        _bearings, distances = mh_batch.distances_between([x.upper() for x in my_locs], dx_locs)
+        old = np.array([float(d) if d else np.nan for d in old_distances])
+
+        valid = ~np.isnan(distances)
+        changed = valid & (np.isnan(old) | (np.abs(distances - np.nan_to_num(old)) > 0.1))
+
+        updates = []
+        for i in np.flatnonzero(changed):
+            if np.isnan(old[i]):
+                s = "Distance computed for %s to %5.1f" % (callsigns[i], distances[i])
+            else:
+                s = "Distance changed for %s from %5.1f to %5.1f" % (callsigns[i], old[i], distances[i])
+            self.logger.info(s)
+            ret.append(s + "<br/>")
+            updates.append((qsoids[i], float(distances[i])))
+
+        if updates:
+            with self.db.cursor() as cur:
+                psycopg2.extras.execute_values(cur, """UPDATE nac_log_new AS n SET distance = v.distance
+                                                       FROM (VALUES %s) AS v(qsoid, distance) WHERE n.qsoid = v.qsoid""",
+                                               updates, page_size=len(updates))
+
+        # ODX per propagation mode and band: the longest distance of each group
+        indices = np.flatnonzero(valid)
+        odx_keys = np.array(["%s/%s" % (propmodes[i], bands[i]) for i in indices])
+        groups, group_of = np.unique(odx_keys, return_inverse=True)
+        order = np.lexsort((-distances[indices], group_of))
+        if len(order):
+            firsts = order[np.r_[True, group_of[order][1:] != group_of[order][:-1]]]
+            for key, i in zip(groups, indices[firsts]):
+                if distances[i] > odxs.get(key, ("", 0.0))[1]:
+                    odxs[key] = callsigns[i], distances[i]
+
+        # Worked fields per band
+        field_keys = np.array(["%s/%s" % (dx_locs[i][0:2], bands[i]) for i in indices])
+        for key, count in zip(*np.unique(field_keys, return_counts=True)):
+            mhfields[key] = mhfields.get(key, 0) + int(count)
+
+        return len(updates)
\ No newline at end of file
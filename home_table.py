@@ -0,0 +1,254 @@
+import math
+import os
+import struct
+import time
+from threading import Lock
+from typing import *
+
+import numpy as np
+
+import locator.src.maidenhead as mh
+from locator.src.maidenhead import batch as mh_batch
+import locator.src.geodesy as geodesy
+
+# The 6 character locators form a grid of 18 * 10 * 24 sub squares in each direction, 5' of longitude by 2.5' of
+# latitude each
+GRID_SIZE = 18 * 10 * 24
+
+# The file starts with a header of HEADER_SIZE bytes: magic, format version, the home locator the table was built
+# for, the radius in km, and the first row and column and the number of them of the window of the grid that is
+# stored. Then follow nrows * ncols pairs of bearing in degrees and distance in km as little endian doubles, NaN
+# outside the radius. Files with another magic or version are rebuilt.
+MAGIC = b"SMHT"
+FORMAT_VERSION = 2  # 2: computed by geodesy in IARU mode
+HEADER = struct.Struct("<4sH16sdiiii")
+HEADER_SIZE = 64
+
+_BASES = np.array([ord("A"), ord("A"), ord("0"), ord("0"), ord("A"), ord("A")], dtype=np.int64)
+_LIMITS = np.array([18, 18, 10, 10, 24, 24], dtype=np.int64)
+_SCALAR_BASES = _BASES.tolist()
+_SCALAR_LIMITS = _LIMITS.tolist()
+
+
+def _cells(locators: Sequence[Optional[str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    :param locators: Maidenhead locators, None or invalid ones allowed.
+    :return: The grid rows and columns of the 6 character locators, and where they are such locators.
+    """
+    locators = [loc.strip().upper() if isinstance(loc, str) else "" for loc in locators]
+    count = len(locators)
+    six = np.fromiter((len(loc) == 6 for loc in locators), dtype=bool, count=count)
+    text = np.array([loc if len(loc) == 6 else "AA00AA" for loc in locators], dtype="U6")
+    codes = text.view(np.uint32).reshape(count, 6).astype(np.int64) - _BASES
+    six &= ((codes >= 0) & (codes < _LIMITS)).all(axis=1)
+    rows = codes[:, 1] * 240 + codes[:, 3] * 24 + codes[:, 5]
+    cols = codes[:, 0] * 240 + codes[:, 2] * 24 + codes[:, 4]
+    return rows, cols, six
+
+
+def _cell(locator: str) -> Optional[Tuple[int, int]]:
+    """ :return: The grid row and column of a 6 character locator, None for any other locator """
+    if not isinstance(locator, str):
+        return None
+    locator = locator.strip().upper()
+    if len(locator) != 6:
+        return None
+    codes = [ord(c) - base for c, base in zip(locator, _SCALAR_BASES)]
+    if not all(0 <= code < limit for code, limit in zip(codes, _SCALAR_LIMITS)):
+        return None
+    return codes[1] * 240 + codes[3] * 24 + codes[5], codes[0] * 240 + codes[2] * 24 + codes[4]
+
+
+def _locators(cols: np.ndarray, rows: np.ndarray) -> List[str]:
+    """ :return: The 6 character locators of grid cells """
+    codes = np.stack([cols // 240, rows // 240, cols // 24 % 10, rows // 24 % 10, cols % 24, rows % 24], axis=1)
+    codes = (codes + _BASES).astype(np.uint32)
+    return np.ascontiguousarray(codes).view("U6").ravel().tolist()
+
+
+class Table(NamedTuple):
+    home: str
+    radius: float
+    row0: int
+    col0: int
+    data: np.ndarray  # nrows * ncols * (bearing, distance), possibly memory mapped
+
+
+class HomeTable:
+    """
+    The bearing and distance from the home QTH to every 6 character locator within a radius, precomputed into a
+    memory mapped file.
+
+    Lookups give what mh.distances_between([home], [locator]) gives, for the home locator the table was built for,
+    which mh.distance_between agrees with to the last few bits. The table is built for the locator passed to
+    use_home, and rebuilt only when that changes. Locators outside the radius, of other lengths or of other homes are
+    computed the usual way.
+    """
+
+    def __init__(self, logger, filename: str, radius: float = 1500.0):
+        self.logger = logger
+        self.filename = filename
+        self.radius = radius
+        self.lock = Lock()
+        self.table: Optional[Table] = None
+        self.failed_home = None
+        self.builds = 0
+        self.hits = 0
+        self.misses = 0
+
+    def use_home(self, home: str) -> None:
+        """
+        Make the table serve a home locator, loading the file if it was built for it, otherwise building it anew.
+
+        :param home: The home locator, normally HamOp.my_qth().
+        :return: None
+        """
+        home = home.strip().upper()
+        table = self.table
+        if (table is not None and table.home == home) or home == self.failed_home:
+            return
+        with self.lock:
+            table = self.table
+            if table is not None and table.home == home:
+                return
+            try:
+                self.table = self._load(home) or self._build(home)
+                self.failed_home = None
+            except (ValueError, OSError) as e:
+                self.logger.error("No home bearing table for %s: %s" % (home, e))
+                self.table = None
+                self.failed_home = home
+
+    def _load(self, home: str) -> Optional[Table]:
+        try:
+            with open(self.filename, "rb") as f:
+                header = f.read(HEADER_SIZE)
+        except OSError:
+            return None
+        if len(header) < HEADER_SIZE:
+            return None
+        magic, version, file_home, radius, row0, nrows, col0, ncols = HEADER.unpack_from(header)
+        if magic != MAGIC or version != FORMAT_VERSION or \
+                file_home.rstrip(b"\0").decode("ascii", "replace") != home or radius != self.radius:
+            return None
+        if os.path.getsize(self.filename) != HEADER_SIZE + nrows * ncols * 16:
+            return None
+        data = np.memmap(self.filename, dtype="<f8", mode="r", offset=HEADER_SIZE, shape=(nrows, ncols, 2))
+        self.logger.info("Loaded home bearing table for %s from %s" % (home, self.filename))
+        return Table(home, radius, row0, col0, data)
+
+    def _build(self, home: str) -> Table:
+        started = time.perf_counter()
+        _n, _s, _w, _e, home_lat, home_lon = mh.to_rect(home)
+
+        # The angular radius, widened by the IARU factor the distances are scaled down with and by a cell
+        radius = self.radius / (geodesy.EARTH_MEAN_RADIUS / 1000.0 * geodesy.IARU_DISTANCE_FACTOR)
+        lat_half = math.degrees(radius)
+        row0 = max(0, math.floor((home_lat - lat_half + 90) * 24) - 1)
+        row_end = min(GRID_SIZE, math.ceil((home_lat + lat_half + 90) * 24) + 1)
+        if math.sin(radius) >= math.cos(math.radians(home_lat)):
+            col0, ncols = 0, GRID_SIZE
+        else:
+            lon_half = math.degrees(math.asin(math.sin(radius) / math.cos(math.radians(home_lat))))
+            col0 = math.floor((home_lon - lon_half + 180) * 12) - 1
+            ncols = min(GRID_SIZE, math.ceil(2 * lon_half * 12) + 3)
+            col0 %= GRID_SIZE
+
+        # Latitudes depend on the rows only and longitudes on the columns only, computed from locators the way
+        # to_rect does so the table agrees with it
+        rows = np.arange(row0, row_end)
+        cols = (col0 + np.arange(ncols)) % GRID_SIZE
+        lats, _lons = mh_batch.centers(_locators(np.zeros_like(rows), rows))
+        _lats, lons = mh_batch.centers(_locators(cols, np.zeros_like(cols)))
+        bearings, distances = geodesy.Origin(home_lat, home_lon, geodesy.IARU).bearings_distances(lats[:, None],
+                                                                                                  lons[None, :])
+        outside = distances > self.radius
+        bearings[outside] = np.nan
+        distances[outside] = np.nan
+        data = np.stack([bearings, distances], axis=2).astype("<f8")
+
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, home.encode("ascii")[:16], self.radius, row0, len(rows), col0,
+                             ncols).ljust(HEADER_SIZE, b"\0")
+        temporary = self.filename + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(header)
+            f.write(data.tobytes())
+        os.replace(temporary, self.filename)
+        self.builds += 1
+        self.logger.info("Built home bearing table for %s within %.0f km, %d x %d locators in %.2f s" %
+                         (home, self.radius, len(rows), ncols, time.perf_counter() - started))
+        return self._load(home) or Table(home, self.radius, row0, col0, data)
+
+    def _serving(self, home: str) -> Optional[Table]:
+        table = self.table
+        if table is not None and table.home == home.strip().upper():
+            return table
+        return None
+
+    def lookup(self, home: str, locator: str) -> Optional[Tuple[float, float]]:
+        """
+        :param home: The home locator.
+        :param locator: The locator to find the bearing and distance to.
+        :return: The bearing in degrees and the distance in km, None when the table does not serve the locators.
+        """
+        table = self._serving(home)
+        cell = _cell(locator) if table is not None else None
+        if cell is not None:
+            nrows, ncols, _pair = table.data.shape
+            row = cell[0] - table.row0
+            col = (cell[1] - table.col0) % GRID_SIZE
+            if 0 <= row < nrows and col < ncols:
+                bearing, distance = table.data[row, col]
+                if not math.isnan(distance):
+                    self.hits += 1
+                    return float(bearing), float(distance)
+        self.misses += 1
+        return None
+
+    def distance_between(self, home: str, locator: str) -> Tuple[float, float]:
+        """ mh.distance_between(home, locator), looked up in the table when it serves the locators """
+        found = self.lookup(home, locator)
+        return found if found is not None else mh.distance_between(home, locator)
+
+    def distances_from(self, home: str, locators: Sequence[Optional[str]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        mh.distances_between([home] * len(locators), locators), with the locators the table serves looked up in it.
+
+        :param home: The home locator.
+        :param locators: Maidenhead locators, None or invalid ones allowed.
+        :return: Two arrays with the bearings in degrees and the distances in km, NaN where a locator is missing or
+            invalid.
+        """
+        count = len(locators)
+        bearings = np.full(count, np.nan)
+        distances = np.full(count, np.nan)
+        found = np.zeros(count, dtype=bool)
+        table = self._serving(home)
+        if table is not None and count:
+            rows, cols, six = _cells(locators)
+            nrows, ncols, _pair = table.data.shape
+            rows = rows - table.row0
+            cols = (cols - table.col0) % GRID_SIZE
+            inside = six & (rows >= 0) & (rows < nrows) & (cols < ncols)
+            values = table.data[rows[inside], cols[inside]]
+            bearings[inside] = values[:, 0]
+            distances[inside] = values[:, 1]
+            found = ~np.isnan(distances)
+        rest = np.flatnonzero(~found)
+        self.hits += count - len(rest)
+        self.misses += len(rest)
+        if len(rest):
+            rest_bearings, rest_distances = mh_batch.distances_between([home] * len(rest), [locators[i] for i in rest])
+            bearings[rest] = rest_bearings
+            distances[rest] = rest_distances
+        return bearings, distances
+
+    def stats(self) -> dict:
+        table = self.table
+        return {"home": table.home if table else None,
+                "radius": self.radius,
+                "locators": int(np.count_nonzero(~np.isnan(table.data[:, :, 1]))) if table else 0,
+                "bytes": table.data.nbytes if table else 0,
+                "builds": self.builds,
+                "hits": self.hits,
+                "misses": self.misses}
@@ -0,0 +1,134 @@
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import *
+
+import adif_io
+
+from dbpool import get_pool
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from main import MyApp
+
+
+class ImportJob:
+    """ One uploaded log file and how far its import has come """
+
+    def __init__(self, job_id: int, filename: str, kind: str, file_data: str):
+        self.id = job_id
+        self.filename = filename
+        self.kind = kind  # "log" or "adi"
+        self.file_data = file_data
+        self.status = "queued"
+        self.total = 0
+        self.counts = {"parsed": 0, "matched": 0, "adjusted": 0, "added": 0}
+        self.queued_at = time.time()
+        self.finished_at = None
+
+    def progress(self) -> dict:
+        """ :return: The import_progress message of the job """
+        msg = {"job": self.id, "filename": self.filename, "status": self.status, "total": self.total}
+        msg.update(self.counts)
+        return msg
+
+
+class ImportJobManager:
+    """
+    Runs uploaded log files through HamOp in a bounded pool of worker threads.
+
+    Every job checks out its own database connection and does the whole file in one transaction, committed at the
+    end, so a failing import leaves the log untouched. The in-memory state and the clients are told about the merged
+    qsos only after that commit. The file is merged in chunks, and the progress is pushed to the clients after each
+    chunk as an import_progress event.
+    """
+
+    def __init__(self, app: 'MyApp', logger, max_workers: int = 2, chunk_size: int = 500, keep_finished: int = 20):
+        self.app = app
+        self.logger = logger
+        self.chunk_size = chunk_size
+        self.keep_finished = keep_finished
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="import")
+        self.lock = Lock()
+        self.jobs: Dict[int, ImportJob] = {}
+        self._ids = itertools.count(1)
+
+    def submit(self, filename: str, file_data: str) -> Optional[ImportJob]:
+        """
+        Queue a file for import.
+
+        :param filename: The name of the uploaded file, whose extension selects the format.
+        :param file_data: The contents of the file.
+        :return: The queued job, None when the format is not supported.
+        """
+        if filename.endswith(".log"):
+            kind = "log"
+        elif filename.endswith(".adi"):
+            kind = "adi"
+        else:
+            self.logger.warning("Ignoring upload of %s, not a WSJT-X log or adi file" % filename)
+            return None
+        with self.lock:
+            job = ImportJob(next(self._ids), filename, kind, file_data)
+            self.jobs[job.id] = job
+            self._forget_finished()
+        self.app.client_mgr.send_import_progress(job.progress())
+        self.executor.submit(self._run, job)
+        return job
+
+    def _forget_finished(self):
+        finished = sorted((j for j in self.jobs.values() if j.finished_at), key=lambda j: j.finished_at)
+        for job in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self.jobs[job.id]
+
+    def _run(self, job: ImportJob):
+        ham_op = self.app.ham_op
+        job.status = "running"
+        try:
+            if job.kind == "adi":
+                records, _adif_header = adif_io.read_from_string(job.file_data)
+            else:
+                records = [line.split(',') for line in job.file_data.splitlines()]
+            job.file_data = None
+            job.total = len(records)
+            self.app.client_mgr.send_import_progress(job.progress())
+
+            after_commit = []  # In-memory updates of the merged qsos, made once they are committed
+            with get_pool().connection() as db:
+                cur = db.cursor()
+                for start in range(0, len(records), self.chunk_size):
+                    chunk = records[start:start + self.chunk_size]
+                    if job.kind == "adi":
+                        ham_op.merge_into_log_db(cur, job.counts, chunk)
+                    else:
+                        for record in chunk:
+                            ham_op.merge_into_old_log_db(cur, record, job.counts, after_commit)
+                    job.counts["parsed"] += len(chunk)
+                    self.app.client_mgr.send_import_progress(job.progress())
+                cur.close()
+                if job.counts["added"] or job.counts["adjusted"]:
+                    db.commit()
+            for apply in after_commit:
+                apply()
+            if job.counts["adjusted"]:
+                self.app.client_mgr.log_model.invalidate()
+            job.status = "done"
+            self.app.client_mgr.emit("show_alert", "WSJT-X %s file uploaded. QSQ:s added: %d, adjusted: %s" %
+                                     (job.kind, job.counts["added"], job.counts["adjusted"]))
+        except Exception as e:
+            self.logger.exception("Import of %s failed" % job.filename)
+            job.status = "failed"
+            self.app.client_mgr.emit("show_alert", "WSJT-X upload of %s failed: %s" % (job.filename, e))
+        finally:
+            job.file_data = None
+            job.finished_at = time.time()
+            self.app.client_mgr.send_import_progress(job.progress())
+
+    def stats(self) -> List[dict]:
+        """ :return: The progress of the queued, running and recently finished jobs, oldest first """
+        with self.lock:
+            return [job.progress() for job in sorted(self.jobs.values(), key=lambda j: j.id)]
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,21 @@
+"""
+Bearings and distances between points given in degrees of latitude and longitude, on the mean earth sphere, on the
+sphere scaled the IARU way, or on the WGS84 ellipsoid.
+
+bearing_distance computes one pair of points, bearings_distances whole arrays of them, and Origin precomputes the
+trigonometry of an endpoint that many measurements share.
+"""
+
+from .kernels import (
+    bearing,
+    distance,
+    bearing_distance,
+    bearings_distances,
+    Origin,
+    SPHERE,
+    IARU,
+    ELLIPSOID,
+    MODES,
+    EARTH_MEAN_RADIUS,
+    IARU_DISTANCE_FACTOR,
+)
@@ -0,0 +1,63 @@
+"""
+Times the kernels against geo.sphere, when geo-py is installed, on random points around a fixed home QTH.
+
+    python -m geodesy.benchmark [--points N]
+"""
+import argparse
+import timeit
+
+import numpy as np
+
+import geodesy
+
+HOME = (57.6875, 12.625)
+
+
+def run(points: int = 10000) -> None:
+    rng = np.random.default_rng(0)
+    lats = rng.uniform(-80, 80, points)
+    lons = rng.uniform(-180, 180, points)
+    pairs = list(zip(lats.tolist(), lons.tolist()))
+    home_lat, home_lon = HOME
+    origin = geodesy.Origin(home_lat, home_lon)
+    timings = []
+
+    try:
+        from geo import sphere
+    except ImportError:
+        sphere = None
+    if sphere is not None:
+        timings.append(("geo.sphere bearing + distance", lambda: [
+            (sphere.bearing((home_lon, home_lat), (lon, lat)), sphere.distance((home_lon, home_lat), (lon, lat)))
+            for lat, lon in pairs]))
+    timings += [
+        ("geodesy.bearing_distance", lambda: [geodesy.bearing_distance(home_lat, home_lon, lat, lon)
+                                              for lat, lon in pairs]),
+        ("geodesy.Origin.bearing_distance", lambda: [origin.bearing_distance(lat, lon) for lat, lon in pairs]),
+        ("geodesy.Origin.bearings_distances", lambda: origin.bearings_distances(lats, lons)),
+    ]
+    for mode in (geodesy.ELLIPSOID,):
+        ellipsoid_origin = geodesy.Origin(home_lat, home_lon, mode)
+        timings += [
+            ("geodesy.Origin.bearing_distance %s" % mode,
+             lambda: [ellipsoid_origin.bearing_distance(lat, lon) for lat, lon in pairs]),
+            ("geodesy.Origin.bearings_distances %s" % mode,
+             lambda: ellipsoid_origin.bearings_distances(lats, lons)),
+        ]
+
+    baseline = None
+    for name, func in timings:
+        seconds = min(timeit.repeat(func, number=1, repeat=5)) / points
+        baseline = baseline or seconds
+        print("%-45s %8.3f us per point  %6.1fx" % (name, seconds * 1e6, baseline / seconds))
+
+
+def cli():
+    p = argparse.ArgumentParser(description="Time the geodesy kernels")
+    p.add_argument("--points", type=int, default=10000)
+    P = p.parse_args()
+    run(P.points)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,231 @@
+import math
+import typing as T
+
+import numpy as np
+
+# https://en.wikipedia.org/wiki/Earth_radius#Mean_radius, the radius geo.sphere uses
+EARTH_MEAN_RADIUS = 6371008.8
+# The factor the spherical distances were scaled down with to come closer to the distances the IARU reckons
+IARU_DISTANCE_FACTOR = 0.9989265959409077
+
+# The WGS84 ellipsoid, https://epsg.io/7030-ellipsoid
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+
+# The distance models
+SPHERE = "sphere"  # Great circles on the mean earth sphere, what geo.sphere computes
+IARU = "iaru"  # SPHERE scaled down by IARU_DISTANCE_FACTOR, what the Maidenhead distances have always used
+ELLIPSOID = "ellipsoid"  # Geodesics on the WGS84 ellipsoid by Vincenty's inverse formula
+MODES = (SPHERE, IARU, ELLIPSOID)
+
+CONVERGENCE_THRESHOLD = 1e-12
+MAX_ITERATIONS = 20
+
+_RADIUS_KM = {SPHERE: EARTH_MEAN_RADIUS / 1000.0, IARU: EARTH_MEAN_RADIUS / 1000.0 * IARU_DISTANCE_FACTOR}
+_U_SCALE = 1 - WGS84_F
+_E2_PRIME = (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+
+
+def _check_mode(mode: str) -> None:
+    if mode not in MODES:
+        raise ValueError("Unknown distance mode %r, use one of %s" % (mode, ", ".join(MODES)))
+
+
+def _sphere(sin_lat1, cos_lat1, sin_lat2, cos_lat2, dlon) -> T.Tuple[float, float]:
+    """ :return: The initial bearing in degrees and the central angle in radians of a great circle """
+    sin_dlon, cos_dlon = math.sin(dlon), math.cos(dlon)
+    y = cos_lat2 * sin_dlon
+    x = cos_lat1 * sin_lat2 - sin_lat1 * cos_lat2 * cos_dlon
+    bearing = (math.degrees(math.atan2(y, x)) + 360) % 360
+    return bearing, math.atan2(math.hypot(y, x), sin_lat1 * sin_lat2 + cos_lat1 * cos_lat2 * cos_dlon)
+
+
+def _vincenty(sin_u1, cos_u1, sin_u2, cos_u2, dlon) -> T.Optional[T.Tuple[float, float]]:
+    """
+    Vincenty's inverse formula on the reduced latitudes U1 and U2.
+
+    :return: The initial bearing in degrees and the distance in km, None when it does not converge, which only
+        happens for nearly antipodal points.
+    """
+    lam = dlon
+    for _ in range(MAX_ITERATIONS):
+        sin_lam, cos_lam = math.sin(lam), math.cos(lam)
+        sin_sigma = math.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+        if sin_sigma == 0:
+            return 0.0, 0.0  # Coincident points
+        cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+        sigma = math.atan2(sin_sigma, cos_sigma)
+        sin_alpha = cos_u1 * cos_u2 * sin_lam / sin_sigma
+        cos2_alpha = 1 - sin_alpha ** 2
+        cos_2sigma_m = cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha if cos2_alpha else 0.0  # Equatorial line
+        c = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+        previous = lam
+        lam = dlon + (1 - c) * WGS84_F * sin_alpha * (
+            sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+        if abs(lam - previous) < CONVERGENCE_THRESHOLD:
+            break
+    else:
+        return None
+
+    u2 = cos2_alpha * _E2_PRIME
+    a = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    b = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = b * sin_sigma * (cos_2sigma_m + b / 4 * (cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) -
+                                   b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+    distance = WGS84_B * a * (sigma - delta_sigma) / 1000.0
+    bearing = math.degrees(math.atan2(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam))
+    return (bearing + 360) % 360, distance
+
+
+class Origin:
+    """
+    A fixed endpoint, such as the home QTH, with its trigonometry computed once for all the bearings and distances
+    measured from it.
+    """
+
+    def __init__(self, lat: float, lon: float, mode: str = SPHERE):
+        """
+        :param lat: The latitude in degrees.
+        :param lon: The longitude in degrees.
+        :param mode: SPHERE, IARU or ELLIPSOID.
+        """
+        _check_mode(mode)
+        self.lat = lat
+        self.lon = lon
+        self.mode = mode
+        self.lon_rad = math.radians(lon)
+        phi = math.radians(lat)
+        if mode == ELLIPSOID:
+            phi = math.atan(_U_SCALE * math.tan(phi))
+        self.sin_lat = math.sin(phi)
+        self.cos_lat = math.cos(phi)
+
+    def bearing_distance(self, lat: float, lon: float) -> T.Tuple[float, float]:
+        """
+        :param lat: The latitude in degrees of the other endpoint.
+        :param lon: The longitude in degrees of the other endpoint.
+        :return: The initial bearing in degrees and the distance in km from the origin.
+        """
+        phi = math.radians(lat)
+        dlon = math.radians(lon) - self.lon_rad
+        if self.mode != ELLIPSOID:
+            bearing, angle = _sphere(self.sin_lat, self.cos_lat, math.sin(phi), math.cos(phi), dlon)
+            return bearing, _RADIUS_KM[self.mode] * angle
+        u2 = math.atan(_U_SCALE * math.tan(phi))
+        result = _vincenty(self.sin_lat, self.cos_lat, math.sin(u2), math.cos(u2), dlon)
+        if result is None:
+            return Origin(self.lat, self.lon).bearing_distance(lat, lon)
+        return result
+
+    def bearings_distances(self, lat, lon) -> T.Tuple[np.ndarray, np.ndarray]:
+        """
+        The vectorised bearing_distance.
+
+        :param lat: Latitudes in degrees of the other endpoints.
+        :param lon: Longitudes in degrees of the other endpoints.
+        :return: Two arrays with the initial bearings in degrees and the distances in km from the origin.
+        """
+        return _bearings_distances(self.sin_lat, self.cos_lat, self.lon_rad, lat, lon, self.mode,
+                                   (self.lat, self.lon))
+
+
+def bearing_distance(lat1: float, lon1: float, lat2: float, lon2: float, mode: str = SPHERE) -> T.Tuple[float, float]:
+    """
+    The initial bearing and the distance between two points.
+
+    :param lat1: The latitude of the start point in degrees.
+    :param lon1: The longitude of the start point in degrees.
+    :param lat2: The latitude of the end point in degrees.
+    :param lon2: The longitude of the end point in degrees.
+    :param mode: SPHERE, IARU or ELLIPSOID.
+    :return: The bearing in degrees and the distance in km.
+    """
+    return Origin(lat1, lon1, mode).bearing_distance(lat2, lon2)
+
+
+def bearing(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """ :return: The initial great circle bearing in degrees, what geo.sphere.bearing((lon1, lat1), (lon2, lat2)) gives """
+    return bearing_distance(lat1, lon1, lat2, lon2)[0]
+
+
+def distance(lat1: float, lon1: float, lat2: float, lon2: float, mode: str = SPHERE) -> float:
+    """ :return: The distance in km, for SPHERE what geo.sphere.distance((lon1, lat1), (lon2, lat2)) / 1000 gives """
+    return bearing_distance(lat1, lon1, lat2, lon2, mode)[1]
+
+
+def _bearings_distances(sin_lat1, cos_lat1, lon1, lat2, lon2, mode, origin) -> T.Tuple[np.ndarray, np.ndarray]:
+    phi2 = np.radians(np.asarray(lat2, dtype=float))
+    dlon = np.radians(np.asarray(lon2, dtype=float)) - lon1
+    if mode == ELLIPSOID:
+        u2 = np.arctan(_U_SCALE * np.tan(phi2))
+        bearings, distances, converged = _vincenty_arrays(sin_lat1, cos_lat1, np.sin(u2), np.cos(u2), dlon)
+        if not converged.all():
+            sphere_bearings, sphere_distances = _bearings_distances(*_trig(*origin), lat2, lon2, SPHERE, origin)
+            bearings = np.where(converged, bearings, sphere_bearings)
+            distances = np.where(converged, distances, sphere_distances)
+        return bearings, distances
+
+    sin_lat2, cos_lat2 = np.sin(phi2), np.cos(phi2)
+    sin_dlon, cos_dlon = np.sin(dlon), np.cos(dlon)
+    y = cos_lat2 * sin_dlon
+    x = cos_lat1 * sin_lat2 - sin_lat1 * cos_lat2 * cos_dlon
+    bearings = (np.degrees(np.arctan2(y, x)) + 360) % 360
+    return bearings, _RADIUS_KM[mode] * np.arctan2(np.hypot(y, x), sin_lat1 * sin_lat2 + cos_lat1 * cos_lat2 * cos_dlon)
+
+
+def _trig(lat, lon):
+    phi = np.radians(np.asarray(lat, dtype=float))
+    return np.sin(phi), np.cos(phi), np.radians(np.asarray(lon, dtype=float))
+
+
+def _vincenty_arrays(sin_u1, cos_u1, sin_u2, cos_u2, dlon):
+    """ The vectorised _vincenty, iterating until every pair has converged. :return: bearings, distances, converged """
+    lam = dlon
+    converged = np.zeros(np.broadcast(sin_u1, sin_u2, dlon).shape, dtype=bool)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for _ in range(MAX_ITERATIONS):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+            c = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+            following = dlon + (1 - c) * WGS84_F * sin_alpha * (
+                sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+            converged |= (np.abs(following - lam) < CONVERGENCE_THRESHOLD) | (sin_sigma == 0)
+            # Converged pairs keep the lambda they converged from, so later passes give them the same values
+            lam = np.where(converged, lam, following)
+            if converged.all():
+                break
+
+    u2 = cos2_alpha * _E2_PRIME
+    a = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    b = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = b * sin_sigma * (cos_2sigma_m + b / 4 * (cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) -
+                                   b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+    distances = WGS84_B * a * (sigma - delta_sigma) / 1000.0
+    bearings = (np.degrees(np.arctan2(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)) + 360) % 360
+    coincident = sin_sigma == 0
+    return np.where(coincident, 0.0, bearings), np.where(coincident, 0.0, distances), converged
+
+
+def bearings_distances(lat1, lon1, lat2, lon2, mode: str = SPHERE) -> T.Tuple[np.ndarray, np.ndarray]:
+    """
+    The vectorised bearing_distance, broadcasting its arguments against each other.
+
+    :param lat1: Latitudes of the start points in degrees.
+    :param lon1: Longitudes of the start points in degrees.
+    :param lat2: Latitudes of the end points in degrees.
+    :param lon2: Longitudes of the end points in degrees.
+    :param mode: SPHERE, IARU or ELLIPSOID.
+    :return: Two arrays with the initial bearings in degrees and the distances in km, NaN where a coordinate is NaN.
+    """
+    _check_mode(mode)
+    phi1 = np.radians(np.asarray(lat1, dtype=float))
+    if mode == ELLIPSOID:
+        phi1 = np.arctan(_U_SCALE * np.tan(phi1))
+    return _bearings_distances(np.sin(phi1), np.cos(phi1), np.radians(np.asarray(lon1, dtype=float)), lat2, lon2,
+                               mode, (lat1, lon1))
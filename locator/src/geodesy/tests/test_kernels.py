@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from pytest import approx
+
+import geodesy
+
+# Start, end, and what geo.sphere.bearing, geo.sphere.distance / 1000 and geo.ellipsoid.distance / 1000 of geo-py
+# gave for them
+REFERENCES = [
+    ((57.6875, 12.625), (55.6875, 13.0417), 173.29771437450324, 223.84018826385767, 224.166432134452),
+    ((-77.8419, 166.6863), (38.8895, -77.0353), 106.34271909497915, 14826.660073057414, 14806.129456739003),
+    ((29.9792, 31.1342), (38.8895, -77.0353), 311.9662479770485, 9347.156849857784, 9366.517562401865),
+    ((57.6875, 12.625), (-33.8688, 151.2093), 67.42472817846385, 15956.293949445584, 15947.562112876973),
+    ((0.0, 0.0), (0.0, 90.0), 90.0, 10007.557221017962, 10018.754171390377),
+]
+
+
+@pytest.mark.parametrize("start, end, bearing, sphere, ellipsoid", REFERENCES)
+def test_scalar_matches_geo(start, end, bearing, sphere, ellipsoid):
+    assert geodesy.bearing(*start, *end) == approx(bearing, abs=1e-9)
+    assert geodesy.distance(*start, *end) == approx(sphere, rel=1e-12)
+    assert geodesy.distance(*start, *end, geodesy.IARU) == approx(sphere * geodesy.IARU_DISTANCE_FACTOR, rel=1e-12)
+    assert geodesy.distance(*start, *end, geodesy.ELLIPSOID) == approx(ellipsoid, rel=1e-12)
+
+
+@pytest.mark.parametrize("mode", geodesy.MODES)
+def test_vectorised_and_origin_match_scalar(mode):
+    rng = np.random.default_rng(1)
+    lat1, lat2 = rng.uniform(-89, 89, (2, 500))
+    lon1, lon2 = rng.uniform(-180, 180, (2, 500))
+    bearings, distances = geodesy.bearings_distances(lat1, lon1, lat2, lon2, mode)
+    origin = geodesy.Origin(lat1[0], lon1[0], mode)
+    origin_bearings, origin_distances = origin.bearings_distances(lat2, lon2)
+    for i in range(len(lat1)):
+        bearing, distance = geodesy.bearing_distance(lat1[i], lon1[i], lat2[i], lon2[i], mode)
+        assert bearings[i] == approx(bearing, abs=1e-9)
+        assert distances[i] == approx(distance, rel=1e-12)
+        bearing, distance = origin.bearing_distance(lat2[i], lon2[i])
+        assert origin_bearings[i] == approx(bearing, abs=1e-9)
+        assert origin_distances[i] == approx(distance, rel=1e-12)
+
+
+def test_coincident_and_antipodal_points():
+    assert geodesy.bearing_distance(57.7, 12.6, 57.7, 12.6, geodesy.ELLIPSOID) == (0.0, 0.0)
+    # Vincenty's formula does not converge for nearly antipodal points, which fall back to the sphere
+    bearing, distance = geodesy.bearing_distance(0.0, 0.0, 0.5, 179.7, geodesy.ELLIPSOID)
+    assert (bearing, distance) == geodesy.bearing_distance(0.0, 0.0, 0.5, 179.7)
+    bearings, distances = geodesy.bearings_distances(0.0, 0.0, [0.5, 0.0], [179.7, 0.0], geodesy.ELLIPSOID)
+    assert bearings[0] == approx(bearing) and distances[0] == approx(distance)
+    assert distances[1] == 0.0
+
+
+def test_nan_and_unknown_mode():
+    bearings, distances = geodesy.bearings_distances(57.7, 12.6, [np.nan, 55.0], [13.0, np.nan])
+    assert np.isnan(distances).all() and np.isnan(bearings).all()
+    with pytest.raises(ValueError):
+        geodesy.distance(0, 0, 1, 1, "flat")
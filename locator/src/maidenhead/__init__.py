@@ -3,7 +3,9 @@
 from .to_location import to_location
 from .to_maiden import to_maiden
 from .to_rect import to_rect
-from geo import sphere
+from .cache import geometry_cache_info, clear_geometry_cache
+from .batch import geodesy
+from .batch import to_locations, to_rects, to_maidens, distances_between, bearings_and_distances, IARU_DISTANCE_FACTOR
 """
     The Maidenhead locator is a system used to divide the world into grid squares for amateur radio communication. The locator string consists of 2 to 12 characters, with an even number
     * of characters. Each pair of characters represents a different level of granularity in the grid. The first pair represents a large area, the second pair a medium area, and so on.
@@ -38,7 +40,4 @@ def distance_between(this_loc, other_loc):
 
     n, s, w, e, lat, lon = to_rect(other_loc)
 
-    bearing = sphere.bearing((mlon, mlat), (lon, lat))
-    distance = sphere.distance((mlon, mlat), (lon, lat)) / 1000.0 * 0.9989265959409077
-
-    return bearing, distance
\ No newline at end of file
+    return geodesy.bearing_distance(mlat, mlon, lat, lon, geodesy.IARU)
\ No newline at end of file
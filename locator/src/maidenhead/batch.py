@@ -0,0 +1,191 @@
+import typing as T
+
+import numpy as np
+
+try:
+    from .. import geodesy
+except (ImportError, ValueError):  # Imported as a top level package, with geodesy next to it
+    import geodesy
+
+EARTH_MEAN_RADIUS = geodesy.EARTH_MEAN_RADIUS
+IARU_DISTANCE_FACTOR = geodesy.IARU_DISTANCE_FACTOR
+
+MAX_LENGTH = 12
+
+# What each character pair adds to the south west corner is its value times _MULTIPLIERS divided by _DIVISORS, in
+# the order written, the way to_location always computed it, so the results are bit for bit the same. Dividing by 1
+# is exact.
+_MULTIPLIERS = np.array([[20, 10], [2, 1], [5.0, 2.5], [5.0, 2.5], [5.0, 2.5], [5.0, 2.5]])
+_DIVISORS = np.array([[1, 1], [1, 1], [60, 1], [600, 1], [600, 24], [600, 240]], dtype=float)
+_DIGIT_POSITIONS = np.arange(MAX_LENGTH) // 2 % 2 == 1
+# Digits past the first six characters that are not digits stop the parsing
+_STOPPING_POSITIONS = _DIGIT_POSITIONS & (np.arange(MAX_LENGTH) >= 6)
+
+
+def _square_sizes(size):
+    """ The sizes of the squares of 2, 4, ... 12 characters, divided down the way to_rect always did """
+    sizes = [np.nan, size]
+    for divisor in (10, 24, 10, 24, 10):
+        size /= divisor
+        sizes.append(size)
+    return np.array(sizes)
+
+
+# The size in degrees of longitude and latitude of a square, indexed by the number of character pairs
+_LON_SIZES = _square_sizes(20)
+_LAT_SIZES = _square_sizes(10)
+
+
+class ParsedLocators(T.NamedTuple):
+    """ The south west corners of parsed locators, with what to_location needs to report on them """
+    lat: np.ndarray
+    lon: np.ndarray
+    length: np.ndarray  # The number of characters after stripping, 0 where not a string
+    valid: np.ndarray  # Whether the locator could be parsed, i.e. the corner is not NaN
+    truncated_at: np.ndarray  # Position of the first invalid digit of the extended pairs, -1 where none
+
+
+def parse(locators: T.Iterable[T.Optional[str]]) -> ParsedLocators:
+    """
+    Parse locators into the latitudes and longitudes of their south west corners, all at once.
+
+    Locators are stripped and upper-cased. A locator is invalid when it is not a string, does not have 2 to 12
+    characters, an odd number of them, or non-digits in its second pair. A non-digit in the fourth or sixth pair
+    stops parsing there, like to_location does, and the locator counts as valid.
+
+    :param locators: Maidenhead locators.
+    :return: The parsed arrays.
+    """
+    locators = [loc.strip().upper() if isinstance(loc, str) else "" for loc in locators]
+    count = len(locators)
+    if count == 0:
+        empty = np.empty(0)
+        return ParsedLocators(empty, empty, np.empty(0, dtype=int), np.empty(0, dtype=bool), np.empty(0, dtype=int))
+    text = np.array(locators, dtype=str)
+    length = np.char.str_len(text)
+    width = text.dtype.itemsize // 4
+    codes = np.zeros((count, MAX_LENGTH), dtype=np.int64)
+    if width:
+        chars = text.view(np.uint32).reshape(count, width)[:, :MAX_LENGTH].astype(np.int64)
+        codes[:, :chars.shape[1]] = chars
+    codes -= np.where(_DIGIT_POSITIONS, ord("0"), ord("A"))
+
+    valid = (length >= 2) & (length <= MAX_LENGTH) & (length % 2 == 0)
+    is_digit = (codes >= 0) & (codes <= 9)
+    valid &= (length < 4) | (is_digit[:, 2] & is_digit[:, 3])
+
+    present = np.arange(MAX_LENGTH) < length[:, None]
+    stops = present & _STOPPING_POSITIONS & ~is_digit
+    applied = present & np.logical_and.accumulate(~stops, axis=1) & valid[:, None]
+    truncated_at = np.where(valid & stops.any(axis=1), stops.argmax(axis=1), -1)
+
+    steps = codes.reshape(count, 6, 2) * _MULTIPLIERS / _DIVISORS[:, :1] / _DIVISORS[:, 1:]
+    steps = np.where(applied.reshape(count, 6, 2), steps, 0.0)
+    lat = np.full(count, -90.0)
+    lon = np.full(count, -180.0)
+    for pair in range(6):
+        lon = lon + steps[:, pair, 0]
+        lat = lat + steps[:, pair, 1]
+    lat[~valid] = np.nan
+    lon[~valid] = np.nan
+    return ParsedLocators(lat, lon, length, valid, truncated_at)
+
+
+def to_locations(locators: T.Iterable[T.Optional[str]]) -> T.Tuple[np.ndarray, np.ndarray]:
+    """
+    The array counterpart of to_location.
+
+    :param locators: Maidenhead locators, None or invalid ones allowed.
+    :return: Two arrays with the latitudes and longitudes of the south west corners, NaN where a locator is missing or
+        invalid.
+    """
+    parsed = parse(locators)
+    return parsed.lat, parsed.lon
+
+
+def rects_of(parsed: ParsedLocators) -> T.Tuple[np.ndarray, ...]:
+    """ :return: The north, south, west, east, center latitude and center longitude arrays of parsed locators """
+    pairs = np.where(parsed.valid, parsed.length // 2, 0)
+    lonsize = _LON_SIZES[pairs]
+    latsize = _LAT_SIZES[pairs]
+    south, west = parsed.lat, parsed.lon
+    return south + latsize, south, west, west + lonsize, south + latsize / 2, west + lonsize / 2
+
+
+def to_rects(locators: T.Iterable[T.Optional[str]]) -> T.Tuple[np.ndarray, ...]:
+    """
+    The array counterpart of to_rect.
+
+    :param locators: Maidenhead locators, None or invalid ones allowed.
+    :return: Six arrays with the north, south, west and east edges and the center latitudes and longitudes of the
+        locator squares, NaN where a locator is missing or invalid.
+    """
+    return rects_of(parse(locators))
+
+
+def centers(locators: T.Iterable[T.Optional[str]]) -> T.Tuple[np.ndarray, np.ndarray]:
+    """
+    :param locators: Maidenhead locators, None or invalid ones allowed.
+    :return: Two arrays with the latitudes and longitudes of the locator centers, NaN where a locator is missing or
+        invalid.
+    """
+    _north, _south, _west, _east, lat, lon = to_rects(locators)
+    return lat, lon
+
+
+def to_maidens(lat, lon, precision: int = 3) -> T.List[str]:
+    """
+    The array counterpart of to_maiden.
+
+    :param lat: Latitudes in decimal degrees.
+    :param lon: Longitudes in decimal degrees.
+    :param precision: The number of character pairs of the locators.
+    :return: The locators, with the third pair in lower case.
+    """
+    lat = np.atleast_1d(np.asarray(lat, dtype=float))
+    lon = np.atleast_1d(np.asarray(lon, dtype=float))
+    columns = []
+    a, lon = np.divmod(lon + 180, 20)
+    b, lat = np.divmod(lat + 90, 10)
+    columns += [a, b]
+    lon = lon / 2.0
+    for i in range(2, precision + 1):
+        a, lon = np.divmod(lon, 1)
+        b, lat = np.divmod(lat, 1)
+        columns += [a, b]
+        scale = 24 if i % 2 == 0 else 10
+        lon = scale * lon
+        lat = scale * lat
+    codes = np.stack(columns, axis=1).astype(np.uint32)
+    codes += np.where(_DIGIT_POSITIONS[:codes.shape[1]], ord("0"), ord("A")).astype(np.uint32)
+    if precision >= 3:
+        codes[:, 4:6] += ord("a") - ord("A")
+    return np.ascontiguousarray(codes).view("U%d" % codes.shape[1]).ravel().tolist()
+
+
+def bearings_and_distances(lat1, lon1, lat2, lon2) -> T.Tuple[np.ndarray, np.ndarray]:
+    """
+    Great circle bearings and distances on the mean earth sphere, the same as geo.sphere.bearing and
+    geo.sphere.distance applied element by element. See geodesy.bearings_distances for the other models.
+
+    :param lat1: Latitudes of the start points in degrees.
+    :param lon1: Longitudes of the start points in degrees.
+    :param lat2: Latitudes of the end points in degrees.
+    :param lon2: Longitudes of the end points in degrees.
+    :return: Two arrays with the initial bearings in degrees and the distances in meters.
+    """
+    bearing, distance = geodesy.bearings_distances(lat1, lon1, lat2, lon2)
+    return bearing, distance * 1000.0
+
+
+def distances_between(these_locs: T.Iterable[str], other_locs: T.Iterable[str]) -> T.Tuple[np.ndarray, np.ndarray]:
+    """
+    The array counterpart of distance_between, pairing the locators of the two sequences.
+
+    :param these_locs: The locators to measure from.
+    :param other_locs: The locators to measure to.
+    :return: Two arrays with the bearings in degrees and the distances in km, NaN where a locator is missing or invalid.
+    """
+    lat1, lon1 = centers(these_locs)
+    lat2, lon2 = centers(other_locs)
+    return geodesy.bearings_distances(lat1, lon1, lat2, lon2, geodesy.IARU)
@@ -0,0 +1,59 @@
+import functools
+import typing as T
+import warnings
+
+from .batch import parse, rects_of, ParsedLocators
+
+GEOMETRY_CACHE_SIZE = 8192
+
+Rect = T.Tuple[float, float, float, float, float, float]
+
+
+def parse_one(maiden: str) -> ParsedLocators:
+    """
+    Parse a single normalised locator through the batch path, raising on invalid ones like to_location always did.
+
+    :param maiden: The stripped and upper-cased Maidenhead locator string.
+    :return: The parsed arrays, of length one.
+    :raises ValueError: If the locator does not have 2-12 characters, an even number of them, or its second pair is
+        not digits. An extended locator with a non-digit in a later digit pair only warns, and is parsed up to it.
+    """
+    N = len(maiden)
+    if not 12 >= N >= 2 or N % 2 != 0:
+        raise ValueError("Maidenhead locator requires 2-12 characters, even number of characters")
+
+    parsed = parse([maiden])
+    if not parsed.valid[0]:
+        bad = next(c for c in maiden[2:4] if not "0" <= c <= "9")
+        raise ValueError("invalid literal for int() with base 10: %r" % bad)
+    if parsed.truncated_at[0] >= 0:
+        warnings.warn("invalid literal for int() with base 10: %r on extended locator '%s', using first %d characters"
+                      % (maiden[parsed.truncated_at[0]], maiden, parsed.truncated_at[0]), stacklevel=2)
+    return parsed
+
+
+@functools.lru_cache(maxsize=GEOMETRY_CACHE_SIZE)
+def _geometry(maiden: str) -> Rect:
+    return tuple(float(x[0]) for x in rects_of(parse_one(maiden)))
+
+
+def locator_geometry(maiden: str) -> Rect:
+    """
+    The rect of a locator from a bounded LRU cache shared by to_location and to_rect. Invalid locators raise every
+    time and are not cached.
+
+    :param maiden: The Maidenhead locator, in any case and with surrounding white space.
+    :return: The immutable tuple north, south, west, east, center latitude, center longitude, where south and west
+        are what to_location returns.
+    """
+    return _geometry(maiden.strip().upper())
+
+
+def geometry_cache_info() -> T.Dict[str, int]:
+    """ :return: The hits, misses, current size and maximum size of the locator geometry cache """
+    info = _geometry.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
+
+
+def clear_geometry_cache() -> None:
+    _geometry.cache_clear()
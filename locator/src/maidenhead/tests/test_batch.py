@@ -0,0 +1,44 @@
+import math
+
+from pytest import approx
+
+import maidenhead as mh
+from maidenhead import batch
+
+
+def test_distances_match_scalar(location):
+    others = ["JO67BQ", "FN30", location.maiden, "KP03dw"]
+    bearings, distances = batch.distances_between([location.maiden] * len(others), others)
+    for other, bearing, distance in zip(others, bearings, distances):
+        expected_bearing, expected_distance = mh.distance_between(location.maiden, other)
+        assert distance == approx(expected_distance, rel=1e-9, abs=1e-9)
+        if expected_distance:
+            assert bearing == approx(expected_bearing, rel=1e-9)
+
+
+def test_invalid_locators_give_nan():
+    bearings, distances = batch.distances_between(["JO67", "JO67", None], ["JO6", None, "JO67"])
+    assert all(math.isnan(d) for d in distances)
+    assert all(math.isnan(b) for b in bearings)
+
+
+def test_batch_matches_scalar(location):
+    locators = [location.maiden, location.maiden[:6], location.maiden[:4].lower(), location.maiden[:2], "JO67bq1x"]
+    lats, lons = batch.to_locations(locators)
+    rects = batch.to_rects(locators)
+    for i, locator in enumerate(locators):
+        assert (lats[i], lons[i]) == mh.to_location(locator)
+        assert tuple(r[i] for r in rects) == mh.to_rect(locator)
+
+
+def test_to_maidens_matches_scalar(location):
+    lat, lon = location.latlon
+    for precision in range(1, 7):
+        assert batch.to_maidens([lat, -lat], [lon, -lon], precision) == \
+               [mh.to_maiden(lat, lon, precision=precision), mh.to_maiden(-lat, -lon, precision=precision)]
+
+
+def test_invalid_locators_in_batch():
+    lats, lons = batch.to_locations(["JO6", "JOXX", None, "", "JO67BQ12AB34CD", 42])
+    assert all(math.isnan(x) for x in lats)
+    assert all(math.isnan(x) for x in lons)
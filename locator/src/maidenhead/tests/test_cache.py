@@ -0,0 +1,46 @@
+import pytest
+
+import maidenhead as mh
+
+
+def test_cache_normalises_locators():
+    mh.clear_geometry_cache()
+    rect = mh.to_rect("JO67bq")
+    assert mh.to_rect(" jo67BQ ") is rect
+    assert mh.to_location("JO67BQ") == (rect[1], rect[2])
+    info = mh.geometry_cache_info()
+    assert info["misses"] == 1
+    assert info["hits"] == 2
+    assert info["size"] == 1
+
+
+def test_cache_returns_immutable_tuples():
+    rect = mh.to_rect("FN30")
+    assert isinstance(rect, tuple)
+    assert all(isinstance(x, float) for x in rect)
+
+
+def test_invalid_locators_are_not_cached():
+    mh.clear_geometry_cache()
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            mh.to_rect("JO6")
+    assert mh.geometry_cache_info()["size"] == 0
+
+
+def test_cache_is_bounded():
+    mh.clear_geometry_cache()
+    maxsize = mh.geometry_cache_info()["maxsize"]
+    fields = "ABCDEFGHIJKLMNOPQR"
+    locators = ["%s%s%02d" % (a, b, n) for a in fields for b in fields for n in range(100)]
+    for locator in locators[:maxsize + 100]:
+        mh.to_rect(locator)
+    assert mh.geometry_cache_info()["size"] == maxsize
+
+
+def test_truncated_extended_locators_warn_instead_of_printing(capsys):
+    mh.clear_geometry_cache()
+    with pytest.warns(UserWarning, match="GG52QJJJJJ"):
+        location = mh.to_location("GG52qjjjjj")
+    assert location == mh.to_location("GG52QJ")
+    assert capsys.readouterr().out == ""
@@ -1,5 +1,7 @@
 import typing as T
 
+from .cache import locator_geometry
+
 
 def to_location(maiden: str) -> T.Tuple[float, float]:
     """
@@ -15,6 +17,8 @@ def to_location(maiden: str) -> T.Tuple[float, float]:
     * are returned as a tuple in the format (latitude, longitude).
 
     If the given Maidenhead locator string does not meet the required length and format constraints, a ValueError is raised.
+    A non-digit in the extended pairs stops parsing there. Results are cached, see cache.locator_geometry, and
+    batch.to_locations converts many locators at once.
 
     Example usage:
 
@@ -24,40 +28,5 @@ def to_location(maiden: str) -> T.Tuple[float, float]:
     ```
     """
 
-    maiden = maiden.strip().upper()
-
-    N = len(maiden)
-    if not 12 >= N >= 2 or N % 2 != 0:
-        raise ValueError("Maidenhead locator requires 2-12 characters, even number of characters")
-
-    Oa = ord("A")
-    lon = -180.0
-    lat = -90.0
-    # %% first pair
-    lon += (ord(maiden[0]) - Oa) * 20
-    lat += (ord(maiden[1]) - Oa) * 10
-    # %% second pair
-    if N >= 4:
-        lon += int(maiden[2]) * 2
-        lat += int(maiden[3]) * 1
-    # %%
-    if N >= 6:
-        lon += (ord(maiden[4]) - Oa) * 5.0 / 60
-        lat += (ord(maiden[5]) - Oa) * 2.5 / 60
-    # %%
-    try:
-        if N >= 8:
-            lon += int(maiden[6]) * 5.0 / 600
-            lat += int(maiden[7]) * 2.5 / 600
-        if N >= 10:
-            lon += (ord(maiden[8]) - Oa) * 5.0 / 600 / 24
-            lat += (ord(maiden[9]) - Oa) * 2.5 / 600 / 24
-        if N >= 12:
-            lon += int(maiden[10]) * 5.0 /  600 / 240
-            lat += int(maiden[11]) *  2.5 / 600 / 240
-    except ValueError as e:
-            print("ValueError %s on extended locator '%s', using first 6 characters" % (e, maiden))
-
-    # %%
-
-    return lat, lon
+    _north, south, west, _east, _lat, _lon = locator_geometry(maiden)
+    return south, west
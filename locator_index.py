@@ -0,0 +1,87 @@
+from threading import Lock
+from typing import *
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import psycopg2
+
+
+class LocatorCallsignIndex:
+    """ In-memory index from locator prefixes to the callsigns worked there, kept in step with nac_log_new """
+
+    PREFIX_LENGTHS = (2, 4, 6)
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.lock = Lock()
+        self.prefixes: Dict[str, Dict[str, int]] = {}
+
+    def load(self, db: 'psycopg2') -> None:
+        """
+        Build the index from the whole log in one query.
+
+        :param db: The database connection to read nac_log_new from.
+        :return: None
+        """
+        cur = db.cursor()
+        cur.execute("SELECT callsign, locator FROM nac_log_new WHERE locator IS NOT NULL AND callsign IS NOT NULL")
+        rows = cur.fetchall()
+        cur.close()
+        with self.lock:
+            self.prefixes = {}
+            for callsign, locator in rows:
+                self._add(callsign, locator)
+        self.logger.info("Indexed %d logged locators into %d locator prefixes" % (len(rows), len(self.prefixes)))
+
+    def covers(self, locator: str) -> bool:
+        """ Return True if lookups of this locator can be answered by the index """
+        return locator is not None and len(locator) in self.PREFIX_LENGTHS
+
+    def callsigns(self, locator: str) -> List[str]:
+        """
+        :param locator: A 2, 4 or 6 character locator.
+        :return: The sorted callsigns logged with a locator starting with the given one.
+        """
+        with self.lock:
+            return sorted(self.prefixes.get(locator, {}))
+
+    def add(self, callsign: str, locator: str) -> None:
+        """ Account for a logged qso with callsign at locator """
+        with self.lock:
+            self._add(callsign, locator)
+
+    def remove(self, callsign: str, locator: str) -> None:
+        """ Account for a qso with callsign at locator leaving the log """
+        with self.lock:
+            self._remove(callsign, locator)
+
+    def replace(self, old_callsign: str, old_locator: str, callsign: str, locator: str) -> None:
+        """ Account for an edited qso, moving it from the old callsign and locator to the new ones """
+        with self.lock:
+            self._remove(old_callsign, old_locator)
+            self._add(callsign, locator)
+
+    def _add(self, callsign, locator):
+        if not callsign or not locator:
+            return
+        for length in self.PREFIX_LENGTHS:
+            if len(locator) < length:
+                break
+            counts = self.prefixes.setdefault(locator[:length], {})
+            counts[callsign] = counts.get(callsign, 0) + 1
+
+    def _remove(self, callsign, locator):
+        if not callsign or not locator:
+            return
+        for length in self.PREFIX_LENGTHS:
+            if len(locator) < length:
+                break
+            prefix = locator[:length]
+            counts = self.prefixes.get(prefix)
+            if not counts or callsign not in counts:
+                continue
+            counts[callsign] -= 1
+            if counts[callsign] <= 0:
+                del counts[callsign]
+                if not counts:
+                    del self.prefixes[prefix]
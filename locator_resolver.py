@@ -0,0 +1,138 @@
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+from typing import *
+
+from dbpool import cooperative, get_pool
+from statements import statements
+
+LOG, CALLBOOK = 0, 1
+
+_MISSING = object()
+
+LATEST_LOCATOR = statements.register("latest_locator", """
+    (SELECT 0, locator, date, NULL::timestamp FROM nac_log_new
+        WHERE callsign = %s AND length(locator) >= 6 ORDER BY date DESC, time DESC LIMIT 1)
+    UNION ALL
+    (SELECT 1, locator, NULL, last_change FROM callbook
+        WHERE callsign = %s AND length(locator) >= 6 ORDER BY last_change DESC, length(locator) DESC LIMIT 1)""")
+
+LONGEST_CALLBOOK_LOCATOR = statements.register("longest_callbook_locator", """
+    SELECT upper(locator) FROM callbook WHERE callsign=%s order by char_length(locator) DESC LIMIT 1""")
+
+LATEST_CALLBOOK_LOCATOR_IN_SQUARE = statements.register("latest_callbook_locator_in_square", """
+    SELECT upper(locator) FROM callbook WHERE callsign=%s and substr(locator,1,4) = %s order by last_change DESC LIMIT 1""")
+
+
+class LocatorResolver:
+    """
+    Resolves callsigns to locators from the log and the callbook, with an LRU cache of the results.
+
+    The cache must be told about writes to nac_log_new and callbook through invalidate().
+    """
+
+    def __init__(self, logger, maxsize=2048):
+        self.logger = logger
+        self.maxsize = maxsize
+        self.lock = Lock()
+        self.cache = OrderedDict()
+        self.generation = 0  # Bumped by invalidate(), so results computed meanwhile are not cached
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, key, compute):
+        with self.lock:
+            value = self.cache.get(key, _MISSING)
+            if value is not _MISSING:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+            generation = self.generation
+        value = compute()
+        with self.lock:
+            if generation != self.generation:
+                return value
+            self.cache[key] = value
+            while len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+        return value
+
+    def lookup(self, callsign, given_loc=None) -> Optional[str]:
+        """
+        Find the most recent full locator of a callsign, from the log or the callbook, whichever was updated last.
+        The callbook wins when both were updated the same day.
+
+        :param callsign: The callsign to lookup.
+        :param given_loc: The optional locator to match against.
+        :return: The found locator if found and matches given_loc, otherwise None.
+        """
+        found_loc = self._cached(("lookup", callsign), lambda: self._lookup(callsign))
+        if found_loc and given_loc:
+            return found_loc if given_loc[:4] == found_loc[:4] else None
+        return found_loc
+
+    @cooperative
+    def _lookup(self, callsign):
+        with get_pool().connection() as db:
+            with db.cursor() as cur:
+                statements.execute(cur, LATEST_LOCATOR, (callsign, callsign))
+                rows = cur.fetchall()
+
+        log_loc, log_date, callbook_loc, callbook_date = None, None, None, None
+        for source, locator, qso_date, last_change in rows:
+            if source == LOG:
+                log_loc, log_date = locator.upper(), str(qso_date)
+            else:
+                callbook_loc, callbook_date = locator.upper(), datetime.isoformat(last_change).replace('T', ' ')
+
+        if callbook_loc and log_loc:
+            return log_loc if log_date > callbook_date else callbook_loc
+        return callbook_loc or log_loc
+
+    def augmented(self, callsign: str, given_locator: str) -> Optional[str]:
+        """
+        :param callsign: The callsign of the person for whom to find the augmented locator.
+        :param given_locator: The given locator to filter the callbook entries by. Optional.
+        :return: The longest callbook locator of the callsign, or the most recent one within the square of the given
+                 locator, or None.
+        """
+        if not callsign:
+            return None
+        callsign = callsign.upper()
+        square = given_locator[0:4].upper() if given_locator else None
+        return self._cached(("augmented", callsign, square), lambda: self._augmented(callsign, square))
+
+    @staticmethod
+    @cooperative
+    def _augmented(callsign, square):
+        with get_pool().connection() as db:
+            with db.cursor() as cur:
+                if square is None:
+                    statements.execute(cur, LONGEST_CALLBOOK_LOCATOR, (callsign,))
+                else:
+                    statements.execute(cur, LATEST_CALLBOOK_LOCATOR_IN_SQUARE, (callsign, square))
+                row = cur.fetchone()
+        return row[0] if row else None
+
+    def invalidate(self, callsigns: Iterable[str] = None) -> None:
+        """
+        Forget what is known about some callsigns.
+
+        :param callsigns: The callsigns written to the log or the callbook, None to forget everything.
+        :return: None
+        """
+        with self.lock:
+            self.generation += 1
+            if callsigns is None:
+                self.cache.clear()
+                return
+            stale = {c.upper() for c in callsigns if c}
+            if not stale:
+                return
+            for key in [k for k in self.cache if k[1].upper() in stale]:
+                del self.cache[key]
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"size": len(self.cache), "hits": self.hits, "misses": self.misses}
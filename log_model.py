@@ -0,0 +1,200 @@
+import json
+import re
+from bisect import bisect_right
+from datetime import datetime
+from threading import Lock
+from typing import *
+
+from dbpool import cooperative, get_pool
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from main import MyApp
+
+# Column positions of the rows returned by HamOp.get_log_rows
+QSOID, DATE, TIME, CALLSIGN, TX, RX, LOCATOR, DISTANCE, SQUARE, POINTS, COMPLETE, PROPMODE, ACC_SQN, BAND, AUGMENTED_LOCATOR = range(15)
+
+
+def row_order(row) -> tuple:
+    """ Sort key matching ORDER BY date, time of get_log_rows, where a missing time sorts last """
+    return str(row[DATE]), row[TIME] is None, row[TIME] or ""
+
+
+class LogView:
+    """ The locators and qso dicts derived from the log rows for one band """
+
+    def __init__(self, band_key: str):
+        self.band_key = band_key
+        self.mhs = []
+        self.qsos = []
+        self.squares = set()
+        self._serialised = None
+
+    def append(self, row) -> None:
+        newmsqn = None
+        on_band = row[BAND].startswith(self.band_key)
+        if row[LOCATOR]:
+            mhsq = row[LOCATOR][:4].upper()
+            if mhsq not in self.squares and on_band and row[COMPLETE]:
+                newmsqn = len(self.squares) + 1
+                self.squares.add(mhsq)
+
+        self.qsos.append({"id": row[QSOID],
+                          "date": row[DATE],
+                          "time": row[TIME],
+                          "callsign": row[CALLSIGN].upper(),
+                          "tx": row[TX],
+                          "rx": row[RX],
+                          "locator": row[AUGMENTED_LOCATOR].upper() if row[AUGMENTED_LOCATOR] else row[LOCATOR].upper() if row[LOCATOR] else None,
+                          "distance": row[DISTANCE],
+                          "square": row[SQUARE],
+                          "points": row[POINTS],
+                          "complete": row[COMPLETE],
+                          "propmode": row[PROPMODE],
+                          "acc_sqn": newmsqn,
+                          "band": row[BAND],
+                          })
+        if row[LOCATOR] and on_band:
+            augmented = row[AUGMENTED_LOCATOR]
+            self.mhs.append(augmented.upper() if augmented and len(augmented) > len(row[LOCATOR]) else row[LOCATOR].upper())
+        self._serialised = None
+
+    def serialised(self) -> str:
+        """ :return: The qso dicts as a JSON array, rendered once per change of the view """
+        if self._serialised is None:
+            self._serialised = json.dumps(self.qsos, default=str)
+        return self._serialised
+
+
+class LogModel:
+    """
+    Cached view of the log rows within the current log scope.
+
+    The rows are read from the database only when the scope changes. Committed and deleted qsos are applied to the
+    cached rows as they happen, and the per band views are extended in place when a qso is appended at the end of the
+    log, which is the common case. Any other change rebuilds the views from the cached rows, not from the database.
+    """
+
+    def __init__(self, app: 'MyApp', logger):
+        self.app = app
+        self.logger = logger
+        self.lock = Lock()
+        self.scope = None
+        self.rows = []
+        self.keys = []
+        self.views: Dict[str, LogView] = {}
+
+    @staticmethod
+    def scope_of(since: datetime = None, until: datetime = None) -> tuple:
+        """ :return: The (start date, stop date, start time, stop time) bounds get_log_rows applies for since and until """
+        t_date_start = since.isoformat() if since is not None else "1900-01-01T00:00:00"
+        t_date_stop = until.isoformat() if until is not None else "9999-12-31T23:59:59"
+        return (t_date_start[:10], t_date_stop[:10],
+                t_date_start[11:16].replace(":", ""), t_date_stop[11:16].replace(":", ""))
+
+    @staticmethod
+    def band_key(band: str) -> str:
+        return re.split("[-.]", band)[0]
+
+    def _in_scope(self, row) -> bool:
+        start_date, stop_date, start_time, stop_time = self.scope
+        if not start_date <= str(row[DATE]) <= stop_date:
+            return False
+        return row[TIME] is None or start_time <= row[TIME] <= stop_time
+
+    def _load(self, scope):
+        with get_pool().connection(), self.app.ham_op.get_log_rows(*scope) as rows:
+            self.rows = list(rows)
+        self.keys = [row_order(row) for row in self.rows]
+        self.scope = self.scope_of(*scope)
+        self.views = {}
+        self.logger.debug("Loaded %d log rows into the log model" % len(self.rows))
+
+    def _ensure_scope(self, since, until):
+        if self.scope != self.scope_of(since, until):
+            self._load((since, until))
+
+    def _view(self, band: str) -> LogView:
+        key = self.band_key(band)
+        view = self.views.get(key)
+        if view is None:
+            view = LogView(key)
+            for row in self.rows:
+                view.append(row)
+            self.views[key] = view
+        return view
+
+    @cooperative
+    def worked_callsigns(self, since: datetime = None, until: datetime = None) -> Set[str]:
+        """ :return: The upper-cased callsigns of the log rows within the scope """
+        with self.lock:
+            self._ensure_scope(since, until)
+            return {row[CALLSIGN].upper() for row in self.rows}
+
+    @cooperative
+    def get_mhs(self, since: datetime = None, until: datetime = None, band: str = "144") -> Tuple[list, list]:
+        """
+        :param since: Start of the log scope, None for no limit.
+        :param until: End of the log scope, None for no limit.
+        :param band: The band the locators and square numbers are computed for.
+        :return: A tuple (locators, qsos) where locators is a fresh list the caller may modify.
+        """
+        with self.lock:
+            self._ensure_scope(since, until)
+            view = self._view(band)
+            return list(view.mhs), view.qsos
+
+    @cooperative
+    def get_serialised_qsos(self, since: datetime = None, until: datetime = None, band: str = "144") -> Tuple[str, int]:
+        """ :return: A tuple (JSON array of the qso dicts, number of qsos) for sending to connecting clients """
+        with self.lock:
+            self._ensure_scope(since, until)
+            view = self._view(band)
+            return view.serialised(), len(view.qsos)
+
+    def apply_commit(self, row) -> None:
+        """
+        Apply an inserted or updated log row to the model.
+
+        :param row: The full row, in get_log_rows column order, as written to the database.
+        :return: None
+        """
+        with self.lock:
+            if self.scope is None:
+                return
+            rebuild = self._remove(row[QSOID])
+            if not self._in_scope(row):
+                if rebuild:
+                    self.views = {}
+                return
+            key = row_order(row)
+            index = bisect_right(self.keys, key)
+            self.rows.insert(index, row)
+            self.keys.insert(index, key)
+            if rebuild or index != len(self.rows) - 1:
+                self.views = {}
+            else:
+                for view in self.views.values():
+                    view.append(row)
+
+    def apply_delete(self, qsoid) -> None:
+        """ Remove a deleted log row from the model """
+        with self.lock:
+            if self.scope is not None and self._remove(qsoid):
+                self.views = {}
+
+    def invalidate(self) -> None:
+        """ Drop everything, for changes to the log made outside apply_commit and apply_delete """
+        with self.lock:
+            self.scope = None
+            self.rows = []
+            self.keys = []
+            self.views = {}
+
+    def _remove(self, qsoid) -> bool:
+        for index, row in enumerate(self.rows):
+            if row[QSOID] == qsoid:
+                del self.rows[index]
+                del self.keys[index]
+                return True
+        return False
@@ -62,6 +62,8 @@ except OSError as e:
     sys.exit(1)
 
 
+import html
+from datetime import datetime
 from flask import Flask, render_template, request
 import psycopg2
 from config import DevelopmentConfig
@@ -102,10 +104,27 @@ class MyApp(Flask):
 
         self.socket_io = socket_io
 
-        self._db = psycopg2.connect(dbname='ham_station')
+        from dbpool import get_pool
+        self.db_pool = get_pool(logger)
+
+        from statements import statements
+        statements.enabled = self.config['PREPARED_STATEMENTS']
+
+        from query_stats import query_stats
+        query_stats.logger = logger
+        query_stats.slow_threshold = self.config['SLOW_QUERY_MS'] / 1000.0
+
+        if socket_io.async_mode == "eventlet":
+            # Database calls made by green threads run in eventlet's native thread pool, leaving the hub free
+            from eventlet import tpool
+            from dbpool import cooperate
+            cooperate(tpool.execute)
+
+        from schema import ensure_schema
+        ensure_schema(self.db_pool, logger)
 
         from hamop import HamOp
-        self.ham_op = HamOp(self, logger, self._db)
+        self.ham_op = HamOp(self, logger, self.db_pool)
 
         from clientmgr import ClientMgr
         self.client_mgr = ClientMgr(self, logger, socket_io)
@@ -291,6 +310,12 @@ def cmd_help():
         <tr><td>/translate_qras</td><td>Translate all legacy QRA locators in the log to Maidenhead locators</td></tr>
         <tr><td>/recompute_distances</td><td>Recompute all distances in the log and add distances where missing</td></tr>
         <tr><td>/status</td><td>Return rig status</td></tr>
+        <tr><td>/query_stats</td><td>Return latency, row count and call site statistics per database query, /query_stats?reset=1 to start over</td></tr>
+        <tr><td>/dispatch_stats</td><td>Return client message dispatch latency statistics</td></tr>
+        <tr><td>/db_stats</td><td>Return database connection pool usage statistics</td></tr>
+        <tr><td>/geometry_cache</td><td>Return the size and hit and miss counts of the locator geometry cache and the home bearing table</td></tr>
+        <tr><td>/station_index</td><td>Return the stations heard around my QTH, /station_index?from=30&amp;to=90&amp;min=100&amp;max=800 for a sector and distance band</td></tr>
+        <tr><td>/import_jobs</td><td>Return the progress of the log upload import jobs</td></tr>
         <tr><td>/paon</td><td>Turn on the power supply to the transmitter power amplifiers</td></tr>
         <tr><td>/paoff</td><td>Turn off the power supply to the transmitter power amplifiers</td></tr>
         <tr><td>/qroon</td><td>Enable high power transmission</td></tr>
@@ -322,6 +347,89 @@ def my_status():
     return app.ham_op.my_status()
 
 
+@app.route("/query_stats")
+def query_stats_report():
+    from query_stats import query_stats, LATENCY_BUCKETS_MS
+    if request.args.get("reset"):
+        query_stats.reset()
+        return "Query statistics reset"
+    buckets = ["&le;%d ms" % b for b in LATENCY_BUCKETS_MS] + ["&gt;%d ms" % LATENCY_BUCKETS_MS[-1]]
+    rows = ["<tr><th>Query</th><th>Calls</th><th>Errors</th><th>Total ms</th><th>Mean ms</th><th>Max ms</th>"
+            "<th>Rows</th><th>Latency histogram</th><th>Call sites</th></tr>"]
+    for s in query_stats.stats():
+        histogram = ", ".join("%s: %d" % (b, n) for b, n in zip(buckets, s["histogram"]) if n)
+        sites = "<br/>".join("%s (%d)" % (html.escape(site), n) for site, n in s["call_sites"])
+        rows.append("<tr><td>%s</td><td>%d</td><td>%d</td><td>%.1f</td><td>%.2f</td><td>%.2f</td><td>%d</td>"
+                    "<td>%s</td><td>%s</td></tr>" %
+                    (html.escape(s["name"]), s["calls"], s["errors"], s["total_ms"], s["mean_ms"], s["max_ms"],
+                     s["rows"], histogram, sites))
+    return "Queries since %s, slow query threshold %.0f ms<br/><table border=\"1\">%s</table>" % \
+        (datetime.fromtimestamp(query_stats.since).isoformat(timespec="seconds"),
+         query_stats.slow_threshold * 1000.0, "".join(rows))
+
+@app.route("/dispatch_stats")
+def dispatch_stats():
+    from clientmgr import dispatcher
+    stats = dispatcher.stats()
+    return "Dispatched %d messages in %d passes during the last %d seconds, %d coalesced away<br/>" \
+           "Queueing latency mean %.2f ms, max %.2f ms, last %.2f ms<br/>" % \
+           (stats["dispatched"], stats["passes"], stats["seconds"], stats["coalesced"],
+            stats["mean_ms"], stats["max_ms"], stats["last_ms"])
+
+
+@app.route("/db_stats")
+def db_stats():
+    from statements import statements
+    stats = app.db_pool.stats()
+    return "Database connections: %d open of at most %d, %d in use, peak %d in use, %d opened in total<br/>" \
+           "Checkouts %d, nested reuses %d, waits %d, mean wait %.2f ms, max wait %.2f ms<br/>" \
+           "Health checks %d, connections replaced %d, open transactions rolled back on return %d<br/>" % \
+           (stats["open"], stats["max_connections"], stats["in_use"], stats["peak_in_use"], stats["opened"],
+            stats["checkouts"], stats["reuses"], stats["waits"], stats["mean_wait_ms"], stats["max_wait_ms"],
+            stats["health_checks"], stats["replaced"], stats["rollbacks"]) + \
+        "Calls offloaded from the hub to the thread pool %d<br/>" % stats["offloaded"] + \
+        "Prepared statements %s<br/>" % ("enabled" if statements.enabled else "disabled") + \
+        "".join("%s: %d calls, %d plain, %d prepares, mean prepare %.2f ms, mean execute %.2f ms<br/>" %
+                (name, s["calls"], s["plain"], s["prepares"], s["mean_prepare_ms"], s["mean_execute_ms"])
+                for name, s in statements.stats().items())
+
+
+@app.route("/geometry_cache")
+def geometry_cache():
+    import locator.src.maidenhead as mh
+    info = mh.geometry_cache_info()
+    table = app.ham_op.home_table.stats()
+    return "Locator geometry cache: %d of at most %d locators, %d hits, %d misses<br/>" % \
+           (info["size"], info["maxsize"], info["hits"], info["misses"]) + \
+        "Home bearing table for %s: %d locators within %.0f km in %d bytes, %d builds, %d hits, %d misses<br/>" % \
+        (table["home"], table["locators"], table["radius"], table["bytes"], table["builds"], table["hits"],
+         table["misses"])
+
+
+@app.route("/station_index")
+def station_index():
+    index = app.ham_op.station_index
+    stats = index.stats()
+    az_from = float(request.args.get("from", 0))
+    az_to = float(request.args.get("to", 360))
+    min_dist = float(request.args.get("min", 0))
+    max_dist = float(request.args.get("max", "inf"))
+    stations = app.ham_op.stations_in_sector(az_from, az_to, min_dist, max_dist)
+    return "Station index: %d stations in %d degree bins and %d distance rings, %d pending expiries<br/>" % \
+           (stats["stations"], stats["az_step"], len(stats["rings_km"]) + 1, stats["pending_expiries"]) + \
+        "Stations per bin from north: %s<br/>" % " ".join(str(n) for n in index.histogram()) + \
+        "%d stations heard in the last 30 minutes from %g to %g degrees, %g to %g km:<br/>" % \
+        (len(stations), az_from, az_to, min_dist, max_dist) + \
+        "".join("%s %s %.0f degrees %.0f km %s<br/>" % (html.escape(s.callsign), html.escape(s.locator or ""), s.my_az,
+                                                        s.dist, s.mode) for s in stations)
+
+
+@app.route("/import_jobs")
+def import_jobs():
+    return "".join("Job %(job)d %(filename)s %(status)s: %(parsed)d of %(total)d parsed, %(matched)d matched, "
+                   "%(adjusted)d adjusted, %(added)d added<br/>" % job for job in app.ham_op.import_jobs.stats())
+
+
 @app.route("/paon")
 def my_pa_on():
     return app.ham_op.my_pa_on()
@@ -377,7 +485,7 @@ def az_scan(az_start,az_stop,period,sweeps, increment):
 
 @socket_io.event()
 def connect():
-    app.client_mgr.connect()
+    app.client_mgr.connect(sid=request.sid)
 
 
 
@@ -591,6 +699,10 @@ def station_click(callsign):
     emit("fill_dx_grid", callsign, namespace="/", broadcast=True)
     return app.station_tracker.track_station(app.azel, callsign)
 
+@socket_io.event()
+def resync_stations(_json):
+    app.client_mgr.send_stations_snapshot(request.sid)
+
 @socket_io.event()
 def map_settings(settings):
     app.client_mgr.map_settings(settings)
@@ -4,19 +4,23 @@ import requests
 import os
 import time
 import locator.src.maidenhead as mh
+import numpy as np
 
 import psycopg2.extras
+from dbpool import get_pool
+from schema import rx_beam_offset
+from station_index import Station
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
 	import psycopg2
 	from main import MyApp
 
 class Reporter:
-	def __init__(self, app:'MyApp', logger, my_qth="JO67BQ68SL", max_distance=4300, min_freq=144000000, max_freq=144500000, max_db_age=3600, max_file_age=300, mode=None):
+	def __init__(self, app:'MyApp', logger, my_qth=None, max_distance=4300, min_freq=144000000, max_freq=144500000, max_db_age=3600, max_file_age=300, mode=None):
 		self.app = app
 		self.logger =  logger
 		self.max_distance=max_distance
-		self.my_qth=my_qth
+		self.my_qth=my_qth  # None for the configured locator, HamOp.my_qth()
 		self.server_uri = "report.pskreporter.info"
 		self.server_port = 4739
 		self.call_signs_to_send = {} # Keyed by call signs to eliminate duplicates.
@@ -31,7 +35,7 @@ class Reporter:
 			self.retrieve_uri += "&mode=%s" % mode
 		self.cache_file_name="/tmp/pskreports_%d-%d%s.txt" %  (min_freq, max_freq, mode if mode else "")
 
-		self.db = psycopg2.connect(dbname='ham_station')
+		self.pool = get_pool()
 
 
 	@classmethod
@@ -62,13 +66,15 @@ class Reporter:
 
 	def truncate(self, max_age = None):
 		""" Truncate the reports table, deletes the entries that are older than max_age."""
-		cur = self.db.cursor()
 		# self.logger.info("Truncating reports table")
-		q = "delete from reports where  (extract(epoch from statement_timestamp()) - happened_at) > %s"
+		q = "delete from reports where happened_at < extract(epoch from statement_timestamp()) - %s"
 		if max_age is None:
 			max_age = self.max_db_age
-		cur.execute(q,(max_age,))
-		self.db.commit()
+		with self.pool.connection() as db:
+			cur = db.cursor()
+			cur.execute(q,(max_age,))
+			db.commit()
+		self.app.ham_op.station_index.expire(time.time() - max_age)
 
 	def parse_cached_file(self):
 		""" Parse the cached file"""
@@ -107,21 +113,25 @@ class Reporter:
 		kids = list(root)
 		# print(kids)
 
-		with self.db, self.db.cursor() as cur:
+		with self.pool.connection() as db, db, db.cursor() as cur:
 
 			q0 = """INSERT INTO callbook 
 											VALUES (%s, %s, %s, %s)
 										   ON CONFLICT ON CONSTRAINT callbook_pk DO UPDATE SET antenna = %s, main_lobe_degrees = %s"""
 			all_receivers= []
 
-			q1 = """INSERT INTO reports 
-								   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+			q1 = """INSERT INTO reports (my_rx_distance, rx_heading, happened_at, dx_callsign, dx_loc, rx_callsign, rx_loc,
+								                    tx_heading, frequency, my_tx_distance, snr, distance, my_rx_heading, my_tx_heading,
+								                    mode, rx_beam_offset)
+								   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
 								   ON CONFLICT ON CONSTRAINT reports_pk DO UPDATE SET happened_at = %s, snr = %s, mode = %s
 								"""
 			all_reports = []
 
 			q2 = """INSERT INTO callbook VALUES (%s, %s, NULL, NULL) ON CONFLICT ON CONSTRAINT callbook_pk DO UPDATE SET last_change = CURRENT_TIMESTAMP"""
 			all_callbooks = []
+			heard = []  # (rx_cs, rx_loc, tx_cs, tx_loc, freq, mode, snr, happened_at) of the reports within the band
+			heard_stations = []  # The receiving and sending stations of the inserted reports, for the station index
 
 			#self.logger.debug("Building batch data")
 			for kid in kids:
@@ -156,46 +166,61 @@ class Reporter:
 						mode = kid.attrib["mode"]
 						snr = int(kid.attrib["sNR"])
 						happened_at = int(kid.attrib['flowStartSeconds'])
-
-
-						my_rx_distance = mh.distance_between(self.my_qth, rx_loc)
-						try:
-							my_tx_distance = mh.distance_between(self.my_qth, tx_loc)
-							distance_between =  mh.distance_between(rx_loc, tx_loc)
-						except ValueError:
-							my_tx_distance = (0,0)
-							distance_between = (0,0)
-
-						if (my_rx_distance[1] < self.max_distance or
-								 my_tx_distance[1] < self.max_distance):
-							# print(rx_cs, rx_loc, freq, my_rx_distance[1])
-							#self.logger.info("Inserting into reports")
-
-							args = [my_rx_distance[1],
-									distance_between[0],
-									happened_at,
-									tx_cs, tx_loc, rx_cs, rx_loc,
-									distance_between[0]+180 if distance_between[0] < 180 else distance_between[0]-180,
-									freq, my_tx_distance[1], snr, distance_between[1], my_rx_distance[0], my_tx_distance[0], mode,
-									happened_at, snr, mode]
-							all_reports.append(args)
-							#cur.execute(q, args)
-							#self.logger.info("Inserting into callbook 2")
-							all_callbooks.append([tx_loc, tx_cs])
-							all_callbooks.append([rx_loc, rx_cs])
-
-							# try:
-							# 	cur.execute(q, [tx_loc, tx_cs])
-							# except:
-							# 	pass
-							# try:
-							# 	cur.execute(q, [rx_loc, rx_cs])
-							# except:
-							# 	pass
+						heard.append((rx_cs, rx_loc, tx_cs, tx_loc, freq, mode, snr, happened_at))
+
+			# The bearings and distances of all reports at once, NaN for invalid locators
+			rx_locs = [h[1] for h in heard]
+			tx_locs = [h[3] for h in heard]
+			home_table = self.app.ham_op.home_table
+			my_qth = self.my_qth
+			if my_qth is None:
+				my_qth = self.app.ham_op.my_qth()
+				home_table.use_home(my_qth)  # Follows a change of my_locator taking effect, a no-op otherwise
+			my_rx_headings, my_rx_distances = home_table.distances_from(my_qth, rx_locs)
+			my_tx_headings, my_tx_distances = home_table.distances_from(my_qth, tx_locs)
+			headings, distances = mh.distances_between(rx_locs, tx_locs)
+
+			for i, (rx_cs, rx_loc, tx_cs, tx_loc, freq, mode, snr, happened_at) in enumerate(heard):
+				if np.isnan(my_rx_distances[i]):
+					self.logger.debug("Skipping report from %s with invalid locator %s" % (rx_cs, rx_loc))
+					continue
+				my_rx_distance = float(my_rx_headings[i]), float(my_rx_distances[i])
+				if np.isnan(my_tx_distances[i]):
+					my_tx_distance = (0,0)
+					distance_between = (0,0)
+				else:
+					my_tx_distance = float(my_tx_headings[i]), float(my_tx_distances[i])
+					distance_between = float(headings[i]), float(distances[i])
+
+				if (my_rx_distance[1] < self.max_distance or
+						 my_tx_distance[1] < self.max_distance):
+					# print(rx_cs, rx_loc, freq, my_rx_distance[1])
+					#self.logger.info("Inserting into reports")
+
+					args = [my_rx_distance[1],
+							distance_between[0],
+							happened_at,
+							tx_cs, tx_loc, rx_cs, rx_loc,
+							distance_between[0]+180 if distance_between[0] < 180 else distance_between[0]-180,
+							freq, my_tx_distance[1], snr, distance_between[1], my_rx_distance[0], my_tx_distance[0], mode,
+							rx_beam_offset(distance_between[0], my_rx_distance[0]),
+							happened_at, snr, mode]
+					all_reports.append(args)
+					heard_stations.append(Station(rx_cs, rx_loc, my_rx_distance[0], my_rx_distance[1], distance_between[0],
+												  happened_at, freq, mode))
+					if my_tx_distance[1]:
+						heard_stations.append(Station(tx_cs, tx_loc, my_tx_distance[0], my_tx_distance[1], args[7],
+													  happened_at, freq, mode))
+					#self.logger.info("Inserting into callbook 2")
+					all_callbooks.append([tx_loc, tx_cs])
+					all_callbooks.append([rx_loc, rx_cs])
 
 			# self.logger.info("Batch insert all %d receivers" % len(all_receivers))
 			psycopg2.extras.execute_batch(cur, q0, all_receivers)
 			# self.logger.info("Batch insert all %d reports" % len(all_receivers))
 			psycopg2.extras.execute_batch(cur, q1, all_reports)
 			# self.logger.info("Batch insert all %d callbook updates" % len(all_callbooks))
-			psycopg2.extras.execute_batch(cur, q2, all_callbooks)
\ No newline at end of file
+			psycopg2.extras.execute_batch(cur, q2, all_callbooks)
+
+		self.app.ham_op.station_index.insert(heard_stations)
+		self.app.ham_op.locator_resolver.invalidate({r[1] for r in all_receivers} | {c[1] for c in all_callbooks})
\ No newline at end of file
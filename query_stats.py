@@ -0,0 +1,162 @@
+import bisect
+import os
+import re
+import sys
+import time
+from collections import Counter
+from threading import Lock
+from typing import *
+
+import psycopg2.extensions
+
+# Upper bounds in ms of the latency histogram buckets, the last bucket takes the rest
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+_WHITESPACE = re.compile(r"\s+")
+_NAMED = re.compile(r"^(EXECUTE|PREPARE)\s+(\w+)", re.IGNORECASE)
+
+# Frames in these files are the database layer, not the call site of a query
+_LAYER_FILES = {os.path.normcase(os.path.abspath(__file__))}
+
+
+def register_layer_file(filename: str) -> None:
+    """ Skip the frames of a module wrapping cursor calls when finding the call site of a query """
+    _LAYER_FILES.add(os.path.normcase(os.path.abspath(filename)))
+
+
+def query_name(query) -> str:
+    """ :return: The statement name of an EXECUTE or PREPARE, otherwise the start of the query on one line """
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    elif not isinstance(query, str):
+        query = str(query)
+    query = _WHITESPACE.sub(" ", query).strip()
+    named = _NAMED.match(query)
+    if named:
+        return named.group(2) if named.group(1).upper() == "EXECUTE" else "prepare " + named.group(2)
+    return query[:80]
+
+
+def call_site() -> str:
+    """ :return: file:line function of the innermost caller outside the database layer and the standard library """
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.normcase(os.path.abspath(frame.f_code.co_filename))
+        if filename not in _LAYER_FILES and "psycopg2" not in filename and not filename.endswith("contextlib.py"):
+            return "%s:%d %s" % (os.path.basename(filename), frame.f_lineno, frame.f_code.co_name)
+        frame = frame.f_back
+    return "?"
+
+
+class QueryStat:
+    """ What is known about one named query """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.rows = 0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.call_sites = Counter()
+
+
+class QueryStats:
+    """
+    Latency, row count and call site statistics of the queries executed through the pooled connections.
+
+    Queries are named by their prepared statement name, or by the start of their text. Queries taking longer than
+    slow_threshold seconds are logged with their call site.
+    """
+
+    def __init__(self, slow_threshold: float = 0.5, logger=None):
+        self.slow_threshold = slow_threshold
+        self.logger = logger
+        self.lock = Lock()
+        self.queries: Dict[str, QueryStat] = {}
+        self.since = time.time()
+
+    def record(self, query, args, elapsed: float, rows: int, failed: bool = False) -> None:
+        name = query_name(query)
+        site = call_site()
+        ms = elapsed * 1000.0
+        with self.lock:
+            stat = self.queries.get(name)
+            if stat is None:
+                stat = self.queries[name] = QueryStat()
+            stat.calls += 1
+            stat.errors += failed
+            stat.total_time += elapsed
+            stat.max_time = max(stat.max_time, elapsed)
+            if rows > 0:
+                stat.rows += rows
+            stat.histogram[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+            stat.call_sites[site] += 1
+        if elapsed >= self.slow_threshold and self.logger:
+            self.logger.warning("Slow query %.1f ms, %d rows, at %s: %s %s" %
+                                (ms, rows, site, _WHITESPACE.sub(" ", str(query)).strip()[:500], str(args)[:200]))
+
+    def stats(self) -> List[dict]:
+        """ :return: One dict per named query, the most time consuming first """
+        with self.lock:
+            result = [{"name": name,
+                       "calls": s.calls,
+                       "errors": s.errors,
+                       "total_ms": s.total_time * 1000.0,
+                       "mean_ms": s.total_time / s.calls * 1000.0,
+                       "max_ms": s.max_time * 1000.0,
+                       "rows": s.rows,
+                       "histogram": list(s.histogram),
+                       "call_sites": s.call_sites.most_common(5)}
+                      for name, s in self.queries.items()]
+        return sorted(result, key=lambda s: s["total_ms"], reverse=True)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.queries = {}
+            self.since = time.time()
+
+
+query_stats = QueryStats()
+
+
+class InstrumentedCursorMixin:
+    """ Cursor mixin recording every execute and copy in query_stats """
+
+    def _timed(self, method, query, args, *call_args):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = method(*call_args)
+            failed = False
+            return result
+        finally:
+            query_stats.record(query, args, time.perf_counter() - started, self.rowcount, failed)
+
+    def execute(self, query, vars=None):
+        return self._timed(super().execute, query, vars, query, vars)
+
+    def executemany(self, query, vars_list):
+        return self._timed(super().executemany, query, None, query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._timed(super().copy_expert, sql, None, sql, file, size)
+
+
+_instrumented_classes = {}
+_instrumented_lock = Lock()
+
+
+def instrumented(cursor_factory=None):
+    """ :return: The instrumented subclass of a cursor class, psycopg2's plain cursor when None """
+    cursor_factory = cursor_factory or psycopg2.extensions.cursor
+    if issubclass(cursor_factory, InstrumentedCursorMixin):
+        return cursor_factory
+    cls = _instrumented_classes.get(cursor_factory)
+    if cls is None:
+        with _instrumented_lock:
+            cls = _instrumented_classes.get(cursor_factory)
+            if cls is None:
+                cls = type("Instrumented" + cursor_factory.__name__, (InstrumentedCursorMixin, cursor_factory), {})
+                _instrumented_classes[cursor_factory] = cls
+    return cls
@@ -0,0 +1,238 @@
+import math
+from typing import *
+
+from dbpool import ConnectionPool
+
+
+def rx_beam_offset(rx_heading: float, my_rx_heading: float) -> float:
+    """
+    How far, in degrees, the antenna of a receiving station points away from my QTH.
+
+    Uses the same truncating modulo as the SQL MOD function, so values computed at insert and by the migration agree.
+
+    :param rx_heading: The bearing from the receiving station to the station it heard.
+    :param my_rx_heading: The bearing from my QTH to the receiving station.
+    :return: The offset, compared against half the beamwidth.
+    """
+    return abs(math.fmod(rx_heading - 180, 360) - my_rx_heading)
+
+
+# Every migration is (version, description, statements). The statements of a migration run in one transaction together
+# with recording its version, so a failing migration leaves nothing behind. Append new migrations at the end, never
+# change one that has been released. The statements are written to be harmless on databases that predate the
+# schema_version table, where the tables and some of the indexes already exist.
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, "Create the tables", [
+        """CREATE TABLE IF NOT EXISTS nac_log_new (
+               qsoid serial PRIMARY KEY,
+               date date,
+               time character varying(4),
+               callsign text NOT NULL,
+               tx text,
+               rx text,
+               locator text,
+               distance double precision,
+               square integer,
+               points integer,
+               complete boolean DEFAULT false,
+               band text,
+               accumulated_sqn text,
+               txmode text,
+               propmode text,
+               augmented_locator text,
+               my_locator text)""",
+        """CREATE TABLE IF NOT EXISTS callbook (
+               locator text NOT NULL,
+               callsign text NOT NULL,
+               antenna text,
+               main_lobe_degrees integer,
+               last_change timestamp DEFAULT CURRENT_TIMESTAMP,
+               CONSTRAINT callbook_pk PRIMARY KEY (callsign, locator))""",
+        """CREATE TABLE IF NOT EXISTS reports (
+               my_rx_distance numeric,
+               rx_heading numeric,
+               happened_at bigint,
+               dx_callsign text NOT NULL,
+               dx_loc text,
+               rx_callsign text NOT NULL,
+               rx_loc text,
+               tx_heading numeric,
+               frequency bigint,
+               my_tx_distance numeric,
+               snr integer,
+               distance numeric,
+               my_rx_heading numeric,
+               my_tx_heading numeric,
+               mode text,
+               CONSTRAINT reports_pk PRIMARY KEY (dx_callsign, rx_callsign))""",
+        """CREATE TABLE IF NOT EXISTS beacons (
+               dx_callsign text NOT NULL,
+               dx_loc text,
+               frequency bigint,
+               snr integer,
+               mode text,
+               qtf double precision)""",
+        """CREATE TABLE IF NOT EXISTS config_int (
+               key text NOT NULL,
+               value integer,
+               time_start timestamp,
+               time_stop timestamp,
+               band text)""",
+        """CREATE TABLE IF NOT EXISTS config_float (
+               key text NOT NULL,
+               value double precision,
+               time_start timestamp,
+               time_stop timestamp,
+               band text)""",
+        """CREATE TABLE IF NOT EXISTS config_str (
+               key text NOT NULL,
+               value text,
+               time_start timestamp,
+               time_stop timestamp,
+               band text)""",
+        """CREATE TABLE IF NOT EXISTS origi (
+               origo_lon double precision,
+               origo_lat double precision,
+               zoom double precision,
+               mh_length integer NOT NULL,
+               band text NOT NULL,
+               az_from integer NOT NULL,
+               az_to integer NOT NULL,
+               log_scope text NOT NULL,
+               CONSTRAINT origi_keys PRIMARY KEY (mh_length, band, az_from, az_to, log_scope))""",
+        """CREATE TABLE IF NOT EXISTS azel_current (
+               id integer PRIMARY KEY,
+               az integer,
+               el integer)""",
+        """CREATE TABLE IF NOT EXISTS adif_log (
+               id serial PRIMARY KEY,
+               qso_date date,
+               time_on character varying(6),
+               call text,
+               rst_sent text,
+               rst_rcvd text,
+               gridsquare text,
+               propmode text,
+               txmode text,
+               mode text,
+               distance text,
+               stnmate_square_no integer,
+               stnmate_points integer)""",
+    ]),
+    (2, "Precompute the receiver beam offset of reports", [
+        # Filled in by Reporter.retrieve for new reports. The cast makes MOD work whatever type the headings have
+        "ALTER TABLE reports ADD COLUMN IF NOT EXISTS rx_beam_offset double precision",
+        """UPDATE reports SET rx_beam_offset = ABS(MOD((rx_heading - 180)::numeric, 360) - my_rx_heading)
+           WHERE rx_beam_offset IS NULL""",
+        "CREATE INDEX IF NOT EXISTS reports_happened_at_idx ON reports (happened_at)",
+    ]),
+    (3, "Index the log and callbook lookups", [
+        # Latest qso of a callsign, LocatorResolver and do_commit_qso duplicate checks
+        "CREATE INDEX IF NOT EXISTS nac_log_new_callsign_idx ON nac_log_new (callsign, date, time)",
+        # Prefix matches of locator LIKE 'JO67%', which a plain btree cannot serve outside the C locale
+        "CREATE INDEX IF NOT EXISTS nac_log_new_locator_idx ON nac_log_new (locator text_pattern_ops)",
+        # The log scope and contest period ranges, ordered by date and time
+        "CREATE INDEX IF NOT EXISTS nac_log_new_date_time_idx ON nac_log_new (date, time)",
+        "CREATE INDEX IF NOT EXISTS callbook_callsign_idx ON callbook (callsign, last_change)",
+        "CREATE INDEX IF NOT EXISTS adif_log_call_date_idx ON adif_log (call, qso_date)",
+        "CREATE INDEX IF NOT EXISTS config_str_key_idx ON config_str (key)",
+    ]),
+]
+
+# The indexes the queries of the program rely on, as (table, leading columns, operator class or None). Any index whose
+# columns start with the given ones will do, whatever its name.
+EXPECTED_INDEXES: List[Tuple[str, Tuple[str, ...], Optional[str]]] = [
+    ("nac_log_new", ("qsoid",), None),
+    ("nac_log_new", ("callsign",), None),
+    ("nac_log_new", ("locator",), "text_pattern_ops"),
+    ("nac_log_new", ("date", "time"), None),
+    ("callbook", ("callsign",), None),
+    ("reports", ("dx_callsign", "rx_callsign"), None),
+    ("reports", ("happened_at",), None),
+    ("origi", ("mh_length", "band", "az_from", "az_to", "log_scope"), None),
+    ("adif_log", ("call",), None),
+]
+
+
+def schema_version(pool: ConnectionPool) -> int:
+    """
+    :param pool: The connection pool to use.
+    :return: The version of the last migration applied to the database, 0 when none has been.
+    """
+    with pool.connection() as db:
+        with db.cursor() as cur:
+            cur.execute("""CREATE TABLE IF NOT EXISTS schema_version (
+                               version integer PRIMARY KEY,
+                               description text,
+                               applied_at timestamp DEFAULT CURRENT_TIMESTAMP)""")
+            cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            version = cur.fetchone()[0]
+        db.commit()
+    return version
+
+
+def migrate(pool: ConnectionPool, logger) -> int:
+    """
+    Apply the migrations newer than the version of the database, in order.
+
+    :param pool: The connection pool to use.
+    :param logger: The logger to report applied migrations to.
+    :return: The schema version after migrating.
+    """
+    version = schema_version(pool)
+    for number, description, statements in MIGRATIONS:
+        if number <= version:
+            continue
+        with pool.connection() as db:
+            with db.cursor() as cur:
+                for statement in statements:
+                    cur.execute(statement)
+                cur.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)", (number, description))
+            db.commit()
+        logger.info("Applied schema migration %d: %s" % (number, description))
+        version = number
+    return version
+
+
+def missing_indexes(pool: ConnectionPool) -> List[Tuple[str, Tuple[str, ...], Optional[str]]]:
+    """
+    :param pool: The connection pool to use.
+    :return: The entries of EXPECTED_INDEXES that no index of the current schema satisfies.
+    """
+    tables = sorted({table for table, _columns, _opclass in EXPECTED_INDEXES})
+    with pool.connection() as db:
+        with db.cursor() as cur:
+            cur.execute("""SELECT t.relname, pg_get_indexdef(i.indexrelid),
+                                  array(SELECT a.attname
+                                          FROM unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+                                          JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                                         ORDER BY k.ord)
+                             FROM pg_index i
+                             JOIN pg_class t ON t.oid = i.indrelid
+                             JOIN pg_namespace n ON n.oid = t.relnamespace
+                            WHERE n.nspname = current_schema() AND t.relname = ANY(%s)""", (tables,))
+            indexes = cur.fetchall()
+        db.rollback()
+    missing = []
+    for table, columns, opclass in EXPECTED_INDEXES:
+        if not any(index_table == table and tuple(index_columns[:len(columns)]) == columns and
+                   (opclass is None or opclass in definition)
+                   for index_table, definition, index_columns in indexes):
+            missing.append((table, columns, opclass))
+    return missing
+
+
+def ensure_schema(pool: ConnectionPool, logger) -> None:
+    """
+    Bring the database schema up to what the program expects, then warn about indexes the queries need but which
+    are missing, e.g. dropped by hand after the migration that created them.
+
+    :param pool: The connection pool to use.
+    :param logger: The logger to report changes and missing indexes to.
+    :return: None
+    """
+    version = migrate(pool, logger)
+    logger.info("Database schema is at version %d" % version)
+    for table, columns, opclass in missing_indexes(pool):
+        logger.warning("Missing index on %s (%s%s), queries on it will scan the table" %
+                       (table, ", ".join(columns), " " + opclass if opclass else ""))
@@ -0,0 +1,103 @@
+import re
+import time
+from threading import Lock
+from typing import *
+
+from dbpool import PooledConnection
+from query_stats import register_layer_file
+
+register_layer_file(__file__)
+
+_PLACEHOLDER = re.compile(r"%%|%s")
+
+
+def _numbered(query: str) -> Tuple[str, int]:
+    """ :return: The query with its %s placeholders numbered $1, $2, ... for PREPARE, and the number of them """
+    count = 0
+
+    def number(match):
+        nonlocal count
+        if match.group() == "%%":
+            return "%"
+        count += 1
+        return "$%d" % count
+    return _PLACEHOLDER.sub(number, query), count
+
+
+class StatementRegistry:
+    """
+    Named queries of fixed shape, prepared once per pooled connection and then executed by name, so the server
+    parses and plans them once per session rather than once per call.
+
+    The queries are written with %s placeholders like any other. Parameter types are inferred by the server from
+    the first PREPARE, so add a cast where the context does not tell, e.g. %s::numeric. With enabled set to False,
+    or on a connection not opened by the pool, the queries are executed as plain text.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.lock = Lock()
+        self.queries: Dict[str, str] = {}
+        self.prepared_queries: Dict[str, Tuple[str, int]] = {}
+        self.counters: Dict[str, Dict[str, float]] = {}
+
+    def register(self, name: str, query: str) -> str:
+        """
+        :param name: The statement name, a plain SQL identifier unique within the program.
+        :param query: The query with %s placeholders.
+        :return: The name, to pass to execute().
+        """
+        if name in self.queries and self.queries[name] != query:
+            raise ValueError("Statement %s is already registered with another query" % name)
+        self.queries[name] = query
+        self.prepared_queries[name] = _numbered(query)
+        self.counters[name] = {"calls": 0, "plain": 0, "prepares": 0, "prepare_time": 0.0, "execute_time": 0.0}
+        return name
+
+    def execute(self, cur, name: str, args: Sequence = ()) -> None:
+        """
+        Execute a registered statement on a cursor, preparing it first if its connection has not yet.
+
+        :param cur: The cursor to execute on. Fetch the rows from it as usual.
+        :param name: The registered name.
+        :param args: The query parameters.
+        :return: None
+        """
+        conn = cur.connection
+        counters = self.counters[name]
+        if not self.enabled or not isinstance(conn, PooledConnection):
+            started = time.perf_counter()
+            cur.execute(self.queries[name], args)
+            self._count(counters, calls=1, plain=1, execute_time=time.perf_counter() - started)
+            return
+
+        prepared, nargs = self.prepared_queries[name]
+        if name not in conn.prepared:
+            started = time.perf_counter()
+            cur.execute("PREPARE %s AS %s" % (name, prepared))
+            conn.prepared.add(name)
+            self._count(counters, prepares=1, prepare_time=time.perf_counter() - started)
+        started = time.perf_counter()
+        if nargs:
+            cur.execute("EXECUTE %s (%s)" % (name, ", ".join(["%s"] * nargs)), args)
+        else:
+            cur.execute("EXECUTE %s" % name)
+        self._count(counters, calls=1, execute_time=time.perf_counter() - started)
+
+    def _count(self, counters, **increments):
+        with self.lock:
+            for k, v in increments.items():
+                counters[k] += v
+
+    def stats(self) -> Dict[str, dict]:
+        """ :return: Per statement name the number of calls, plain executions and prepares, and the mean times in ms """
+        with self.lock:
+            return {name: {"calls": c["calls"],
+                           "plain": c["plain"],
+                           "prepares": c["prepares"],
+                           "mean_prepare_ms": c["prepare_time"] / c["prepares"] * 1000.0 if c["prepares"] else 0.0,
+                           "mean_execute_ms": c["execute_time"] / c["calls"] * 1000.0 if c["calls"] else 0.0}
+                    for name, c in sorted(self.counters.items())}
+
+
+statements = StatementRegistry()
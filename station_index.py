@@ -0,0 +1,171 @@
+import bisect
+import heapq
+import math
+import time
+from threading import Lock
+from typing import *
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import psycopg2
+
+# The outer edges in km of the distance rings, the last ring takes the rest
+DISTANCE_RINGS_KM = [50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000, 10000]
+
+
+class Station(NamedTuple):
+    """ A station heard in a report, placed by the bearing and distance from my QTH """
+    callsign: str
+    locator: str
+    my_az: float  # The bearing from my QTH in degrees
+    dist: float  # The distance from my QTH in km
+    az: float  # The bearing from the station to the one it heard or was heard by
+    happened_at: int
+    frequency: int
+    mode: str
+
+
+class StationGridIndex:
+    """
+    In-memory index of the stations of the reports by their position around my QTH, in azimuth bins of az_step
+    degrees times the distance rings of DISTANCE_RINGS_KM.
+
+    A station is kept with its latest report, until that is max_age seconds old. Sector queries visit only the cells
+    the sector overlaps, and expiry only the stations whose reports have become too old. The number of stations in
+    each azimuth bin is kept as they come and go, for the activity histogram of the UI.
+    """
+
+    def __init__(self, logger, max_age: float = 3600, az_step: int = 5, rings_km: Sequence[float] = DISTANCE_RINGS_KM):
+        if 360 % az_step:
+            raise ValueError("The azimuth step %d does not divide 360 degrees" % az_step)
+        self.logger = logger
+        self.max_age = max_age  # Seconds, the max_db_age of the reports table
+        self.az_step = az_step
+        self.az_bins = 360 // az_step
+        self.rings_km = list(rings_km)
+        self.lock = Lock()
+        self._clear()
+
+    def _clear(self):
+        self.cells: List[List[Dict[str, Station]]] = [[{} for _ in range(len(self.rings_km) + 1)]
+                                                      for _ in range(self.az_bins)]
+        self.stations: Dict[str, Tuple[int, int, Station]] = {}
+        self.az_counts = [0] * self.az_bins
+        self.expiry: List[Tuple[int, str]] = []  # (happened_at, callsign), including superseded reports
+
+    def _az_bin(self, az: float) -> int:
+        return int(az % 360 // self.az_step) % self.az_bins
+
+    def _ring(self, dist: float) -> int:
+        return bisect.bisect_right(self.rings_km, dist)
+
+    def load(self, db: 'psycopg2', max_age: Optional[float] = None) -> None:
+        """
+        Build the index from the reports table, both the receiving and the sending station of every report not older
+        than max_age.
+
+        :param db: The database connection to read the reports from.
+        :param max_age: The age in seconds of the oldest reports to index, None for the max_age of the index.
+        :return: None
+        """
+        if max_age is None:
+            max_age = self.max_age
+        cur = db.cursor()
+        cur.execute("""SELECT rx_callsign, rx_loc, my_rx_heading, my_rx_distance, rx_heading, happened_at, frequency, mode
+                         FROM reports WHERE happened_at >= extract(epoch from now()) - %s
+                        UNION ALL
+                       SELECT dx_callsign, dx_loc, my_tx_heading, my_tx_distance, tx_heading, happened_at, frequency, mode
+                         FROM reports WHERE happened_at >= extract(epoch from now()) - %s AND my_tx_distance > 0""",
+                    (max_age, max_age))
+        rows = cur.fetchall()
+        cur.close()
+        with self.lock:
+            self._clear()
+        self.insert(Station(*row) for row in rows)
+        self.logger.info("Indexed %d stations of %d report parties by azimuth and distance" %
+                         (len(self.stations), len(rows)))
+
+    def insert(self, stations: Iterable[Station]) -> None:
+        """ Enter stations, replacing those of older reports of the same callsigns """
+        with self.lock:
+            for station in stations:
+                if station.callsign is None or station.my_az is None or station.dist is None or \
+                        math.isnan(station.dist):
+                    continue
+                old = self.stations.get(station.callsign)
+                if old is not None:
+                    if old[2].happened_at >= station.happened_at:
+                        continue
+                    self._remove(station.callsign)
+                az_bin, ring = self._az_bin(station.my_az), self._ring(station.dist)
+                self.cells[az_bin][ring][station.callsign] = station
+                self.stations[station.callsign] = (az_bin, ring, station)
+                self.az_counts[az_bin] += 1
+                heapq.heappush(self.expiry, (station.happened_at, station.callsign))
+
+    def _remove(self, callsign):
+        az_bin, ring, _station = self.stations.pop(callsign)
+        del self.cells[az_bin][ring][callsign]
+        self.az_counts[az_bin] -= 1
+
+    def expire(self, before: float) -> int:
+        """
+        Drop the stations whose latest report happened before a time.
+
+        :param before: The time in seconds since the epoch.
+        :return: The number of stations dropped.
+        """
+        dropped = 0
+        with self.lock:
+            while self.expiry and self.expiry[0][0] < before:
+                happened_at, callsign = heapq.heappop(self.expiry)
+                entry = self.stations.get(callsign)
+                if entry is not None and entry[2].happened_at == happened_at:
+                    self._remove(callsign)
+                    dropped += 1
+        return dropped
+
+    def sector(self, az_from: float, az_to: float, min_dist: float = 0, max_dist: float = math.inf,
+               since: float = 0) -> List[Station]:
+        """
+        The stations within a sector, going clockwise from az_from to az_to, and a distance band.
+
+        :param az_from: The start bearing of the sector from my QTH in degrees.
+        :param az_to: The end bearing in degrees, az_from + 360 or more for all around.
+        :param min_dist: The least distance in km.
+        :param max_dist: The greatest distance in km.
+        :param since: Leave out the stations whose latest report happened before this time.
+        :return: The stations, nearest first.
+        """
+        self.expire(time.time() - self.max_age)
+        all_around = az_to - az_from >= 360
+        width = (az_to - az_from) % 360
+        first = self._az_bin(az_from)
+        # The bins from the one of az_from on, as many as the sector reaches into, counted from the start of the first
+        bins = self.az_bins if all_around else \
+            min(self.az_bins, int((az_from % self.az_step + width) // self.az_step) + 1)
+        rings = range(self._ring(min_dist), self._ring(max_dist) + 1)
+        found = []
+        with self.lock:
+            for i in range(bins):
+                column = self.cells[(first + i) % self.az_bins]
+                for ring in rings:
+                    for station in column[ring].values():
+                        if min_dist <= station.dist <= max_dist and station.happened_at >= since and \
+                                (all_around or (station.my_az - az_from) % 360 <= width):
+                            found.append(station)
+        found.sort(key=lambda s: s.dist)
+        return found
+
+    def histogram(self) -> List[int]:
+        """ :return: The number of stations in each azimuth bin, starting at north """
+        self.expire(time.time() - self.max_age)
+        with self.lock:
+            return list(self.az_counts)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"stations": len(self.stations),
+                    "az_step": self.az_step,
+                    "rings_km": list(self.rings_km),
+                    "pending_expiries": len(self.expiry)}
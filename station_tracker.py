@@ -49,6 +49,7 @@ class StationTracker:
 
 			try:
 				self.app.client_mgr.update_reachable_stations(self.beaming_stations, self.other_stations )  # self.other_stations)
+				self.app.client_mgr.send_activity_histogram()
 			except Exception as e:
 				self.logger.error("Stations update failed while updating, exception=%s"% e)
 			st_abortable_sleep(300)
@@ -111,11 +112,8 @@ class StationTracker:
 		self.logger.debug("Retrieving reports table")
 		self.pskreporter.retrieve()
 		self.logger.debug("Finding beaming stations")
-		stns1 = self.app.ham_op.get_reachable_stations(band=self.current_band)
-		# self.logger.info("%d stations possibly beaming me" % len(stns1))
-		# self.logger.info("Finding other stations")
-		stns2 = self.app.ham_op.get_reachable_stations(max_beamwidth=720, band=self.current_band)
-		# self.logger.info("%d stations active" % len(stns2))
+		stns1, stns2 = self.app.ham_op.get_reachable_stations(band=self.current_band)
+		# self.logger.info("%d stations possibly beaming me, %d stations active" % (len(stns1), len(stns2)))
 		return stns1, stns2
 
 	def get_position(self, callsign:str) -> Tuple[float,float]:
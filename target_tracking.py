@@ -9,7 +9,7 @@ import math
 
 from typing import *
 
-from geo import sphere
+import locator.src.geodesy as geodesy
 if TYPE_CHECKING:
 	from azel import AzelController
 
@@ -559,6 +559,7 @@ class PlaneTarget(Target):
 	def __init__(self, azel: 'AzelController', plane_id):
 		self.plane_id = plane_id
 		_mn, _ms, _mw, _me, self.my_lat, self.my_lon = mh.to_rect(azel.app.ham_op.my_qth())
+		self.home = geodesy.Origin(self.my_lat, self.my_lon)
 		super().__init__(azel, plane_id, Degree(0), Degree(0), update_in=12, ttl=20*60)  # Plane track lives for 20 min and is updated every 12 seconds
 
 		self.led_classes = "fas fa-plane"
@@ -568,10 +569,8 @@ class PlaneTarget(Target):
 		(self.lng, self.lat, self.alt)  = self.azel.app.aircraft_tracker.get_position(self.plane_id)
 		if self.lng is None or self.lat is None:
 			return None
-		mn, ms, mw, me, mlat, mlon = mh.to_rect(self.azel.app.ham_op.my_qth())
-		bearing = sphere.bearing((mlon, mlat), (self.lng, self.lat))
+		bearing, distance = self.home.bearing_distance(self.lat, self.lng)
 		self.az = bearing
-		distance = sphere.distance((mlon, mlat), (self.lng, self.lat)) / 1000.0
 
 		altkm = self.alt*(0.0254*12)/1000
 
@@ -0,0 +1,38 @@
+import logging
+import os
+import sys
+import uuid
+
+import pytest
+
+# The application modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# A database the tests needing PostgreSQL may create and drop schemas in, e.g. "dbname=stationmate_test"
+TEST_DSN = os.environ.get("STATIONMATE_TEST_DSN")
+
+
+@pytest.fixture
+def scratch_pool():
+    """ A connection pool whose connections work in a new, empty schema of the test database, dropped afterwards """
+    if not TEST_DSN:
+        pytest.skip("STATIONMATE_TEST_DSN names no scratch database")
+    psycopg2 = pytest.importorskip("psycopg2")
+    import dbpool
+
+    name = "stationmate_test_%s" % uuid.uuid4().hex[:8]
+    admin = psycopg2.connect(TEST_DSN)
+    if admin.info.dbname == dbpool.DB_NAME:
+        admin.close()
+        pytest.fail("STATIONMATE_TEST_DSN names %s, the database of the station, not a scratch database" % dbpool.DB_NAME)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute("CREATE SCHEMA %s" % name)
+    pool = dbpool.ConnectionPool(logging.getLogger(__name__), dsn=TEST_DSN, options="-c search_path=%s" % name)
+    try:
+        yield pool
+    finally:
+        pool.close()
+        with admin.cursor() as cur:
+            cur.execute("DROP SCHEMA %s CASCADE" % name)
+        admin.close()
@@ -0,0 +1,117 @@
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import config_cache
+from config_cache import ConfigCache
+
+logger = logging.getLogger(__name__)
+
+
+class Clock:
+    """ Stands in for the wall clock the validity windows are compared with and the monotonic clock of the ttl """
+
+    def __init__(self):
+        self.wall = datetime(2024, 5, 1, 11, 0)
+        self.seconds = 1000.0
+
+    def advance(self, seconds=0.0, to=None):
+        self.seconds += seconds
+        self.wall = to if to is not None else datetime.fromtimestamp(self.wall.timestamp() + seconds)
+
+
+class FakeCursor:
+    def __init__(self, table):
+        self.table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def fetchall(self):
+        return [dict(row) for row in self.table]
+
+
+@pytest.fixture
+def table():
+    return [{"key": "my_locator", "value": "JO67BQ", "time_start": None, "time_stop": None, "band": None},
+            {"key": "power", "value": "100", "time_start": datetime(2024, 5, 1, 12, 0),
+             "time_stop": datetime(2024, 5, 1, 13, 0), "band": None}]
+
+
+@pytest.fixture
+def clock(monkeypatch, table):
+    clock = Clock()
+
+    class FakeDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return clock.wall
+
+    @contextmanager
+    def connection():
+        yield SimpleNamespace(cursor=lambda cursor_factory=None: FakeCursor(table))
+
+    monkeypatch.setattr(config_cache, "datetime", FakeDatetime)
+    monkeypatch.setattr(config_cache, "time", SimpleNamespace(monotonic=lambda: clock.seconds))
+    monkeypatch.setattr(config_cache, "get_pool", lambda: SimpleNamespace(connection=connection))
+    monkeypatch.setattr(config_cache, "statements", SimpleNamespace(execute=lambda cur, name, args=(): None))
+    return clock
+
+
+def values(cache, key):
+    return [row["value"] for row in cache.fetch("str", key)]
+
+
+def test_window_opens_and_closes_between_lookups(clock):
+    cache = ConfigCache(logger)
+    assert values(cache, "power") == []
+    assert values(cache, "power") == []
+    assert cache.hits == 1
+
+    clock.advance(to=datetime(2024, 5, 1, 12, 0))  # The window opens at its time_start
+    assert values(cache, "power") == ["100"]
+    clock.advance(to=datetime(2024, 5, 1, 12, 30))
+    assert values(cache, "power") == ["100"]
+
+    clock.advance(to=datetime(2024, 5, 1, 13, 0))  # time_stop is still within the window
+    assert values(cache, "power") == ["100"]
+    clock.advance(to=datetime(2024, 5, 1, 13, 0, 1))
+    assert values(cache, "power") == []
+    assert values(cache, "my_locator") == ["JO67BQ"]
+    assert cache.loads == 1
+
+
+def test_lookups_at_a_given_time(clock):
+    cache = ConfigCache(logger)
+    assert values(cache, "power") == []
+    assert [r["value"] for r in cache.fetch("str", "power", at_time="2024-05-01T12:15:00")] == ["100"]
+    assert [r["key"] for r in cache.fetch("str")] == ["my_locator"]
+
+
+def test_table_is_read_again_after_the_ttl(clock, table):
+    cache = ConfigCache(logger, ttl=300.0)
+    assert values(cache, "my_locator") == ["JO67BQ"]
+    table[0]["value"] = "JO57AA"  # Changed by another program
+
+    clock.advance(300.0)
+    assert values(cache, "my_locator") == ["JO67BQ"]
+    assert cache.loads == 1
+
+    clock.advance(1.0)
+    assert values(cache, "my_locator") == ["JO57AA"]
+    assert cache.loads == 2
+
+
+def test_invalidate_reads_the_table_again(clock, table):
+    cache = ConfigCache(logger)
+    assert values(cache, "my_locator") == ["JO67BQ"]
+    table[0]["value"] = "JO57AA"
+    cache.invalidate("str")
+    assert values(cache, "my_locator") == ["JO57AA"]
+    assert cache.loads == 2
@@ -0,0 +1,128 @@
+import threading
+import time
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("psycopg2")
+
+from clientmgr import CoalescingOutbox, MessageDispatcher, coalesce_key
+
+
+def sent(outbox):
+    return [(what, data) for what, data, _queued_at in outbox.drain()]
+
+
+def test_coalesce_keys():
+    assert coalesce_key("update_class", {"forId": "x", "class": "active", "value": True}) == \
+           ("update_class", "x", "active")
+    assert coalesce_key("update_classes", {"forId": "x", "classes": []}) == ("update_classes", "x")
+    assert coalesce_key("set_azel", {"az": 10, "el": 0}) == ("set_azel",)
+    assert coalesce_key("add_qso", {"callsign": "SM5ABC"}) is None
+
+
+def test_unkeyed_messages_are_all_kept_in_order():
+    outbox = CoalescingOutbox()
+    for n in range(3):
+        outbox.put("add_qso", n)
+    assert sent(outbox) == [("add_qso", 0), ("add_qso", 1), ("add_qso", 2)]
+    assert outbox.coalesced == 0
+
+
+def test_replacement_moves_to_the_tail():
+    outbox = CoalescingOutbox()
+    outbox.put("set_azel", 1, ("set_azel",))
+    outbox.put("set_mydata", "a")
+    outbox.put("set_azel", 2, ("set_azel",))
+    outbox.put("set_azel", 3, ("set_azel",))
+    assert sent(outbox) == [("set_mydata", "a"), ("set_azel", 3)]
+    assert outbox.coalesced == 2
+
+
+def test_keyed_update_after_a_batch_touching_the_same_element_is_sent_last():
+    outbox = CoalescingOutbox()
+    update = lambda value: {"forId": "x", "class": "c", "value": value}
+    outbox.put("update_class", update(True), coalesce_key("update_class", update(True)))
+    outbox.put("update_batch", [["update_class", update(False)]])
+    outbox.put("update_class", update(True), coalesce_key("update_class", update(True)))
+    assert sent(outbox) == [("update_batch", [["update_class", update(False)]]), ("update_class", update(True))]
+
+
+def test_replacement_keeps_the_first_queueing_time():
+    outbox = CoalescingOutbox()
+    outbox.put("set_azel", 2, ("set_azel",))
+    time.sleep(0.01)
+    outbox.put("set_azel", 3, ("set_azel",))
+    (what, data, queued_at), = outbox.drain()
+    assert data == 3
+    assert time.monotonic() - queued_at >= 0.01
+
+
+def test_drain_empties_the_outbox():
+    outbox = CoalescingOutbox()
+    outbox.put("set_azel", 1, ("set_azel",))
+    outbox.put("add_qso", 1)
+    assert len(outbox.drain()) == 2
+    assert not outbox.pending()
+    assert outbox.drain() == []
+    outbox.put("set_azel", 2, ("set_azel",))
+    assert sent(outbox) == [("set_azel", 2)]
+
+
+class FakeSocketIO:
+    async_mode = "threading"
+
+    def __init__(self):
+        self.emitted = []  # (time, what, data)
+
+    def emit(self, what, data, broadcast=False):
+        self.emitted.append((time.monotonic(), what, data))
+
+    @staticmethod
+    def sleep(seconds):
+        time.sleep(seconds)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out"
+        time.sleep(0.005)
+
+
+def test_dispatch_passes_are_paced_and_coalesce_meanwhile():
+    socket_io = FakeSocketIO()
+    app = SimpleNamespace(socket_io=socket_io, app_context=nullcontext,
+                          client_mgr=SimpleNamespace(logger=SimpleNamespace(info=lambda *a: None,
+                                                                            error=lambda *a: None)))
+    dispatcher = MessageDispatcher(min_interval=0.2)
+    threading.Thread(target=dispatcher.run, args=(app,), daemon=True).start()
+
+    dispatcher.put("set_azel", {"az": 1, "el": 0})
+    wait_for(lambda: len(socket_io.emitted) == 1)
+    for az in (2, 3, 4):
+        dispatcher.put("set_azel", {"az": az, "el": 0})
+    wait_for(lambda: len(socket_io.emitted) == 2)
+    time.sleep(0.05)
+
+    (first, _what, _data), (second, what, data) = socket_io.emitted
+    assert (what, data) == ("set_azel", {"az": 4, "el": 0})
+    assert second - first >= 0.2
+    stats = dispatcher.stats()
+    assert stats["dispatched"] == 2 and stats["coalesced"] == 2 and stats["passes"] == 2
+
+
+def test_batched_updates_keep_the_order_of_the_latest_updates(monkeypatch):
+    import clientmgr
+    outbox = CoalescingOutbox()
+    monkeypatch.setattr(clientmgr.dispatcher, "_outbox", outbox)
+    with clientmgr.batched_updates():
+        clientmgr.send_update_class("x", "active", True)
+        clientmgr.send_update_classes("x", ["led"])
+        clientmgr.send_update_class("x", "active", False)
+    (what, batch), = sent(outbox)
+    assert what == "update_batch"
+    assert batch == [["update_classes", {"forId": "x", "classes": ["led"]}],
+                     ["update_class", {"forId": "x", "class": "active", "value": False}]]
@@ -0,0 +1,79 @@
+import logging
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("adif_io")
+pytest.importorskip("smbus2")
+
+import dbpool
+import schema
+from hamop import HamOp
+from import_jobs import ImportJob, ImportJobManager
+from locator_index import LocatorCallsignIndex
+from locator_resolver import LocatorResolver
+from worked_squares import WorkedSquares
+
+logger = logging.getLogger(__name__)
+
+LOG_LINES = [
+    "2024-05-01,18:00:00,2024-05-01,18:01:00,SM5ABC,JO89AB,144.174,FT8,-10,-12,,,,T",
+    "2024-05-01,18:05:00,2024-05-01,18:06:00,OH1XYZ,KP10CD,144.174,FT8,-08,-14,,,,T",
+]
+
+
+@pytest.fixture
+def pool(scratch_pool):
+    """ The scratch pool, migrated and installed as the pool of the program """
+    saved, dbpool._pool = dbpool._pool, scratch_pool
+    schema.migrate(scratch_pool, logger)
+    yield scratch_pool
+    dbpool._pool = saved
+
+
+@pytest.fixture
+def app(pool):
+    ham_op = HamOp.__new__(HamOp)  # Without the I2C ports and the tables loaded at start
+    ham_op.logger = logger
+    ham_op.pool = pool
+    ham_op.locator_index = LocatorCallsignIndex(logger)
+    ham_op.locator_resolver = LocatorResolver(logger)
+    ham_op.worked_squares = WorkedSquares(logger)
+    ham_op.find_augmented_locator = lambda callsign, locator: locator
+    ham_op.distance_to = lambda locator, qso_date=None, qso_time=None: (45.0, 500.0, 501, 1)
+    app = SimpleNamespace(ham_op=ham_op, client_mgr=mock.MagicMock(current_band="144-FT8"))
+    ham_op.app = app
+    return app
+
+
+def log_count(pool):
+    with pool.connection() as db:
+        with db.cursor() as cur:
+            cur.execute("SELECT count(*) FROM nac_log_new")
+            return cur.fetchone()[0]
+
+
+def run_import(app, lines):
+    job = ImportJob(1, "wsjtx.log", "log", "\n".join(lines))
+    ImportJobManager(app, logger)._run(job)
+    return job
+
+
+def test_log_import_commits_once_at_the_end(pool, app):
+    job = run_import(app, LOG_LINES)
+    assert job.status == "done"
+    assert job.counts["added"] == 2
+    assert log_count(pool) == 2
+    assert app.client_mgr.add_qso.call_count == 2
+    assert app.ham_op.locator_index.callsigns("JO89") == ["SM5ABC"]
+
+
+def test_failing_log_import_leaves_the_log_untouched(pool, app):
+    job = run_import(app, LOG_LINES[:1] + ["not a wsjt-x log line"] + LOG_LINES[1:])
+    assert job.status == "failed"
+    assert log_count(pool) == 0
+    app.client_mgr.add_qso.assert_not_called()
+    assert app.ham_op.locator_index.callsigns("JO89") == []
+    assert app.ham_op.worked_squares.entries == {}
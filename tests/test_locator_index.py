@@ -0,0 +1,79 @@
+import logging
+
+from locator_index import LocatorCallsignIndex
+
+logger = logging.getLogger(__name__)
+
+LOG = [("SM5ABC", "JO89AB"), ("SM5ABC", "JO89AB"), ("OH1XYZ", "KP10CD"), ("SM6XYZ", "JO67BQ"), ("LA1AB", "JO59")]
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, query, args=None):
+        pass
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def close(self):
+        pass
+
+
+class FakeDb:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return FakeCursor(self.rows)
+
+
+def like(log, prefix):
+    """ What SELECT DISTINCT callsign FROM nac_log_new WHERE locator LIKE prefix% ORDER BY callsign gives """
+    return sorted({callsign for callsign, locator in log if locator.startswith(prefix)})
+
+
+def assert_matches(index, log):
+    for prefix in ["JO", "KP", "JO89", "JO67", "JO59", "KP10", "JO89AB", "JO67BQ", "KP10CD", "JO89AC", "AA"]:
+        assert index.callsigns(prefix) == like(log, prefix), prefix
+
+
+def test_load_matches_the_query():
+    index = LocatorCallsignIndex(logger)
+    index.load(FakeDb(LOG))
+    assert index.callsigns("JO") == ["LA1AB", "SM5ABC", "SM6XYZ"]
+    assert index.callsigns("JO59AA") == []
+    assert_matches(index, LOG)
+
+
+def test_covers_the_indexed_prefix_lengths():
+    index = LocatorCallsignIndex(logger)
+    assert [index.covers(loc) for loc in ["JO", "JO8", "JO89", "JO89AB", "JO89AB12", None]] == \
+           [True, False, True, True, False, False]
+
+
+def test_commit_relocate_and_delete_keep_the_counts():
+    index = LocatorCallsignIndex(logger)
+    index.load(FakeDb(LOG))
+    log = list(LOG)
+
+    index.add("SM5ABC", "JO89AC")
+    log.append(("SM5ABC", "JO89AC"))
+    assert_matches(index, log)
+
+    # One of the two qsos with SM5ABC in JO89AB moves, the other keeps the callsign there
+    index.replace("SM5ABC", "JO89AB", "SM5ABC", "KP10CD")
+    log.remove(("SM5ABC", "JO89AB"))
+    log.append(("SM5ABC", "KP10CD"))
+    assert_matches(index, log)
+    assert index.callsigns("JO89AB") == ["SM5ABC"]
+
+    index.remove("SM5ABC", "JO89AB")
+    log.remove(("SM5ABC", "JO89AB"))
+    assert_matches(index, log)
+    assert index.callsigns("JO89AB") == []
+    assert "JO89AB" not in index.prefixes
+
+    index.remove("SM9NONE", "JO89AB")  # Not in the index, nothing changes
+    assert_matches(index, log)
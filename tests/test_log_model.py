@@ -0,0 +1,92 @@
+import logging
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import pytest
+
+import log_model
+from log_model import LogModel, QSOID, row_order
+
+logger = logging.getLogger(__name__)
+
+
+def row(qsoid, date, time, callsign, locator, band="144-FT8", complete=True, augmented=None):
+    return (qsoid, date, time, callsign, "-10", "-12", locator, 500.0, None, 501, complete, "TR", None, band, augmented)
+
+
+LOG = [
+    row(1, "2024-05-01", "1800", "SM5ABC", "JO89AB"),
+    row(2, "2024-05-01", "1810", "OH1XYZ", "KP10CD"),
+    row(3, "2024-05-01", "1820", "SM6XYZ", "JO89", augmented="JO89XY"),
+    row(4, "2024-05-02", "1800", "LA1AB", "JO59AB", band="432-FT8"),
+    row(5, "2024-05-02", "1900", "SM7AAA", "JO65AA", complete=False),
+]
+
+
+@pytest.fixture(autouse=True)
+def no_database(monkeypatch):
+    monkeypatch.setattr(log_model, "get_pool", lambda: SimpleNamespace(connection=nullcontext))
+
+
+def model_of(rows):
+    """ A log model reading rows, as get_log_rows would give them, ordered by date and time """
+    log = sorted(rows, key=row_order)
+    ham_op = SimpleNamespace(get_log_rows=lambda since, until: nullcontext(iter(log)))
+    return LogModel(SimpleNamespace(ham_op=ham_op), logger)
+
+
+def assert_as_loaded(model, rows):
+    """ The views of the model are those of a model loading the rows afresh """
+    for band in ["144", "432"]:
+        assert model.get_mhs(band=band) == model_of(rows).get_mhs(band=band)
+
+
+def test_views_of_the_log():
+    locators, qsos = model_of(LOG).get_mhs(band="144")
+    assert locators == ["JO89AB", "KP10CD", "JO89XY", "JO65AA"]
+    assert [q["acc_sqn"] for q in qsos] == [1, 2, None, None, None]
+    assert model_of(LOG).get_mhs(band="432")[0] == ["JO59AB"]
+
+
+def test_commit_at_the_end_extends_the_views():
+    model = model_of(LOG)
+    model.get_mhs(band="144")
+    new = row(6, "2024-05-03", "1800", "DL1ABC", "JO50AA")
+    model.apply_commit(new)
+    assert model.get_mhs(band="144")[0][-1] == "JO50AA"
+    assert model.get_mhs(band="144")[1][-1]["acc_sqn"] == 3
+    assert_as_loaded(model, LOG + [new])
+
+
+def test_commit_in_the_middle_and_relocation():
+    model = model_of(LOG)
+    model.get_mhs(band="144")
+    earlier = row(7, "2024-04-30", "1200", "DL1ABC", "KP10AA")
+    model.apply_commit(earlier)
+    rows = [earlier] + LOG
+    assert_as_loaded(model, rows)
+
+    moved = row(1, "2024-05-01", "1800", "SM5ABC", "JO88AA")
+    model.apply_commit(moved)
+    rows = [moved if r[QSOID] == 1 else r for r in rows]
+    assert_as_loaded(model, rows)
+    assert "JO89AB" not in model.get_mhs(band="144")[0]
+
+
+def test_delete():
+    model = model_of(LOG)
+    model.get_mhs(band="144")
+    model.apply_delete(2)
+    rows = [r for r in LOG if r[QSOID] != 2]
+    assert_as_loaded(model, rows)
+    assert [q["id"] for q in model.get_mhs(band="144")[1]] == [1, 3, 4, 5]
+    model.apply_delete(99)  # Not in the log
+    assert_as_loaded(model, rows)
+
+
+def test_rows_outside_the_scope_are_left_out():
+    model = model_of(LOG)
+    model.get_mhs(since=None, until=None, band="144")
+    model.scope = ("2024-05-01", "2024-05-02", "0000", "2359")
+    model.apply_commit(row(8, "2024-06-01", "1200", "DL1ABC", "JO40AA"))
+    assert [r[QSOID] for r in model.rows] == [1, 2, 3, 4, 5]
@@ -0,0 +1,43 @@
+import logging
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+import schema
+
+logger = logging.getLogger(__name__)
+
+REPORT_COLUMNS = ["my_rx_distance", "rx_heading", "tx_heading", "my_tx_distance", "distance", "my_rx_heading",
+                  "my_tx_heading"]
+
+
+def test_migrations_apply_to_an_empty_database(scratch_pool):
+    assert schema.schema_version(scratch_pool) == 0
+    assert schema.migrate(scratch_pool, logger) == schema.MIGRATIONS[-1][0]
+    assert schema.missing_indexes(scratch_pool) == []
+    # Nothing left to apply the second time
+    assert schema.migrate(scratch_pool, logger) == schema.MIGRATIONS[-1][0]
+
+    with scratch_pool.connection() as db:
+        with db.cursor() as cur:
+            cur.execute("""SELECT column_name, data_type FROM information_schema.columns
+                            WHERE table_schema = current_schema() AND table_name = 'reports'""")
+            types = dict(cur.fetchall())
+        db.rollback()
+    assert {column: types[column] for column in REPORT_COLUMNS} == {column: "numeric" for column in REPORT_COLUMNS}
+
+
+@pytest.mark.parametrize("rx_heading, my_rx_heading", [(10.5, 20.0), (200.0, 30.0), (359.9, 0.5), (0.0, 180.0)])
+def test_backfilled_beam_offset_matches_the_one_computed_at_insert(scratch_pool, rx_heading, my_rx_heading):
+    schema.migrate(scratch_pool, logger)
+    backfill = next(statements for number, _description, statements in schema.MIGRATIONS if number == 2)[1]
+    with scratch_pool.connection() as db:
+        with db.cursor() as cur:
+            cur.execute("""INSERT INTO reports (dx_callsign, rx_callsign, rx_heading, my_rx_heading)
+                           VALUES ('SM6FBQ', 'SM5ABC', %s, %s)""", (rx_heading, my_rx_heading))
+            cur.execute(backfill)
+            cur.execute("SELECT rx_beam_offset FROM reports")
+            offset = cur.fetchone()[0]
+        db.rollback()
+    assert offset == pytest.approx(schema.rx_beam_offset(rx_heading, my_rx_heading))
@@ -0,0 +1,80 @@
+import logging
+import time
+
+import pytest
+
+from station_index import Station, StationGridIndex
+
+logger = logging.getLogger(__name__)
+
+
+def station(callsign, my_az, dist, happened_at=None):
+    return Station(callsign, "JO67AA", my_az, dist, 0.0, int(time.time()) if happened_at is None else happened_at,
+                   144174000, "FT8")
+
+
+def callsigns(stations):
+    return [s.callsign for s in stations]
+
+
+def test_sector_wrapping_past_north():
+    index = StationGridIndex(logger)
+    index.insert([station("N355", 355.0, 100), station("N2", 2.0, 200), station("N9", 9.9, 300),
+                  station("W349", 349.9, 400), station("E11", 11.0, 500), station("S180", 180.0, 600)])
+    assert callsigns(index.sector(350, 10)) == ["N355", "N2", "N9"]
+    assert callsigns(index.sector(350, 370)) == ["N355", "N2", "N9"]
+    assert callsigns(index.sector(349.9, 11)) == ["N355", "N2", "N9", "W349", "E11"]
+    assert callsigns(index.sector(10, 350)) == ["W349", "E11", "S180"]
+    assert len(index.sector(0, 360)) == 6
+    assert callsigns(index.sector(180, 180)) == ["S180"]
+
+
+def test_distance_ring_edges():
+    index = StationGridIndex(logger, rings_km=[50, 100])
+    index.insert([station("A", 10.0, 49.9), station("B", 10.0, 50), station("C", 10.0, 100),
+                  station("D", 10.0, 100.1), station("E", 10.0, 5000)])
+    assert [index.stations[c][1] for c in "ABCDE"] == [0, 1, 2, 2, 2]
+    # Both distance limits are inclusive, also where they fall on the edge of a ring
+    assert callsigns(index.sector(0, 20, 50, 100)) == ["B", "C"]
+    assert callsigns(index.sector(0, 20, max_dist=50)) == ["A", "B"]
+    assert callsigns(index.sector(0, 20, min_dist=100)) == ["C", "D", "E"]
+    assert callsigns(index.sector(0, 20, 49.95, 50.05)) == ["B"]
+
+
+def test_newer_reports_replace_older_ones():
+    index = StationGridIndex(logger)
+    now = int(time.time())
+    index.insert([station("A", 10.0, 100, now - 60)])
+    index.insert([station("A", 200.0, 300, now), station("A", 20.0, 400, now - 30)])
+    assert callsigns(index.sector(180, 220)) == ["A"]
+    assert index.sector(0, 30) == []
+    assert index.histogram()[40] == 1
+    assert sum(index.histogram()) == 1
+
+
+def test_expire_drops_only_stations_without_a_newer_report():
+    index = StationGridIndex(logger)
+    index.insert([station("A", 10.0, 100, 1000), station("B", 10.0, 200, 2000), station("C", 10.0, 300, 1000)])
+    index.insert([station("C", 10.0, 300, 3000)])
+    assert index.expire(1000) == 0
+    assert index.expire(2500) == 2  # A and B, the superseded report of C is passed over
+    assert list(index.stations) == ["C"]
+    assert index.stats()["pending_expiries"] == 1
+    assert index.expire(3001) == 1
+    assert index.stations == {}
+    assert sum(index.az_counts) == 0
+
+
+def test_histogram_counts_stations_per_bin_and_expires_old_ones():
+    index = StationGridIndex(logger, max_age=600, az_step=90)
+    now = int(time.time())
+    index.insert([station("N1", 0.0, 100, now), station("N2", 89.9, 100, now), station("E", 90.0, 100, now),
+                  station("W", 359.0, 100, now), station("OLD", 180.0, 100, now - 601)])
+    assert index.histogram() == [2, 1, 0, 1]
+    assert "OLD" not in index.stations
+    assert index.sector(0, 360) == sorted(index.sector(0, 360), key=lambda s: s.dist)
+
+
+def test_az_step_must_divide_the_circle():
+    with pytest.raises(ValueError):
+        StationGridIndex(logger, az_step=7)
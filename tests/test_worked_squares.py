@@ -0,0 +1,71 @@
+import logging
+
+from worked_squares import WorkedSquares, band_key
+
+logger = logging.getLogger(__name__)
+
+DAY = "2024-05-01"
+
+
+def tracker():
+    squares = WorkedSquares(logger)
+    squares.apply(1, DAY, "1800", "JO89AB", "144-FT8")
+    squares.apply(2, DAY, "1810", "KP10CD", "144.174")
+    squares.apply(3, DAY, "1820", "JO89XY", "144-FT8")
+    squares.apply(4, DAY, "1830", "JO67BQ", "432-FT8")
+    return squares
+
+
+def test_band_keys():
+    assert [band_key(b) for b in ["144-FT8", "144.174", "432", None]] == ["144", "144", "432", None]
+
+
+def test_several_qsos_on_one_day():
+    squares = tracker()
+    # Squares first worked earlier that day, on any band, and whether the square is new that day
+    assert squares.day_squares(DAY, "1815", "JO67AA") == (2, True)
+    assert squares.day_squares(DAY, "1815", "JO89AA") == (2, False)
+    assert squares.day_squares(DAY, "1805", "KP10AA") == (1, True)
+    assert squares.day_squares(DAY, "1800", "JO89AB") == (0, True)
+    assert squares.day_squares(DAY, "1840", "JO50AA") == (3, True)
+    assert squares.day_squares("2024-05-02", "1800", "JO89AB") == (0, True)
+    # The number a square new on the band gets
+    assert squares.accumulated_square("144", "JO89AA") is None
+    assert squares.accumulated_square("144", "jo67aa") == "3"
+    assert squares.accumulated_square("432", "JO67AA") is None
+    assert squares.accumulated_square("432", "JO89AB") == "2"
+    assert squares.accumulated_square("1296", "JO89AB") == "1"
+
+
+def test_relocate_moves_a_qso_to_another_square():
+    squares = tracker()
+    squares.relocate(2, "JO67AA")
+    assert squares.day_squares(DAY, "1815", "KP10CD") == (2, True)
+    assert squares.day_squares(DAY, "1815", "JO67BQ") == (2, False)
+    assert squares.day_squares(DAY, "1825", "JO50AA") == (2, True)
+    assert squares.accumulated_square("144", "KP10CD") == "3"
+    assert squares.accumulated_square("144", "JO67BQ") is None
+    squares.relocate(99, "JO67AA")  # Not tracked, nothing changes
+    assert squares.accumulated_square("144", "KP10CD") == "3"
+
+
+def test_remove_deletes_a_qso():
+    squares = tracker()
+    squares.remove(1)
+    # JO89 is first worked at 1820 now
+    assert squares.day_squares(DAY, "1815", "JO89AA") == (1, True)
+    assert squares.day_squares(DAY, "1825", "JO89AA") == (2, False)
+    assert squares.accumulated_square("144", "JO89AA") is None
+    squares.remove(3)
+    assert squares.accumulated_square("144", "JO89AA") == "2"
+    assert squares.day_squares(DAY, "1840", "JO89AA") == (2, True)
+    squares.remove(3)  # Already gone
+    assert squares.accumulated_square("144", "JO89AA") == "2"
+
+
+def test_apply_replaces_an_updated_qso():
+    squares = tracker()
+    squares.apply(3, DAY, "1750", "JO50AA", "432-FT8")
+    assert squares.day_squares(DAY, "1805", "JO67AA") == (2, True)
+    assert squares.accumulated_square("144", "JO50AA") == "3"
+    assert squares.accumulated_square("432", "JO50AA") is None
@@ -0,0 +1,159 @@
+from bisect import bisect_left, insort
+from threading import Lock
+from typing import *
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import psycopg2
+
+
+def band_key(band: str) -> str:
+    """ The band part of a band or frequency column value, e.g. 144 for 144-FT8 or 144.174 """
+    return band.split('-')[0].split('.')[0] if band else band
+
+
+class DaySquares:
+    """ The squares worked during one day, with the times they were worked """
+
+    def __init__(self):
+        self.times: Dict[Optional[str], List[str]] = {}  # square -> sorted times it was worked
+        self.firsts: List[str] = []  # sorted first time of every square
+
+    def add(self, square, time):
+        times = self.times.setdefault(square, [])
+        first = times[0] if times else None
+        insort(times, time)
+        if first != times[0]:
+            if first is not None:
+                del self.firsts[bisect_left(self.firsts, first)]
+            insort(self.firsts, times[0])
+
+    def remove(self, square, time):
+        times = self.times.get(square)
+        if not times:
+            return
+        first = times[0]
+        index = bisect_left(times, time)
+        if index < len(times) and times[index] == time:
+            del times[index]
+        if not times or times[0] != first:
+            del self.firsts[bisect_left(self.firsts, first)]
+            if times:
+                insort(self.firsts, times[0])
+            else:
+                del self.times[square]
+
+    def count_before(self, time) -> int:
+        """ :return: The number of squares first worked before the time """
+        return bisect_left(self.firsts, time)
+
+    def worked_before(self, square, time) -> bool:
+        times = self.times.get(square)
+        return bool(times) and times[0] < time
+
+
+class WorkedSquares:
+    """
+    The squares worked per day and per band, kept in step with nac_log_new.
+
+    The day view answers the contest questions of distance_to, how many squares were worked earlier that day and
+    whether a square is new. The band view answers the accumulated square number of do_commit_qso.
+    Squares are the first four characters of the locator, as stored for days and upper-cased for bands, like the
+    queries they replace.
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.lock = Lock()
+        self.days: Dict[str, DaySquares] = {}
+        self.bands: Dict[str, Dict[Optional[str], int]] = {}  # band key -> {square: qso count}
+        self.entries = {}  # qsoid -> (date, time, locator, band)
+
+    def load(self, db: 'psycopg2') -> None:
+        """
+        Read the whole log in one query.
+
+        :param db: The database connection to read nac_log_new from.
+        :return: None
+        """
+        cur = db.cursor()
+        cur.execute("SELECT qsoid, date, time, locator, band FROM nac_log_new")
+        rows = cur.fetchall()
+        cur.close()
+        with self.lock:
+            self.days = {}
+            self.bands = {}
+            self.entries = {}
+            for row in rows:
+                self._add(*row)
+        self.logger.info("Tracking worked squares of %d qsos on %d days" % (len(rows), len(self.days)))
+
+    def _add(self, qsoid, date, time, locator, band):
+        date = str(date)
+        self.entries[qsoid] = (date, time, locator, band)
+        if time is not None:
+            self.days.setdefault(date, DaySquares()).add(locator[:4] if locator is not None else None, time)
+        if band is not None:
+            squares = self.bands.setdefault(band_key(band), {})
+            square = locator[:4].upper() if locator is not None else None
+            squares[square] = squares.get(square, 0) + 1
+
+    def _remove(self, qsoid):
+        entry = self.entries.pop(qsoid, None)
+        if entry is None:
+            return
+        date, time, locator, band = entry
+        if time is not None and date in self.days:
+            self.days[date].remove(locator[:4] if locator is not None else None, time)
+        if band is not None:
+            squares = self.bands.get(band_key(band), {})
+            square = locator[:4].upper() if locator is not None else None
+            if square in squares:
+                squares[square] -= 1
+                if squares[square] <= 0:
+                    del squares[square]
+
+    def apply(self, qsoid, date, time, locator, band) -> None:
+        """ Account for an inserted or updated qso """
+        with self.lock:
+            self._remove(qsoid)
+            self._add(qsoid, date, time, locator, band)
+
+    def relocate(self, qsoid, locator) -> None:
+        """ Account for a changed locator of a qso """
+        with self.lock:
+            entry = self.entries.get(qsoid)
+            if entry is not None:
+                date, time, _old_locator, band = entry
+                self._remove(qsoid)
+                self._add(qsoid, date, time, locator, band)
+
+    def remove(self, qsoid) -> None:
+        """ Account for a deleted qso """
+        with self.lock:
+            self._remove(qsoid)
+
+    def day_squares(self, qso_date, qso_time, locator) -> Tuple[int, bool]:
+        """
+        :param qso_date: The date of the qso.
+        :param qso_time: The time of the qso.
+        :param locator: The locator worked in the qso.
+        :return: A tuple (number of squares worked earlier that day, whether the square of the locator is new that day)
+        """
+        with self.lock:
+            day = self.days.get(str(qso_date))
+            if day is None:
+                return 0, True
+            return day.count_before(qso_time), not day.worked_before(locator[:4], qso_time)
+
+    def accumulated_square(self, band: str, locator: str) -> Optional[str]:
+        """
+        :param band: The band key of the qso.
+        :param locator: The locator worked in the qso.
+        :return: The number the square of the locator gets when it is new on the band, as a string, otherwise None.
+        """
+        with self.lock:
+            squares = self.bands.get(band, {})
+            if locator[:4].upper() in squares:
+                return None
+            return str(len(squares) + 1)